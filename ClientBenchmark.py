@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from ClientCodec import WIRE_OFFER
+from ClientFleet import FleetCounters, add_reconnect_args, reconnect_options, run_fleet
+from ClientReconnect import ReconnectScheduler
+from ClientCore import SERVER_HOST, SERVER_PORT
+from ClientStats import LatencyHistogram
+
+# Global Vars
+# Default benchmark settings: a short warm-up (connects and TLS handshakes) is left out of the measurement.
+BENCHMARK_METERS = 50
+BENCHMARK_DURATION = 30.0
+WARMUP_DURATION = 5.0
+# Seconds between a meter's readings. Readings go out on their own schedule whether or not the last one has been
+# billed yet (open loop, up to the fleet's in-flight window), so a slow server shows up as higher latency instead
+# of fewer readings being measured, until the window fills and the meters stall (counted as 'stalls').
+BENCHMARK_MIN_INTERVAL = 0.05
+BENCHMARK_MAX_INTERVAL = 0.1
+# Metrics compared between two reports, and whether higher is better.
+COMPARED_METRICS = (
+    ("readings_per_second", True),
+    ("bills_per_second", True),
+    ("latency.p50_ms", False),
+    ("latency.p90_ms", False),
+    ("latency.p99_ms", False),
+    ("latency.p99_9_ms", False),
+)
+
+
+async def run_benchmark(ids, host=SERVER_HOST, port=SERVER_PORT, duration=BENCHMARK_DURATION,
+                        warmup=WARMUP_DURATION, min_interval=BENCHMARK_MIN_INTERVAL,
+                        max_interval=BENCHMARK_MAX_INTERVAL, ramp_rate=0.0, tls=True, scheduler=None,
+                        wire_formats=WIRE_OFFER):
+    # run_benchmark() Function:
+    # Runs a fleet for 'warmup' + 'duration' seconds, timing every reading from send to the Bill that answers
+    # it. Counters and the histogram are reset after the warm-up. Returns (counters delta, LatencyHistogram,
+    # measured seconds).
+    counters = FleetCounters()
+    latency = LatencyHistogram()
+    stop = asyncio.Event()
+    fleet = asyncio.ensure_future(run_fleet(ids, ramp_rate, counters, host, port, None, min_interval, max_interval,
+                                            report_interval=0, stop=stop, tls=tls, scheduler=scheduler,
+                                            latency=latency, wire_formats=wire_formats))
+    try:
+        await asyncio.sleep(warmup)
+        latency.reset()
+        before = counters.snapshot()
+        start = time.perf_counter()
+        await asyncio.sleep(duration)
+        after = counters.snapshot()
+        elapsed = time.perf_counter() - start
+        # Copy the histogram before the last Bills of the stopping fleet are added to it.
+        measured = LatencyHistogram()
+        measured.merge(latency)
+    finally:
+        stop.set()
+        await fleet
+
+    delta = {field: after[field] - before[field] for field in FleetCounters.FIELDS}
+    delta["connected"] = after["connected"]
+    return delta, measured, elapsed
+
+
+def build_report(counters, latency, elapsed, label=None, config=None):
+    # build_report() Function:
+    # JSON report of one benchmark run: throughput, round trip percentiles, error counts and the histogram itself
+    # so reports from different server builds can be compared or merged later.
+    return {
+        "label": label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config or {},
+        "duration_s": round(elapsed, 3),
+        "readings": counters["readings_sent"],
+        "bills": counters["bills_received"],
+        "readings_per_second": round(counters["readings_sent"] / elapsed, 1) if elapsed else 0.0,
+        "bills_per_second": round(counters["bills_received"] / elapsed, 1) if elapsed else 0.0,
+        "latency": latency.summary(),
+        "errors": {field: counters[field] for field in ("errors", "auth_failures", "unanswered", "reconnects",
+                                                          "write_backlogs", "stalls", "readings_dropped",
+                                                          "readings_coalesced")},
+        "histogram": latency.to_dict(),
+    }
+
+
+def compare_reports(baseline, report):
+    # compare_reports() Function:
+    # Relative change of each COMPARED_METRICS value from 'baseline' to 'report', as
+    # {metric: (baseline, current, change, better)} with change a fraction (0.1 = 10% higher).
+    comparison = {}
+    for metric, higher_is_better in COMPARED_METRICS:
+        old, new = baseline, report
+        for key in metric.split("."):
+            old, new = old[key], new[key]
+        change = (new - old) / old if old else 0.0
+        comparison[metric] = (old, new, round(change, 4), change >= 0 if higher_is_better else change <= 0)
+    return comparison
+
+
+def format_comparison(comparison):
+    # format_comparison() Function:
+    # One line per metric for printing a comparison.
+    return "\n".join(f"{metric:22} {old:>10} -> {new:>10}  {change:+.1%}{'' if better else '  (worse)'}"
+                     for metric, (old, new, change, better) in comparison.items())
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the benchmark.
+    parser = argparse.ArgumentParser(description="Measure reading -> Bill round trip times and throughput.")
+    parser.add_argument("--meters", type=int, default=BENCHMARK_METERS)
+    parser.add_argument("--first-id", type=int, default=0)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--no-tls", action="store_true", help="connect without TLS (e.g. straight to port 8080)")
+    parser.add_argument("--json-only", action="store_true",
+                        help="don't offer the binary wire format when authenticating")
+    parser.add_argument("--duration", type=float, default=BENCHMARK_DURATION, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=WARMUP_DURATION, help="seconds before measuring")
+    parser.add_argument("--ramp-rate", type=float, default=0.0, help="meters started per second (0 = all at once)")
+    parser.add_argument("--min-interval", type=float, default=BENCHMARK_MIN_INTERVAL,
+                        help="shortest time between a meter's readings (seconds)")
+    parser.add_argument("--max-interval", type=float, default=BENCHMARK_MAX_INTERVAL)
+    parser.add_argument("--label", help="name of the server build being measured, stored in the report")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare this run against")
+    add_reconnect_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ids = range(args.first_id, args.first_id + args.meters)
+    counters, latency, elapsed = asyncio.run(run_benchmark(
+        ids, args.host, args.port, args.duration, args.warmup, args.min_interval,
+        max(args.min_interval, args.max_interval), args.ramp_rate, not args.no_tls,
+        ReconnectScheduler(**reconnect_options(args)), () if args.json_only else WIRE_OFFER))
+
+    config = {"meters": args.meters, "host": args.host, "port": args.port, "tls": not args.no_tls,
+              "min_interval": args.min_interval, "max_interval": args.max_interval, "warmup_s": args.warmup,
+              "wire_formats": [] if args.json_only else list(WIRE_OFFER)}
+    report = build_report(counters, latency, elapsed, args.label, config)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            print(format_comparison(compare_reports(json.load(file), report)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import random
+import unittest
+
+from ClientBenchmark import build_report, compare_reports, run_benchmark
+from ClientStats import LatencyHistogram
+from Fleettest import fake_server
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    def test_percentiles_within_histogram_precision(self):
+        """Test that percentiles match the exact ones to within 0.1% and survive a JSON round trip."""
+        rng = random.Random(4)
+        durations = [rng.lognormvariate(-6, 1) for _ in range(20000)]
+        histogram = LatencyHistogram()
+        for duration in durations:
+            histogram.record(duration)
+        durations.sort()
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = durations[int(q * len(durations)) - 1] * 1_000_000
+            self.assertAlmostEqual(histogram.percentile(q), exact, delta=exact * 0.001 + 1)
+
+        restored = LatencyHistogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+        self.assertEqual(restored.summary(), histogram.summary())
+
+    def test_merge(self):
+        """Test that merging histograms gives the same result as recording into one."""
+        first, second, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for n in range(1000):
+            (first if n % 2 else second).record(n / 10000)
+            both.record(n / 10000)
+        first.merge(second)
+        self.assertEqual(first.summary(), both.summary())
+
+
+class TestBenchmark(unittest.IsolatedAsyncioTestCase):
+    async def test_round_trips_are_matched_to_bills(self):
+        """Test that every billed reading gets a round trip time and the report has the expected fields."""
+        # Bills take at least 5 ms.
+        server = await asyncio.start_server(lambda r, w: fake_server(r, w, delay=0.005), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            counters, latency, elapsed = await run_benchmark(range(5), "127.0.0.1", port, duration=0.5, warmup=0.2,
+                                                             min_interval=0.02, max_interval=0.04, tls=False)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        report = build_report(counters, latency, elapsed, label="test")
+        self.assertGreater(report["bills"], 20)
+        self.assertAlmostEqual(latency.count, report["bills"], delta=5)
+        self.assertGreaterEqual(report["latency"]["p50_ms"], 5)
+        self.assertEqual(report["errors"]["errors"], 0)
+        json.dumps(report)
+
+    def test_compare_reports(self):
+        """Test that a comparison flags lower throughput and higher latency as worse."""
+        baseline = {"readings_per_second": 100.0, "bills_per_second": 100.0,
+                    "latency": {"p50_ms": 2.0, "p90_ms": 4.0, "p99_ms": 8.0, "p99_9_ms": 10.0}}
+        report = {"readings_per_second": 90.0, "bills_per_second": 110.0,
+                  "latency": {"p50_ms": 1.0, "p90_ms": 4.0, "p99_ms": 12.0, "p99_9_ms": 10.0}}
+        comparison = compare_reports(baseline, report)
+        self.assertEqual(comparison["readings_per_second"], (100.0, 90.0, -0.1, False))
+        self.assertTrue(comparison["bills_per_second"][3])
+        self.assertEqual(comparison["latency.p50_ms"], (2.0, 1.0, -0.5, True))
+        self.assertFalse(comparison["latency.p99_ms"][3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+import datetime
+import functools
+import json
+import math
+import struct
+import time
+from typing import NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Global Vars
+# MeterReading bytes up to the reading value, laid out exactly like json.dumps() of the reading dict so the wire
+# format doesn't change.
+READING_TEMPLATE = b'{"type": "MeterReading", "reading": %r}'
+# Bill frame used by the benchmark.
+SAMPLE_BILL = (b'{"type":"Bill","actual_usage":2.27,"standing_charge":0.4,"total":2.67,"units_start":9.1,'
+               b'"units_end":20.45,"price_per_unit":0.2,"daily_standing_charge":0.4,'
+               b'"billing_period":{"start":"2024-11-01","end":"2024-12-01"}}')
+# Authentication reply, optionally followed by ' wire=<format>' when the server accepts a wire format offered in
+# the auth message ({"id", "token", "wire": [formats]}). Servers that don't know the offer ignore it.
+AUTH_SUCCESSFUL = "Authentication successful"
+WIRE_REPLY = AUTH_SUCCESSFUL + " wire="
+# Binary wire format 'binary1': a one byte message tag, then big endian fixed layout fields.
+#   MeterReading            tag, reading (f64)                                          9 bytes
+#   Bill                    tag, actual_usage, standing_charge, total, units_start,    65 bytes
+#                           units_end, price_per_unit, daily_standing_charge (f64),
+#                           billing period start and end (i32 proleptic Gregorian ordinals, 0 = unknown)
+#   PowerGridIssue          tag, error (UTF-8, rest of the frame)
+#   PowerGridIssueResolved  tag
+TAG_READING = 1
+TAG_BILL = 2
+TAG_GRID_ISSUE = 3
+TAG_GRID_RESOLVED = 4
+READING_STRUCT = struct.Struct('>Bd')
+BILL_STRUCT = struct.Struct('>B7dii')
+
+
+class Bill(NamedTuple):
+    # Bill() Class:
+    # A Bill from the server (fields as sent, billing period split into start and end dates).
+    actual_usage: float = 0.0
+    standing_charge: float = 0.0
+    total: float = 0.0
+    units_start: float = 0.0
+    units_end: float = 0.0
+    price_per_unit: float = 0.0
+    daily_standing_charge: float = 0.0
+    billing_start: str = " "
+    billing_end: str = " "
+
+    @property
+    def units_used(self):
+        return self.units_end - self.units_start
+
+    @property
+    def billing_period(self):
+        return f"{self.billing_start} - {self.billing_end}"
+
+
+class PowerGridIssue(NamedTuple):
+    error: str = "Unknown error"
+
+
+class PowerGridIssueResolved(NamedTuple):
+    pass
+
+
+class UnknownMessage(NamedTuple):
+    # Any other JSON message, kept as the decoded dict.
+    data: dict
+
+
+def bill_from_dict(data):
+    period = data.get("billing_period") or {}
+    return Bill(data.get("actual_usage", 0.0), data.get("standing_charge", 0.0), data.get("total", 0.0),
+                data.get("units_start", 0.0), data.get("units_end", 0.0), data.get("price_per_unit", 0.0),
+                data.get("daily_standing_charge", 0.0), period.get("start", " "), period.get("end", " "))
+
+
+# Record builders by message "type".
+MESSAGE_TYPES = {
+    "Bill": bill_from_dict,
+    "PowerGridIssue": lambda data: PowerGridIssue(data.get("error", "Unknown error")),
+    "PowerGridIssueResolved": lambda data: PowerGridIssueResolved(),
+}
+
+
+def message_from_dict(data):
+    # message_from_dict() Function:
+    # Typed record (Bill, PowerGridIssue, PowerGridIssueResolved or UnknownMessage) for a decoded server message.
+    build = MESSAGE_TYPES.get(data.get("type")) if isinstance(data, dict) else None
+    return build(data) if build is not None else UnknownMessage(data)
+
+
+def stdlib_loads(frame):
+    # json.loads() doesn't take a memoryview, and decoding to str first is quicker than its own bytes handling.
+    return json.loads(frame if isinstance(frame, str) else str(frame, 'utf-8'))
+
+
+def stdlib_dumps(message):
+    return json.dumps(message).encode('utf-8')
+
+
+# JSON backends by name, fastest first. orjson is optional (pip install orjson).
+BACKENDS = {}
+if orjson is not None:
+    BACKENDS["orjson"] = (orjson.loads, orjson.dumps)
+BACKENDS["json"] = (stdlib_loads, stdlib_dumps)
+
+
+class MessageCodec:
+    # MessageCodec() Class:
+    # Encodes client messages and decodes server messages. MeterReadings are built from READING_TEMPLATE instead
+    # of json.dumps() on a new dict, server frames are parsed straight from bytes (or a memoryview into the
+    # FrameReader buffer) into typed records. 'backend' picks the JSON library, the fastest installed by default.
+
+    name = "json"
+
+    def __init__(self, backend=None):
+        self.backend = backend or next(iter(BACKENDS))
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown or missing JSON backend '{self.backend}', installed: {', '.join(BACKENDS)}")
+        self.loads, self.dumps = BACKENDS[self.backend]
+
+    def encode_reading(self, reading):
+        # encode_reading() Method:
+        # MeterReading payload for a cumulative reading.
+        if not math.isfinite(reading):
+            raise ValueError(f"Reading {reading} is not a finite number")
+        return READING_TEMPLATE % float(reading)
+
+    def encode(self, message):
+        # encode() Method:
+        # Payload for any other message (e.g. the auth message).
+        return self.dumps(message)
+
+    def decode(self, frame):
+        # decode() Method:
+        # Typed record for one server frame (bytes, memoryview or str). Raises ValueError if it isn't JSON,
+        # e.g. 'Another smart meter is already connected'.
+        return message_from_dict(self.loads(frame))
+
+
+CODEC = MessageCodec()
+
+
+@functools.lru_cache(maxsize=1024)
+def date_from_ordinal(ordinal):
+    # Billing dates repeat from Bill to Bill, so their strings are cached.
+    return datetime.date.fromordinal(ordinal).isoformat() if ordinal > 0 else " "
+
+
+def ordinal_from_date(text):
+    try:
+        return datetime.date.fromisoformat(text).toordinal()
+    except ValueError:
+        return 0
+
+
+class BinaryCodec:
+    # BinaryCodec() Class:
+    # The 'binary1' wire format (see TAG_READING above), used once the server has accepted it during
+    # authentication. Same interface as MessageCodec for the client, plus the server side encode / decode.
+
+    name = "binary1"
+
+    def encode_reading(self, reading):
+        # encode_reading() Method:
+        # MeterReading payload for a cumulative reading.
+        if not math.isfinite(reading):
+            raise ValueError(f"Reading {reading} is not a finite number")
+        return READING_STRUCT.pack(TAG_READING, reading)
+
+    def decode(self, frame):
+        # decode() Method:
+        # Typed record for one server frame. Raises ValueError for anything that isn't a binary1 message.
+        try:
+            tag = frame[0]
+            if tag == TAG_BILL:
+                fields = BILL_STRUCT.unpack(frame)
+                return Bill(*fields[1:8], date_from_ordinal(fields[8]), date_from_ordinal(fields[9]))
+            if tag == TAG_GRID_ISSUE:
+                return PowerGridIssue(str(frame[1:], 'utf-8'))
+            if tag == TAG_GRID_RESOLVED:
+                return PowerGridIssueResolved()
+        except (IndexError, struct.error) as e:
+            raise ValueError(f"Malformed binary message: {e}") from None
+        raise ValueError(f"Unknown binary message tag {frame[0]}")
+
+    def decode_reading(self, frame):
+        # decode_reading() Method:
+        # Reading value of a MeterReading payload (server side).
+        try:
+            tag, reading = READING_STRUCT.unpack(frame)
+        except struct.error as e:
+            raise ValueError(f"Malformed binary reading: {e}") from None
+        if tag != TAG_READING:
+            raise ValueError(f"Expected a MeterReading, got tag {tag}")
+        return reading
+
+    def encode_bill(self, bill):
+        # encode_bill() Method:
+        # Payload for a Bill record (server side).
+        return BILL_STRUCT.pack(TAG_BILL, *bill[:7], ordinal_from_date(bill.billing_start),
+                                ordinal_from_date(bill.billing_end))
+
+    def encode_grid_issue(self, error):
+        return bytes([TAG_GRID_ISSUE]) + error.encode('utf-8')
+
+    def encode_grid_resolved(self):
+        return bytes([TAG_GRID_RESOLVED])
+
+
+# Wire formats a client can offer during authentication, by name, and the ones offered by default.
+WIRE_FORMATS = {BinaryCodec.name: BinaryCodec}
+WIRE_OFFER = (BinaryCodec.name,)
+
+
+def auth_message(id, wire_formats=()):
+    # auth_message() Function:
+    # Auth message payload, offering 'wire_formats' (names from WIRE_FORMATS) in order of preference.
+    message = {"id": id, "token": str(id)}
+    if wire_formats:
+        message["wire"] = list(wire_formats)
+    return CODEC.encode(message)
+
+
+def negotiate(response, wire_formats=()):
+    # negotiate() Function:
+    # Codec to use after the server's auth reply (bytes or str), or None if authentication failed. A plain
+    # 'Authentication successful' means JSON, whether or not a wire format was offered.
+    if isinstance(response, (bytes, bytearray)):
+        response = str(response, 'utf-8', 'replace')
+    if response == AUTH_SUCCESSFUL:
+        return CODEC
+    if response is not None and response.startswith(WIRE_REPLY):
+        name = response[len(WIRE_REPLY):]
+        if name in wire_formats and name in WIRE_FORMATS:
+            return WIRE_FORMATS[name]()
+    return None
+
+
+def benchmark(codec, count, bill):
+    # benchmark() Function:
+    # Frames per second on one core: (MeterReading encode, Bill decode) with 'codec', 'bill' being a Bill frame
+    # in its wire format.
+    view = memoryview(bill)
+
+    start = time.perf_counter()
+    for n in range(count):
+        codec.encode_reading(n * 0.37)
+    encode = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        codec.decode(view)
+    decode = count / (time.perf_counter() - start)
+    return encode, decode
+
+
+def baseline(count):
+    # baseline() Function:
+    # Frames per second for the old path: json.dumps() of a new dict, and bytes -> str -> json.loads() -> .get().
+    start = time.perf_counter()
+    for n in range(count):
+        json.dumps({"type": "MeterReading", "reading": n * 0.37}).encode('utf-8')
+    encode = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        data = json.loads(str(SAMPLE_BILL, "utf-8"))
+        if data.get("type") == "Bill":
+            period = data.get("billing_period", {})
+            (data.get("total", 0.0), data.get("standing_charge", 0.0), data.get("price_per_unit", 0.0),
+             data.get("units_end", 0.0) - data.get("units_start", 0.0), period.get("start", " "),
+             period.get("end", " "))
+    decode = count / (time.perf_counter() - start)
+    return encode, decode
+
+
+def main(argv=None):
+    # argparse is only needed by the command line, not by every client importing the codec.
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bytes per message and frames per second per core for each "
+                                                 "message codec and JSON backend.")
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    # Frame sizes include the 2 byte length header. A typical cumulative reading, and a typical Bill.
+    reading = 1234.56
+    json_sizes = (len(CODEC.encode_reading(reading)) + 2, len(SAMPLE_BILL) + 2)
+    binary = BinaryCodec()
+    binary_bill = binary.encode_bill(CODEC.decode(SAMPLE_BILL))
+    binary_sizes = (len(binary.encode_reading(reading)) + 2, len(binary_bill) + 2)
+
+    print(f"{'codec':16} {'reading B':>10} {'bill B':>8} {'encode/s':>12} {'decode/s':>12} "
+          f"{'us/reading':>11}")
+    rows = [("json (dict)", json_sizes, baseline(args.count))]
+    rows += [(backend, json_sizes, benchmark(MessageCodec(backend), args.count, SAMPLE_BILL))
+             for backend in BACKENDS]
+    rows.append((binary.name, binary_sizes, benchmark(binary, args.count, binary_bill)))
+    for name, (reading_size, bill_size), (encode, decode) in rows:
+        # CPU per reading: encoding it plus decoding the Bill that answers it.
+        print(f"{name:16} {reading_size:>10} {bill_size:>8} {encode:>12,.0f} {decode:>12,.0f} "
+              f"{1e6 / encode + 1e6 / decode:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
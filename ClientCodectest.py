@@ -0,0 +1,89 @@
+import json
+import unittest
+
+from ClientCodec import (
+    BACKENDS,
+    CODEC,
+    SAMPLE_BILL,
+    Bill,
+    BinaryCodec,
+    MessageCodec,
+    PowerGridIssue,
+    PowerGridIssueResolved,
+    UnknownMessage,
+    negotiate,
+)
+
+
+class TestMessageCodec(unittest.TestCase):
+    def test_reading_matches_json_dumps(self):
+        """Test that the MeterReading template gives the same bytes as json.dumps() for every backend."""
+        for backend in BACKENDS:
+            codec = MessageCodec(backend)
+            for reading in (0.0, 1.5, 12345.678901234, 1e-7, 3):
+                self.assertEqual(codec.encode_reading(reading),
+                                 json.dumps({"type": "MeterReading", "reading": float(reading)}).encode('utf-8'))
+
+    def test_reading_must_be_finite(self):
+        """Test that NaN and infinity are refused rather than sent as invalid JSON."""
+        for reading in (float("nan"), float("inf")):
+            with self.assertRaises(ValueError):
+                MessageCodec().encode_reading(reading)
+
+    def test_decode_messages(self):
+        """Test decoding each server message into its record, from bytes and from a memoryview."""
+        for backend in BACKENDS:
+            codec = MessageCodec(backend)
+            bill = codec.decode(memoryview(SAMPLE_BILL))
+            self.assertIsInstance(bill, Bill)
+            self.assertEqual(bill.total, 2.67)
+            self.assertAlmostEqual(bill.units_used, 11.35)
+            self.assertEqual(bill.billing_period, "2024-11-01 - 2024-12-01")
+            self.assertEqual(codec.decode(b'{"type":"PowerGridIssue","error":"x"}'), PowerGridIssue("x"))
+            self.assertEqual(codec.decode(b'{"type":"PowerGridIssueResolved"}'), PowerGridIssueResolved())
+            self.assertEqual(codec.decode(b'{"type":"Other"}'), UnknownMessage({"type": "Other"}))
+            with self.assertRaises(ValueError):
+                codec.decode(b"Another smart meter is already connected")
+
+    def test_missing_fields_default(self):
+        """Test that a Bill with missing fields decodes with the same defaults as the old .get() calls."""
+        bill = MessageCodec().decode(b'{"type":"Bill","total":1.0}')
+        self.assertEqual((bill.total, bill.units_used, bill.billing_period), (1.0, 0.0, "  -  "))
+
+    def test_unknown_backend(self):
+        """Test that asking for a backend that isn't installed fails clearly."""
+        with self.assertRaises(ValueError):
+            MessageCodec("no-such-json")
+
+
+class TestBinaryCodec(unittest.TestCase):
+    def test_round_trip(self):
+        """Test that binary readings, Bills and power grid messages decode to what was encoded."""
+        codec = BinaryCodec()
+        bill = CODEC.decode(SAMPLE_BILL)
+        frame = codec.encode_bill(bill)
+        self.assertEqual(len(frame), 65)
+        self.assertEqual(codec.decode(memoryview(frame)), bill)
+        self.assertEqual(codec.decode_reading(codec.encode_reading(1234.5678)), 1234.5678)
+        self.assertEqual(len(codec.encode_reading(1.0)), 9)
+        self.assertEqual(codec.decode(codec.encode_grid_issue("outage")), PowerGridIssue("outage"))
+        self.assertEqual(codec.decode(codec.encode_grid_resolved()), PowerGridIssueResolved())
+
+    def test_unknown_dates_and_bad_frames(self):
+        """Test that missing billing dates survive the trip and malformed frames raise ValueError."""
+        codec = BinaryCodec()
+        self.assertEqual(codec.decode(codec.encode_bill(Bill(total=1.0))), Bill(total=1.0))
+        for frame in (b"", b"\x02short", b"\x09", b"Another smart meter is already connected"):
+            with self.assertRaises(ValueError):
+                codec.decode(frame)
+
+    def test_negotiate(self):
+        """Test picking the codec from the auth reply, falling back to JSON on a plain reply."""
+        self.assertIsInstance(negotiate(b"Authentication successful wire=binary1", ["binary1"]), BinaryCodec)
+        self.assertIs(negotiate("Authentication successful", ["binary1"]), CODEC)
+        self.assertIsNone(negotiate(b"Authentication successful wire=binary1", []))
+        self.assertIsNone(negotiate(b"Authentication failed", ["binary1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,726 @@
+# Protocol and network core of the smart meter client: framing, authentication, TLS and the connect loop.
+# Nothing here imports a GUI toolkit, so headless tools (ClientFleet, benchmarks, tests) load quickly and run
+# without a display. The window lives in ClientGUI.
+import socket
+import time
+import random
+import threading
+import ssl
+import struct
+import collections
+import contextlib
+import contextvars
+from ClientStats import duration_percentiles
+from ClientMetrics import METRICS, log_enabled, verbose
+from ClientCodec import CODEC, WIRE_OFFER, auth_message, negotiate
+from ClientReconnect import ReconnectScheduler
+
+# Global Vars
+# Declare config settings for the server
+SERVER_HOST = "localhost"
+SERVER_PORT = 8000
+MIN_READING_INTERVAL = 15
+MAX_READING_INTERVAL = 60
+# Most readings sent on a connection without their Bill yet, and what happens to a reading when that many are
+# outstanding: 'block' waits (up to STALL_TIMEOUT seconds) for a Bill, 'drop' doesn't send it, 'coalesce' keeps only
+# the latest cumulative reading and sends it as soon as a Bill frees a slot. Readings are cumulative, so dropped
+# or coalesced readings lose no kWh: the next reading sent includes them.
+MAX_IN_FLIGHT = 8
+BACKPRESSURE_POLICY = "block"
+STALL_TIMEOUT = 90
+
+# Client metrics (see ClientMetrics), exported per process and aggregated across processes.
+CONNECTS = METRICS.counter("smartmeter_connects_total", "Connections established and authenticated.")
+CONNECT_FAILURES = METRICS.counter("smartmeter_connect_failures_total", "Failed connection attempts.")
+AUTH_FAILURES = METRICS.counter("smartmeter_auth_failures_total", "Authentications refused, timed out or failed.")
+CONNECTED = METRICS.gauge("smartmeter_connected", "Meters currently connected.")
+READINGS_SENT = METRICS.counter("smartmeter_readings_sent_total", "Readings sent, replayed ones included.")
+READINGS_SKIPPED = METRICS.counter("smartmeter_readings_skipped_total",
+                                   "Readings not sent because the in-flight window was full (dropped or coalesced).")
+IN_FLIGHT = METRICS.gauge("smartmeter_readings_in_flight", "Readings sent and waiting for their Bill.")
+STALL_SECONDS = METRICS.counter("smartmeter_backpressure_stall_seconds_total",
+                                "Time spent waiting for a free in-flight slot.")
+BILLS_RECEIVED = METRICS.counter("smartmeter_bills_received_total", "Bills received.")
+GRID_ALERTS = METRICS.counter("smartmeter_grid_alerts_total", "Power grid issue alerts received.")
+FRAMES_RECEIVED = METRICS.counter("smartmeter_frames_received_total", "Frames received from the server.")
+BYTES_SENT = METRICS.counter("smartmeter_bytes_sent_total", "Bytes of reading frames sent.")
+BYTES_RECEIVED = METRICS.counter("smartmeter_bytes_received_total", "Bytes of frames received.")
+ROUND_TRIP = METRICS.histogram("smartmeter_reading_round_trip_seconds", "Time from sending a reading to its Bill.")
+
+
+def generate_meter_reading():
+    # generate_meter_reading() Function:
+    # Generates a random, realistic reading value (value between 0.5 kWh and 2.5 kWh).
+    return round(random.uniform(0.5, 2.5), 2)  
+
+
+def send_reading_to_server(sock, reading_data, timeout=120, writer=None, codec=CODEC):
+    # send_reading_to_server() Function:
+    # Sends reading to server and awaits response. 
+    # Pass the connection's FrameWriter as 'writer' so readings left queued by an earlier failed send go out
+    # together with this one, and the codec returned by authenticate() as 'codec'.
+    
+    try:
+        
+        # Ensure the socket is still open before attempting to send data
+        if sock.fileno() == -1:  # Check if the socket is closed
+            print("Socket is closed, attempting to reconnect...")
+            return "Error: Socket is closed"
+        
+        writer = writer or FrameWriter()
+
+            # Encode the reading and queue it as a frame (2 byte header + JSON data)
+        writer.enqueue(codec.encode_reading(reading_data["reading"]))
+        # Readings and bytes going out with this flush (including any left queued by an earlier failed send).
+        frames, queued = writer.depth(), writer.queued_bytes()
+
+            # Ensure that all data is sent using the SSL socket
+        try:
+            writer.flush(sock)
+        except socket.error as e:
+            print(f"Error while sending data: {e}")
+            return "Error sending data to server."  # Return error message if sending fails
+
+        READINGS_SENT.inc(frames)
+        BYTES_SENT.inc(queued)
+        if verbose():
+            print("Meter reading sent")
+        return ""
+
+    except socket.timeout:
+        print("Timeout: Server did not respond in time.")
+        return "Timeout: Server did not respond in time."  # Return timeout message if server response is delayed
+    except (ssl.SSLError, socket.error) as e:
+        print(f"Error sending or receiving data: {e}")
+        return f"Error: {e}"  # Return socket/SSL error message
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return f"Unexpected error: {e}"  # Return any unexpected error message
+
+# Frame header: 2 byte big-endian length, matching the server's LengthDelimitedCodec (u16).
+FRAME_HEADER = struct.Struct('>H')
+MAX_FRAME_SIZE = FRAME_HEADER.size + 0xFFFF
+# Initial FrameReader buffer: room for a dozen Bills. It only grows for a frame that does not fit, and goes back to
+# this size once that frame is consumed, so an idle connection holds a few KB rather than a maximum size frame.
+READ_BUFFER_SIZE = 4096
+
+
+class FrameReader:
+    # FrameReader() Class:
+    # Incremental decoder for length prefixed frames. Data is read in large chunks straight into one reusable
+    # bytearray, and every complete frame in it is returned as a memoryview (no copies). Partial headers and
+    # bodies stay in the buffer until the rest arrives.
+    #
+    # Can be fed from a blocking socket (read_from()), from bytes (feed()), or used as the buffer of an
+    # asyncio.BufferedProtocol (get_buffer() / buffer_updated()).
+    # Frames returned by frames() are only valid until the buffer is next written to.
+
+    def __init__(self, size=READ_BUFFER_SIZE):
+        self.size = max(size, FRAME_HEADER.size)
+        self.buffer = bytearray(self.size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def get_buffer(self, sizehint=-1):
+        # get_buffer() Method:
+        # Returns a writable memoryview of the free space at the end of the buffer, always large enough for the
+        # rest of the frame being received. Unconsumed data is first moved to the front when the free space gets
+        # short, or to a larger buffer when the frame's header announces more than fits.
+        if self.start == self.end:
+            self.start = self.end = 0
+            if len(self.buffer) > self.size:
+                self.resize(self.size)
+        else:
+            missing = self.missing()
+            if len(self.buffer) - self.end < max(missing, len(self.buffer) // 4):
+                self.compact(missing)
+        return self.view[self.end:]
+
+    def buffer_updated(self, nbytes):
+        # buffer_updated() Method:
+        # Marks 'nbytes' bytes written into the memoryview from get_buffer() as received.
+        self.end += nbytes
+
+    def feed(self, data):
+        # feed() Method:
+        # Copies received bytes into the buffer (for callers that already have the data), growing it to fit.
+        free = self.get_buffer()
+        if len(data) > len(free):
+            self.compact(len(data))
+            free = self.view[self.end:]
+        free[:len(data)] = data
+        self.buffer_updated(len(data))
+
+    def missing(self):
+        # missing() Method:
+        # Number of bytes still to come before the next frame (header included) is complete.
+        pending = self.end - self.start
+        if pending < FRAME_HEADER.size:
+            return FRAME_HEADER.size - pending
+        return FRAME_HEADER.size + FRAME_HEADER.unpack_from(self.buffer, self.start)[0] - pending
+
+    def compact(self, nbytes):
+        # compact() Method:
+        # Moves unconsumed data to the front of the buffer, leaving room for at least 'nbytes' more bytes. The
+        # data moves to a new, larger buffer if that room isn't there (frames already returned stay valid).
+        pending = self.end - self.start
+        if pending + max(nbytes, 1) > len(self.buffer):
+            self.resize(pending + max(nbytes, 1))
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+
+    def resize(self, size):
+        # resize() Method:
+        # Replaces the buffer with a new one of 'size' bytes, holding the unconsumed data at its front.
+        # Memoryviews of the old buffer may still be held by the caller, so it is never resized in place.
+        pending = self.end - self.start
+        buffer = bytearray(size)
+        buffer[:pending] = self.view[self.start:self.end]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.start, self.end = 0, pending
+
+    def read_from(self, sock):
+        # read_from() Method:
+        # Reads as much as is available (up to the free space) from a blocking socket into the buffer.
+        # Returns False if the peer closed the connection.
+        nbytes = sock.recv_into(self.get_buffer())
+        if nbytes == 0:
+            return False
+        self.buffer_updated(nbytes)
+        return True
+
+    def frames(self):
+        # frames() Method:
+        # Yields the body of every complete frame currently buffered, as memoryviews into the buffer.
+        while self.end - self.start >= FRAME_HEADER.size:
+            message_length = FRAME_HEADER.unpack_from(self.buffer, self.start)[0]
+            frame_end = self.start + FRAME_HEADER.size + message_length
+            if frame_end > self.end:
+                break
+            frame = self.view[self.start + FRAME_HEADER.size:frame_end]
+            self.start = frame_end
+            yield frame
+
+    def pending(self):
+        # pending() Method:
+        # Number of buffered bytes that do not yet form a complete frame.
+        return self.end - self.start
+
+
+class FrameWriter:
+    # FrameWriter() Class:
+    # Shared framing path for everything the client sends. Frames are queued back to back (header + payload) in
+    # one bytearray, so readings that back up behind a slow socket are coalesced and sent with as few send calls
+    # as possible. Sending goes through a memoryview, partial sends never copy the remaining data.
+    # depth() / queued_bytes() show how much is waiting on the socket.
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.sent = 0
+        # Buffer offset where each queued frame ends, used to count frames that are not fully sent.
+        self.frame_ends = collections.deque()
+
+    def enqueue(self, payload):
+        # enqueue() Method:
+        # Adds a frame to the write queue, does not send anything.
+        if len(payload) > 0xFFFF:
+            raise ValueError(f"Frame too large: {len(payload)} bytes")
+        if self.sent == len(self.buffer):
+            # Everything queued so far has been sent, reuse the buffer from the start.
+            self.buffer.clear()
+            self.sent = 0
+        self.buffer += FRAME_HEADER.pack(len(payload))
+        self.buffer += payload
+        self.frame_ends.append(len(self.buffer))
+
+    def flush(self, sock):
+        # flush() Method:
+        # Sends every queued frame. If sending fails the unsent data stays queued for the next flush.
+        with memoryview(self.buffer) as view:
+            while self.sent < len(view):
+                # Release each slice straight away, the buffer cannot grow while a view of it is alive.
+                with view[self.sent:] as remaining:
+                    sent = sock.send(remaining)
+                if sent == 0:
+                    raise RuntimeError("Socket connection broken")
+                self.sent += sent
+                while self.frame_ends and self.frame_ends[0] <= self.sent:
+                    self.frame_ends.popleft()
+        self.buffer.clear()
+        self.sent = 0
+
+    def send(self, sock, payload):
+        # send() Method:
+        # Queues one frame and flushes the queue.
+        self.enqueue(payload)
+        self.flush(sock)
+
+    def depth(self):
+        # depth() Method:
+        # Number of frames queued that have not been completely sent.
+        return len(self.frame_ends)
+
+    def queued_bytes(self):
+        # queued_bytes() Method:
+        # Number of bytes queued that have not been sent.
+        return len(self.buffer) - self.sent
+
+
+def pack_frame(payload):
+    # pack_frame() Function:
+    # Returns payload with its 2 byte length header, for transports that take whole frames (asyncio streams).
+    if len(payload) > 0xFFFF:
+        raise ValueError(f"Frame too large: {len(payload)} bytes")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def recv_exactly(sock, length):
+    # recv_exactly() Function:
+    # Keeps calling recv until 'length' bytes have arrived, returns None if the peer closes first.
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if len(chunk) == 0:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def receive_frame(sock):
+    # receive_frame() Function:
+    # Reads exactly one frame from the socket without reading past it (used for the authentication reply,
+    # before start_listener() takes over the socket with a FrameReader).
+    response = recv_exactly(sock, FRAME_HEADER.size)
+    if response is None:
+        return None
+    message_length = FRAME_HEADER.unpack(response)[0]
+    
+    response = recv_exactly(sock, message_length)
+    if response is None:
+        return None
+
+    return response.decode("utf-8")
+
+# Function to authenticate with the server
+def authenticate(sock, id, wire_formats=WIRE_OFFER):
+    # authenticate() Function.
+    # Attempts to authenticate the client to the server. Sends an authentication message of Id number as int + string, awaits
+    # response from server, and checks whether the authentication was successful ('Authentication successful').
+    # The message also offers 'wire_formats' (see ClientCodec). Returns the codec to use for the rest of the
+    # connection (binary if the server accepted it, otherwise JSON), or False if authentication failed.
+    
+    try:
+        # Set maximum allowable time for the authentication response to be received.
+        sock.settimeout(5)
+        # Using the ID, create a JSON encoded message to be sent to the server.
+        message = auth_message(id, wire_formats)
+        # Send header + authentication message to server.
+        FrameWriter().send(sock, message)
+
+        # Wait for the server's response. Allowing enough buffer size for the response (2048 bytes).
+        response = receive_frame(sock)
+        if response == None:
+            return False
+
+        # Check to see if server is alive and has successfully authenticated the client.
+        codec = negotiate(response, wire_formats)
+        if codec is not None:
+            if log_enabled("info"):
+                print(f"Client {id} Authentication successful ({codec.name} messages)")
+            return codec
+        else:
+            AUTH_FAILURES.inc()
+            print(f"Client {id} Authentication failed")
+            return False
+    except socket.timeout:
+        # Timeout error catch.
+        AUTH_FAILURES.inc()
+        print(f"Client {id} Authentication Timed out")
+        return False
+    except socket.error as e:
+        # Other socket error catch.
+        AUTH_FAILURES.inc()
+        print(f"Client {id} Error during authentication: {e}")
+        return False
+
+
+class InFlightWindow:
+    # InFlightWindow() Class:
+    # Per connection limit on readings sent without their Bill yet. The reading thread submit()s each reading
+    # before sending it, the listener thread complete()s the oldest one for each Bill. When 'limit' readings are
+    # in flight the 'policy' (see BACKPRESSURE_POLICY) decides what happens to the next, so a slow server slows the
+    # meter down instead of filling the socket buffers until a read times out.
+
+    POLICIES = ("block", "drop", "coalesce")
+
+    def __init__(self, limit=MAX_IN_FLIGHT, policy=BACKPRESSURE_POLICY, timeout=STALL_TIMEOUT):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}', expected one of {', '.join(self.POLICIES)}")
+        self.limit = max(1, limit)
+        self.policy = policy
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        # (journal sequence number, perf_counter() send time) of each reading in flight, oldest first.
+        self.in_flight = collections.deque()
+        # 'coalesce': the latest (sequence number, reading) waiting for a free slot.
+        self.held = None
+        self.closed = False
+        self.stats = collections.Counter()
+
+    def depth(self):
+        return len(self.in_flight)
+
+    def full(self):
+        return len(self.in_flight) >= self.limit
+
+    def _take_slot(self, seq):
+        self.in_flight.append((seq, time.perf_counter()))
+        IN_FLIGHT.inc()
+        self.stats["sent"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self.in_flight))
+
+    def submit(self, seq, reading):
+        # submit() Method:
+        # Asks to send a reading (journal sequence number 'seq'). Returns True if it may be sent now (it then
+        # counts as in flight), False if the policy dropped or held it back. Raises TimeoutError if a 'block' wait
+        # runs out and ConnectionError if the connection closes while waiting.
+        with self.condition:
+            if self.full():
+                if self.policy == "drop":
+                    self.stats["dropped"] += 1
+                    READINGS_SKIPPED.inc()
+                    return False
+                if self.policy == "coalesce":
+                    if self.held is not None:
+                        self.stats["coalesced"] += 1
+                        READINGS_SKIPPED.inc()
+                    self.held = (seq, reading)
+                    return False
+                self.stats["stalls"] += 1
+                start = time.perf_counter()
+                ready = self.condition.wait_for(lambda: self.closed or not self.full(), self.timeout)
+                stalled = time.perf_counter() - start
+                self.stats["stall_us"] += int(stalled * 1_000_000)
+                STALL_SECONDS.inc(stalled)
+                if self.closed:
+                    raise ConnectionError("Connection closed while waiting for a Bill")
+                if not ready:
+                    raise TimeoutError(f"No Bill for {self.timeout} s with {self.limit} readings in flight")
+            if self.closed:
+                raise ConnectionError("Connection closed")
+            # A newer reading replaces the one held back.
+            self.held = None
+            self._take_slot(seq)
+            return True
+
+    def take_held(self, timeout):
+        # take_held() Method:
+        # Waits up to 'timeout' seconds for a slot for the reading held back by 'coalesce'. Returns its
+        # (sequence number, reading), now in flight, or None if there is nothing to send (after the full timeout,
+        # or straight away if the window is closed).
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or (self.held is not None and not self.full()), timeout)
+            if self.closed or self.held is None or self.full():
+                return None
+            held, self.held = self.held, None
+            self._take_slot(held[0])
+            return held
+
+    def complete(self):
+        # complete() Method:
+        # A Bill arrived: frees the slot of the oldest reading in flight. Returns its (sequence number, send
+        # time), or None if nothing was in flight.
+        with self.condition:
+            if not self.in_flight:
+                return None
+            entry = self.in_flight.popleft()
+            if not self.closed:
+                IN_FLIGHT.dec()
+            self.condition.notify_all()
+            return entry
+
+    def close(self):
+        # close() Method:
+        # The connection is gone: wakes up anything waiting for a slot.
+        with self.condition:
+            if not self.closed:
+                # Readings still in flight are answered on the next connection, if at all.
+                IN_FLIGHT.dec(len(self.in_flight))
+            self.closed = True
+            self.condition.notify_all()
+
+    def summary(self):
+        # summary() Method:
+        # In flight depth (now and highest), readings sent, dropped and coalesced, and time stalled by 'block'.
+        summary = {"policy": self.policy, "limit": self.limit, "depth": len(self.in_flight)}
+        for field in ("max_depth", "sent", "dropped", "coalesced", "stalls"):
+            summary[field] = self.stats[field]
+        summary["stalled_s"] = round(self.stats["stall_us"] / 1_000_000, 3)
+        return summary
+
+
+def replay_journal(sock, journal, writer=None, codec=CODEC, window=None, trace=None, id=0):
+    # replay_journal() Function:
+    # Resends every reading in a ReadingJournal that hasn't been billed yet, oldest first and as fast as the
+    # socket takes them (queued on one FrameWriter, so they go out in a few large sends). With an InFlightWindow
+    # only as many as it allows are in flight at once and its policy applies to the rest. With a TraceWriter
+    # ('trace', see TrafficTrace) every reading is recorded for meter 'id'. Returns (readings replayed, seconds
+    # taken). Raises socket.error if sending fails, the readings then stay in the journal for the next
+    # connection.
+    items = journal.items()
+    if not items:
+        return 0, 0.0
+    writer = writer or FrameWriter()
+    start = time.perf_counter()
+    count = nbytes = 0
+    for seq, reading in items:
+        if window is not None:
+            if window.full():
+                # Send what is queued, so its Bills can free up slots.
+                writer.flush(sock)
+            if not window.submit(seq, reading):
+                continue
+        payload = codec.encode_reading(reading)
+        writer.enqueue(payload)
+        if trace is not None:
+            trace.reading(id, reading)
+        count += 1
+        nbytes += FRAME_HEADER.size + len(payload)
+    writer.flush(sock)
+    seconds = time.perf_counter() - start
+    READINGS_SENT.inc(count)
+    BYTES_SENT.inc(nbytes)
+    journal.record_replay(count, seconds)
+    return count, seconds
+
+
+# Session to resume for TLS connections made through asyncio (see ResumableSSLContext).
+RESUME_SESSION = contextvars.ContextVar("RESUME_SESSION", default=None)
+
+
+class ResumableSSLContext(ssl.SSLContext):
+    # ResumableSSLContext() Class:
+    # SSL context that can resume sessions on asyncio connections. asyncio.open_connection() has no session
+    # argument, so the session to resume is taken from RESUME_SESSION (set it with resuming()) when asyncio
+    # creates its SSL object. Blocking sockets pass session= to wrap_socket() as usual.
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = RESUME_SESSION.get()
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+
+@contextlib.contextmanager
+def resuming(session):
+    # resuming() Function:
+    # Context manager, asyncio TLS connections opened inside it try to resume 'session'.
+    token = RESUME_SESSION.set(session)
+    try:
+        yield
+    finally:
+        RESUME_SESSION.reset(token)
+
+
+def create_ssl_context():
+    # create_ssl_context() Function:
+    # Builds the SSL context used by clients to connect to the server (GUI clients and the headless fleet).
+    # Use get_ssl_context() instead, building a context (and loading certificates) on every connect is slow.
+
+    # Create a context that is meant for client connections (same settings as ssl.create_default_context())
+    context = ResumableSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_default_certs()
+    
+    # Load the server's certificate for verification
+    context.load_verify_locations(cafile="./Certificates/server.crt")
+    context.check_hostname = False
+
+    # Verify the server's certificate (still check the validity of the server's certificate)
+    context.verify_mode = ssl.CERT_REQUIRED
+    return context
+
+
+_ssl_context = None
+_ssl_context_lock = threading.Lock()
+
+
+def get_ssl_context():
+    # get_ssl_context() Function:
+    # Returns the process wide client SSL context, created on first use. Sharing one context is also what lets
+    # TLS sessions from earlier connections be resumed.
+    global _ssl_context
+    with _ssl_context_lock:
+        if _ssl_context is None:
+            _ssl_context = create_ssl_context()
+        return _ssl_context
+
+
+class TLSSessionCache:
+    # TLSSessionCache() Class:
+    # Keeps the last TLS session of each meter so that reconnects can resume it instead of doing a full handshake.
+
+    def __init__(self):
+        self.sessions = {}
+
+    def get(self, id):
+        # get() Method:
+        # Returns the session to resume for meter 'id', or None.
+        return self.sessions.get(id)
+
+    def store(self, id, ssl_object):
+        # store() Method:
+        # Saves the session of an SSLSocket / SSLObject. Call it after the first message has been received, with
+        # TLS 1.3 the server's session ticket only arrives after the handshake.
+        session = ssl_object.session if ssl_object is not None else None
+        if session is not None:
+            self.sessions[id] = session
+
+    def discard(self, id):
+        # discard() Method:
+        # Forgets the session of meter 'id' (e.g. after the server rejected it).
+        self.sessions.pop(id, None)
+
+
+class HandshakeStats:
+    # HandshakeStats() Class:
+    # Records how long each TLS handshake took and whether it resumed a session.
+
+    def __init__(self):
+        self.durations = []
+        self.resumed = 0
+
+    def record(self, seconds, resumed):
+        # record() Method:
+        # Adds one handshake.
+        self.durations.append(seconds)
+        if resumed:
+            self.resumed += 1
+
+    def summary(self):
+        # summary() Method:
+        # Returns handshake count, resumption hit rate and handshake time percentiles (milliseconds).
+        count = len(self.durations)
+        summary = {
+            "handshakes": count,
+            "resumed": self.resumed,
+            "resumption_rate": round(self.resumed / count, 3) if count else 0.0,
+        }
+        summary.update(duration_percentiles(self.durations))
+        return summary
+
+
+# Per process TLS session cache and handshake statistics used by run_client().
+TLS_SESSIONS = TLSSessionCache()
+HANDSHAKE_STATS = HandshakeStats()
+# Per process reconnect backoff and connect admission control used by run_client().
+RECONNECT_SCHEDULER = ReconnectScheduler()
+
+
+def run_client(frame, id, max_retries=5):
+    # Main client function: connects to the server using SSL, authenticates, 
+    # and then communicates with the server with readings.
+    
+    context = get_ssl_context()
+
+    # Consecutive failed connection attempts, and when the last working connection was lost (time.monotonic()).
+    retries = 0
+    disconnected_at = None
+
+    while True:
+        if retries or disconnected_at is not None:
+            # Jittered exponential backoff so meters that lost the server together don't all retry together.
+            # The meter keeps taking readings (into its journal) while it waits.
+            frame.wait_offline(RECONNECT_SCHEDULER.retry_delay(retries))
+
+    
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            connected = False
+            try:
+                # Attempt to connect to the server (waits for the connect rate limit and a free connect slot)
+                sock.settimeout(10)
+                with RECONNECT_SCHEDULER.connecting():
+                    sock.connect((SERVER_HOST, SERVER_PORT))
+
+                    # Wrap the socket with SSL, resuming the previous session of this meter if there is one
+                    handshake_start = time.perf_counter()
+                    ssl_sock = context.wrap_socket(sock, server_hostname=SERVER_HOST, session=TLS_SESSIONS.get(id))
+                    HANDSHAKE_STATS.record(time.perf_counter() - handshake_start, ssl_sock.session_reused)
+
+                frame.set_status("Connected")
+                if frame.trace is not None:
+                    frame.trace.connect(id)
+                if log_enabled("info"):
+                    print(f"Client {id} Connected to server {SERVER_HOST}:{SERVER_PORT} with SSL "
+                          f"(session resumed: {ssl_sock.session_reused}) {HANDSHAKE_STATS.summary()}")
+
+                # Authenticate the client with the server
+                codec = authenticate(ssl_sock, id)
+                if not codec:
+                    frame.set_status("Authentication Failed")
+                    return
+                frame.codec = codec
+                if frame.trace is not None:
+                    frame.trace.auth(id, codec)
+                TLS_SESSIONS.store(id, ssl_sock)
+
+                RECONNECT_SCHEDULER.connected(disconnected_at)
+                CONNECTS.inc()
+                CONNECTED.inc()
+                if log_enabled("info"):
+                    print(f"Client {id} {RECONNECT_SCHEDULER.stats.summary()}")
+                connected = True
+                retries = 0
+                disconnected_at = None
+
+                # Store the SSL socket in the frame
+                frame.sock = ssl_sock
+                frame.sock.settimeout(90)
+                frame.writer = FrameWriter()
+                frame.window = InFlightWindow()
+                
+                # Start the reading events
+                receiver = threading.Thread(target=frame.start_listener, daemon=False)
+                receiver.start()
+                # Readings not billed on the last connection (or taken while offline) go first, at full speed,
+                # before readings resume at the normal pace. Bills answer them in order.
+                count, seconds = replay_journal(frame.sock, frame.journal, frame.writer, codec, frame.window,
+                                                frame.trace, id)
+                if count and log_enabled("info"):
+                    print(f"Client {id} Replayed {count} readings in {seconds * 1000:.1f} ms "
+                          f"({count / seconds:,.0f} readings/s)")
+                frame.start_reading_events()
+                frame.sock.shutdown(socket.SHUT_RDWR)
+                receiver.join()
+                frame.sock.close()
+                CONNECTED.dec()
+                connected = False
+                if frame.trace is not None:
+                    frame.trace.disconnect(id)
+                if log_enabled("info"):
+                    print(f"Client {id} In flight {frame.window.summary()}")
+                disconnected_at = time.monotonic()
+                
+
+            except ssl.SSLError as e:
+                if connected:
+                    CONNECTED.dec()
+                else:
+                    CONNECT_FAILURES.inc()
+                print(f"Client {id} SSL Error: {e}")
+                frame.set_status("SSL Error")
+                TLS_SESSIONS.discard(id)
+                break  # Stop retrying on SSL errors
+
+            except socket.error as e:
+                if connected:
+                    CONNECTED.dec()
+                    disconnected_at = time.monotonic()
+                    if frame.trace is not None:
+                        frame.trace.disconnect(id)
+                else:
+                    CONNECT_FAILURES.inc()
+                    retries += 1
+                print(f"Client {id} Failed to connect to server: {e}")
+                frame.set_status(f"Connection Failed, retrying")
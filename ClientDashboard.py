@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import threading
+
+import customtkinter as ctk
+
+from ClientCodec import WIRE_OFFER
+from ClientFleet import FleetCounters, add_reconnect_args, reconnect_options, run_fleet
+from ClientReconnect import ReconnectScheduler
+from MeterState import MeterState
+from ClientCore import SERVER_HOST, SERVER_PORT, MIN_READING_INTERVAL, MAX_READING_INTERVAL
+from ClientGUI import RENDER_FPS, LabelCache, SmartMeterGUI
+
+# Global Vars
+# Default dashboard settings: meters shown and how quickly they are connected (meters per second).
+DASHBOARD_METERS = 20
+DASHBOARD_RAMP_RATE = 50.0
+# The meter table only ever draws TABLE_ROWS rows, whatever the size of the fleet: scrolling changes which meters
+# the rows show instead of creating a widget per meter.
+TABLE_ROWS = 20
+ROW_HEIGHT = 22
+ROW_FORMAT = "{:>6}  {:<34}  {:>12}  {:>10}"
+TABLE_HEADER = ROW_FORMAT.format("Meter", "Status", "Reading kWh", "Bill")
+# Seconds to wait for the fleet to disconnect when the dashboard is closed.
+STOP_TIMEOUT = 10
+
+
+def meter_row(meter):
+    # meter_row() Function:
+    # Table text for one FleetMeter.
+    return ROW_FORMAT.format(meter.id, meter.status[:34], f"{meter.cumulative_reading:.2f}",
+                             f"£{meter.total_bill:.2f}")
+
+
+def visible_rows(meters, first, rows=TABLE_ROWS):
+    # visible_rows() Function:
+    # Text of the 'rows' table rows starting at meter index 'first', "" for rows past the end of the fleet.
+    shown = [meter_row(meter) for meter in meters[first:first + rows]]
+    return shown + [""] * (rows - len(shown))
+
+
+def fleet_summary(state):
+    # fleet_summary() Function:
+    # One line summary of the fleet's MeterState: meters connected, kWh read and billed so far, and grid alerts
+    # showing (reductions over whole columns, so this stays cheap for very large fleets).
+    return (f"Connected: {state.connected()}/{state.size}   Total: {state.total_kwh():,.2f} kWh   "
+            f"Billed: £{state.total_billed():,.2f}   Grid alerts: {state.grid_alerts()}")
+
+
+def scroll_to(first, total, rows, *args):
+    # scroll_to() Function:
+    # First meter index shown after a Tk scroll command ('moveto', fraction) or ('scroll', count, 'units' /
+    # 'pages'), kept within the fleet.
+    if args[0] == "moveto":
+        first = round(float(args[1]) * total)
+    elif args[0] == "scroll":
+        first += int(args[1]) * (rows if args[2] == "pages" else 1)
+    return min(max(0, first), max(0, total - rows))
+
+
+class FleetThread(threading.Thread):
+    # FleetThread() Class:
+    # Runs a headless fleet (see ClientFleet.run_fleet) on its own event loop in a background thread, so a window
+    # can show the FleetMeters while the Tk main loop runs. 'meters' fills in once the fleet has started, 'state'
+    # is the fleet's MeterState.
+
+    def __init__(self, ids, **options):
+        super().__init__(daemon=True)
+        self.ids = ids
+        self.options = options
+        self.counters = FleetCounters()
+        self.state = MeterState(ids)
+        self.meters = []
+        self.loop = None
+        self.stop_event = None
+        self.ready = threading.Event()
+
+    def run(self):
+        asyncio.run(self.run_fleet())
+
+    async def run_fleet(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.ready.set()
+        await run_fleet(self.ids, counters=self.counters, stop=self.stop_event, on_start=self.meters.extend,
+                        report_interval=0, state=self.state, **self.options)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        # stop() Method:
+        # Stops the fleet (from any thread) and waits up to 'timeout' seconds for its meters to disconnect.
+        if self.ready.wait(timeout):
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.join(timeout)
+
+
+class MeterDetail(ctk.CTkFrame):
+    # MeterDetail() Class:
+    # Detail pane for the meter picked in the table, laid out like a SmartMeterGUI window.
+
+    # The labels have the same names as SmartMeterGUI's, so its update_GUI() fills them in.
+    update_GUI = SmartMeterGUI.update_GUI
+
+    def __init__(self, master):
+        super().__init__(master, width=540, height=250)
+        self.labels = LabelCache()
+
+        # Meter id : Which meter is shown.
+        self.meter_label = ctk.CTkLabel(self, text="Select a meter", font=("Arial", 12), text_color="white")
+        self.meter_label.place(x=20, y=10)
+
+        # Same elements and positions as SmartMeterGUI.
+        self.electric_icon_label = ctk.CTkLabel(self, text="⚡", font=("Arial", 40), text_color="yellow")
+        self.electric_icon_label.place(x=20, y=60)
+        self.cost_label = ctk.CTkLabel(self, text="£0.00", font=("Arial", 24), text_color="white")
+        self.cost_label.place(x=100, y=60)
+        self.units_used_label = ctk.CTkLabel(self, text="Units Used: 0.0 kWh", font=("Arial", 12), text_color="white")
+        self.units_used_label.place(x=100, y=90)
+        self.price_per_unit_label = ctk.CTkLabel(self, text="Price per kWh: £0.00", font=("Arial", 12), text_color="white")
+        self.price_per_unit_label.place(x=100, y=120)
+        self.standing_charge_label = ctk.CTkLabel(self, text="Standing Charge: £0.00", font=("Arial", 12), text_color="white")
+        self.standing_charge_label.place(x=300, y=90)
+        self.billing_period_label = ctk.CTkLabel(self, text="Billing Period: 0 Days", font=("Arial", 12), text_color="white")
+        self.billing_period_label.place(x=300, y=120)
+        self.status_label = ctk.CTkLabel(self, text="Not Connected", font=("Arial", 12), text_color="white")
+        self.status_label.place(x=10, y=180)
+
+    def show(self, meter):
+        # show() Method:
+        # Shows the current values of a FleetMeter.
+        self.labels.set(self.meter_label, f"Meter {meter.id}")
+        self.update_GUI(meter.total_bill, meter.standing_charge, meter.price_per_unit, meter.units_used,
+                        meter.billing_period)
+        self.labels.set(self.status_label, meter.status)
+
+
+class FleetDashboard(ctk.CTk):
+    # FleetDashboard() Class:
+    # One window for a whole fleet: a fleet summary, a scrolling meter table which only draws the rows in view and
+    # a detail pane for the meter clicked on. The fleet runs headless in a FleetThread, the window reads its meters
+    # on a render tick like SmartMeterGUI's.
+
+    def __init__(self, fleet):
+        super().__init__()
+        self.fleet = fleet
+        self.title("Smart Meter Fleet")
+        self.geometry("1140x560")
+        self.configure(bg="black")
+        self.protocol("WM_DELETE_WINDOW", self.exit)
+        self.labels = LabelCache()
+        # Index of the meter in the top table row, and the meter shown in the detail pane.
+        self.first = 0
+        self.selected = None
+        self.scroll_position = None
+
+        # Fleet summary : Connected meters, kWh, billing and grid alerts.
+        self.summary_label = ctk.CTkLabel(self, text="Starting...", font=("Arial", 14), text_color="white")
+        self.summary_label.place(x=10, y=10)
+
+        # Meter table : A fixed set of row labels, scrolled by changing the meters they show.
+        self.header_label = ctk.CTkLabel(self, text=TABLE_HEADER, font=("Courier", 12), text_color="gray")
+        self.header_label.place(x=10, y=50)
+        self.row_labels = []
+        for slot in range(TABLE_ROWS):
+            label = ctk.CTkLabel(self, text="", font=("Courier", 12), text_color="white", height=ROW_HEIGHT,
+                                 anchor="w")
+            label.place(x=10, y=75 + slot * ROW_HEIGHT)
+            label.bind("<Button-1>", lambda event, slot=slot: self.select(slot))
+            self.row_labels.append(label)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview, height=TABLE_ROWS * ROW_HEIGHT)
+        self.scrollbar.place(x=560, y=75)
+        for widget in (self, *self.row_labels):
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", lambda event: self.yview("scroll", -1, "units"))
+            widget.bind("<Button-5>", lambda event: self.yview("scroll", 1, "units"))
+
+        # Detail pane : The selected meter, laid out like a SmartMeterGUI window.
+        self.detail = MeterDetail(self)
+        self.detail.place(x=590, y=75)
+
+        # Exit button : Stops the fleet and closes the dashboard.
+        self.exit_button = ctk.CTkButton(self, text="Exit", command=self.exit)
+        self.exit_button.place(x=10, y=75 + TABLE_ROWS * ROW_HEIGHT + 20)
+
+        self.render()
+
+    def render(self):
+        # render() Method:
+        # Render tick, at most RENDER_FPS times a second: redraws the summary, the rows in view and the detail pane.
+        # Labels are only reconfigured when their text changes.
+        meters = self.fleet.meters
+        self.labels.set(self.summary_label, fleet_summary(self.fleet.state))
+        for label, text in zip(self.row_labels, visible_rows(meters, self.first)):
+            self.labels.set(label, text)
+
+        position = ((self.first / len(meters), min(1.0, (self.first + TABLE_ROWS) / len(meters)))
+                    if meters else (0.0, 1.0))
+        if position != self.scroll_position:
+            self.scrollbar.set(*position)
+            self.scroll_position = position
+
+        if self.selected is not None:
+            self.detail.show(self.selected)
+
+        self.after(1000 // RENDER_FPS, self.render)
+
+    def yview(self, *args):
+        # yview() Method:
+        # Scrollbar / mouse wheel command, moves the table and redraws the rows on the next tick.
+        self.first = scroll_to(self.first, len(self.fleet.meters), TABLE_ROWS, *args)
+
+    def on_mousewheel(self, event):
+        # on_mousewheel() Method:
+        # Windows / macOS mouse wheel, three meters per notch.
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+
+    def select(self, slot):
+        # select() Method:
+        # Shows the meter in table row 'slot' in the detail pane.
+        index = self.first + slot
+        if index < len(self.fleet.meters):
+            self.selected = self.fleet.meters[index]
+
+    def exit(self):
+        # exit() Method:
+        # Stops the fleet and closes the dashboard.
+        self.fleet.stop()
+        print(self.fleet.counters.summary())
+        self.destroy()
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the dashboard.
+    parser = argparse.ArgumentParser(description="Watch a fleet of smart meters in one window.")
+    parser.add_argument("--meters", type=int, default=DASHBOARD_METERS)
+    parser.add_argument("--first-id", type=int, default=0)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--no-tls", action="store_true", help="connect without TLS (e.g. straight to port 8080)")
+    parser.add_argument("--json-only", action="store_true",
+                        help="don't offer the binary wire format when authenticating")
+    parser.add_argument("--ramp-rate", type=float, default=DASHBOARD_RAMP_RATE,
+                        help="meters started per second (0 = all at once)")
+    parser.add_argument("--min-interval", type=float, default=MIN_READING_INTERVAL,
+                        help="shortest time between a meter's readings (seconds)")
+    parser.add_argument("--max-interval", type=float, default=MAX_READING_INTERVAL)
+    add_reconnect_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fleet = FleetThread(range(args.first_id, args.first_id + args.meters), ramp_rate=args.ramp_rate,
+                        host=args.host, port=args.port, min_interval=args.min_interval,
+                        max_interval=max(args.min_interval, args.max_interval), tls=not args.no_tls,
+                        scheduler=ReconnectScheduler(**reconnect_options(args)),
+                        wire_formats=() if args.json_only else WIRE_OFFER)
+    fleet.start()
+
+    # Set default appearance mode and color theme
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("green")
+    FleetDashboard(fleet).mainloop()
+
+
+if __name__ == "__main__":
+    main()
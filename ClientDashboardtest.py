@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+from unittest.mock import Mock
+
+from ClientCodec import Bill
+from ClientDashboard import (
+    TABLE_ROWS,
+    FleetDashboard,
+    FleetThread,
+    fleet_summary,
+    meter_row,
+    scroll_to,
+    visible_rows,
+)
+from ClientFleet import FleetCounters, FleetMeter
+from ClientGUI import LabelCache
+from MeterState import MeterState
+from StandInServer import StandInServer
+
+
+def make_meters(count, counters=None):
+    counters = counters or FleetCounters()
+    meters = [FleetMeter(id, counters, None) for id in range(count)]
+    for meter in meters:
+        meter.cumulative_reading = meter.id + 0.5
+        meter.handle_message(Bill(total=meter.id * 0.2, units_start=0.0, units_end=meter.id))
+    return meters
+
+
+class TestDashboardTable(unittest.TestCase):
+    def test_visible_rows(self):
+        """Test that only the rows in view are formatted, padded past the end of the fleet."""
+        meters = make_meters(25)
+        rows = visible_rows(meters, 10)
+        self.assertEqual(len(rows), TABLE_ROWS)
+        self.assertEqual(rows[0], meter_row(meters[10]))
+        self.assertEqual(rows[14], meter_row(meters[24]))
+        self.assertEqual(rows[15:], [""] * 5)
+        self.assertIn("£2.00", rows[0])
+
+    def test_scroll_to(self):
+        """Test scrollbar and mouse wheel commands, clamped to the fleet."""
+        self.assertEqual(scroll_to(0, 1000, 20, "moveto", "0.5"), 500)
+        self.assertEqual(scroll_to(0, 1000, 20, "moveto", "1.0"), 980)
+        self.assertEqual(scroll_to(100, 1000, 20, "scroll", 1, "pages"), 120)
+        self.assertEqual(scroll_to(2, 1000, 20, "scroll", -3, "units"), 0)
+        self.assertEqual(scroll_to(0, 5, 20, "scroll", 1, "pages"), 0)
+
+    def test_fleet_summary(self):
+        """Test the fleet summary line."""
+        state = MeterState(range(4))
+        meters = [FleetMeter(id, FleetCounters(), None, state=state, row=id) for id in range(4)]
+        for meter in meters:
+            meter.cumulative_reading = meter.id + 0.5
+            meter.handle_message(Bill(total=meter.id * 0.2))
+            meter.status = "Connected"
+        meters[1].status = "Power Grid Issue: outage"
+        meters[3].status = "Disconnected"
+        self.assertEqual(fleet_summary(state), "Connected: 3/4   Total: 8.00 kWh   Billed: £1.20   Grid alerts: 1")
+
+    def test_render_only_draws_rows_in_view(self):
+        """Test that a render tick over thousands of meters configures only the table rows, and only once."""
+        meters = make_meters(5000)
+        fleet = Mock(meters=meters, state=MeterState(range(5000)))
+        gui = Mock(fleet=fleet, labels=LabelCache(), first=0, selected=None, scroll_position=None,
+                   row_labels=[Mock() for _ in range(TABLE_ROWS)])
+        FleetDashboard.yview(gui, "moveto", "0.5")
+        FleetDashboard.render(gui)
+        self.assertEqual(gui.first, 2500)
+        gui.row_labels[0].configure.assert_called_once_with(text=meter_row(fleet.meters[2500]))
+        gui.scrollbar.set.assert_called_once_with(0.5, 0.504)
+
+        FleetDashboard.select(gui, 3)
+        self.assertIs(gui.selected, fleet.meters[2503])
+        FleetDashboard.render(gui)
+        self.assertTrue(all(label.configure.call_count == 1 for label in gui.row_labels))
+        gui.detail.show.assert_called_once_with(fleet.meters[2503])
+
+
+class TestFleetThread(unittest.IsolatedAsyncioTestCase):
+    async def test_fleet_runs_in_background_thread(self):
+        """Test that the dashboard's fleet runs on its own thread against the stand-in server and stops cleanly."""
+        async with StandInServer(port=0, seed=1) as server:
+            fleet = FleetThread(range(10), ramp_rate=0, host="127.0.0.1", port=server.port, min_interval=0.01,
+                                max_interval=0.02, tls=False)
+            fleet.start()
+            while fleet.counters.bills_received < 50:
+                await asyncio.sleep(0.01)
+            self.assertEqual(len(fleet.meters), 10)
+            await asyncio.to_thread(fleet.stop)
+        self.assertFalse(fleet.is_alive())
+        self.assertEqual(fleet.counters.errors, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,919 @@
+import argparse
+import asyncio
+import collections
+import random
+import socket
+import ssl
+import threading
+import time
+
+from ClientReconnect import (
+    CONNECT_BURST,
+    CONNECT_RATE,
+    MAX_CONNECTS_IN_FLIGHT,
+    RECONNECT_BASE_DELAY,
+    RECONNECT_MAX_DELAY,
+    ReconnectScheduler,
+)
+from SimClock import ReadingScheduler, SimClock
+from MeterState import MeterState, StateColumn
+from ClientCodec import (
+    CODEC,
+    WIRE_OFFER,
+    Bill,
+    PowerGridIssue,
+    PowerGridIssueResolved,
+    auth_message,
+    negotiate,
+)
+from ClientMetrics import METRICS, METRICS_PORT, serve_metrics
+from ClientCore import (
+    SERVER_HOST,
+    SERVER_PORT,
+    MIN_READING_INTERVAL,
+    MAX_READING_INTERVAL,
+    MAX_IN_FLIGHT,
+    BACKPRESSURE_POLICY,
+    STALL_TIMEOUT,
+    STALL_SECONDS,
+    AUTH_FAILURES,
+    BILLS_RECEIVED,
+    BYTES_RECEIVED,
+    BYTES_SENT,
+    CONNECTED,
+    FRAME_HEADER,
+    FRAMES_RECEIVED,
+    GRID_ALERTS,
+    READINGS_SENT,
+    ROUND_TRIP,
+    FrameReader,
+    HandshakeStats,
+    InFlightWindow,
+    TLSSessionCache,
+    get_ssl_context,
+    pack_frame,
+    resuming,
+    generate_meter_reading,
+)
+
+# Global Vars
+# Declare config settings for the headless fleet
+CONNECT_TIMEOUT = 10
+AUTH_TIMEOUT = 5
+READ_TIMEOUT = 90
+REPORT_INTERVAL = 5
+# Fleet metrics are served on their own port, next to the GUI clients' (METRICS_PORT). Sharded fleets dump each
+# shard's metrics into FLEET_METRICS_DIR, where FleetSupervisor adds them up.
+FLEET_METRICS_PORT = METRICS_PORT + 1
+FLEET_METRICS_DIR = "./metrics/fleet"
+# Process metric (see ClientMetrics) each FleetCounters field is exported to: the GUI client's metric where there is
+# one, so that client and fleet processes add up, otherwise one of the fleet's own.
+FLEET_METRICS = {
+    "connected": CONNECTED,
+    "readings_sent": READINGS_SENT,
+    "bills_received": BILLS_RECEIVED,
+    "grid_alerts": GRID_ALERTS,
+    "auth_failures": AUTH_FAILURES,
+    "frames_received": FRAMES_RECEIVED,
+    "bytes_sent": BYTES_SENT,
+    "bytes_received": BYTES_RECEIVED,
+    "errors": METRICS.counter("smartmeter_fleet_errors_total", "Fleet connection, protocol and message errors."),
+    "write_backlogs": METRICS.counter("smartmeter_fleet_write_backlogs_total",
+                                      "Fleet readings queued behind data still in the socket's write buffer."),
+    "handshakes": METRICS.counter("smartmeter_fleet_tls_handshakes_total", "Fleet TLS handshakes."),
+    "resumed_handshakes": METRICS.counter("smartmeter_fleet_tls_resumed_handshakes_total",
+                                          "Fleet TLS handshakes that resumed a session."),
+    "connect_attempts": METRICS.counter("smartmeter_fleet_connect_attempts_total", "Fleet connection attempts."),
+    "reconnects": METRICS.counter("smartmeter_fleet_reconnects_total", "Fleet reconnections after a lost connection."),
+    "unanswered": METRICS.counter("smartmeter_fleet_unanswered_readings_total",
+                                  "Fleet readings still waiting for their Bill when their connection was lost."),
+    "readings_dropped": METRICS.counter("smartmeter_fleet_readings_dropped_total",
+                                        "Fleet readings dropped by a full in-flight window."),
+    "readings_coalesced": METRICS.counter("smartmeter_fleet_readings_coalesced_total",
+                                          "Fleet readings replaced by a newer one while held back."),
+    "stalls": METRICS.counter("smartmeter_fleet_stalls_total", "Fleet waits for a Bill to free an in-flight slot."),
+}
+
+
+class FleetCounters:
+    # FleetCounters() Class:
+    # Running totals shared by every meter in the fleet, printed as the fleet summary.
+
+    # Counter names, in the order they are published by fleet workers (see FleetSupervisor).
+    FIELDS = ("connected", "readings_sent", "bills_received", "grid_alerts", "auth_failures", "errors",
+              "write_backlogs", "handshakes", "resumed_handshakes", "connect_attempts", "reconnects", "unanswered",
+              "readings_dropped", "readings_coalesced", "stalls", "frames_received", "bytes_sent", "bytes_received")
+
+    def __init__(self):
+        self.connected = 0
+        self.readings_sent = 0
+        self.bills_received = 0
+        self.grid_alerts = 0
+        self.auth_failures = 0
+        self.errors = 0
+        # Readings queued while the previous ones were still in the transport's write buffer (socket bottleneck).
+        self.write_backlogs = 0
+        self.handshakes = 0
+        self.resumed_handshakes = 0
+        self.connect_attempts = 0
+        self.reconnects = 0
+        # Readings still waiting for their Bill when the connection was lost.
+        self.unanswered = 0
+        # In-flight window (see FleetWindow): readings not sent by the 'drop' policy, readings replaced by a newer
+        # one while held back, and 'block' waits for a Bill.
+        self.readings_dropped = 0
+        self.readings_coalesced = 0
+        self.stalls = 0
+        # Frames and bytes received, bytes of reading frames sent (as counted by the GUI client).
+        self.frames_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # Values last added to the process metrics by export().
+        self.exported = dict.fromkeys(self.FIELDS, 0)
+        self.export_lock = threading.Lock()
+
+    def snapshot(self):
+        # snapshot() Method:
+        # Returns the current counter values as a plain dict.
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def summary(self):
+        # summary() Method:
+        # Returns a single line summary of the fleet counters.
+        return format_summary(self.snapshot())
+
+    def export(self):
+        # export() Method:
+        # Adds what has been counted since the last export to the process metrics (FLEET_METRICS). Registered as a
+        # metrics collector by run_fleet(), so it runs before every dump or scrape, from any thread.
+        with self.export_lock:
+            for field, metric in FLEET_METRICS.items():
+                value = getattr(self, field)
+                if value != self.exported[field]:
+                    metric.inc(value - self.exported[field])
+                    self.exported[field] = value
+
+
+class FleetWindow(InFlightWindow):
+    # FleetWindow() Class:
+    # InFlightWindow of a meter on the fleet's event loop, where the Bill that frees a slot arrives on the same
+    # thread as the reading waiting for it. A 'block' wait therefore awaits slot() instead of blocking the thread.
+    # submit() never blocks: a reading that finds a 'block' window full (sent by the ReadingScheduler, which can't
+    # wait for one meter) is held back like with 'coalesce' and goes out when a Bill frees a slot.
+
+    def __init__(self, limit=MAX_IN_FLIGHT, policy=BACKPRESSURE_POLICY, timeout=STALL_TIMEOUT):
+        super().__init__(limit, policy, timeout)
+        self.waiter = None
+
+    def submit(self, seq, reading):
+        if self.policy == "block" and self.full() and not self.closed:
+            self.held = (seq, reading)
+            return False
+        return super().submit(seq, reading)
+
+    async def slot(self):
+        # slot() Method:
+        # 'block' policy: waits until a reading may be sent. Raises asyncio.TimeoutError if no Bill frees a slot
+        # within 'timeout' seconds and ConnectionError if the window is closed.
+        if self.policy != "block" or not self.full():
+            return
+        self.stats["stalls"] += 1
+        start = time.perf_counter()
+        try:
+            while self.full() and not self.closed:
+                remaining = start + self.timeout - time.perf_counter()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"No Bill for {self.timeout} s with {self.limit} readings in flight")
+                self.waiter = asyncio.get_running_loop().create_future()
+                await asyncio.wait([self.waiter], timeout=remaining)
+        finally:
+            stalled = time.perf_counter() - start
+            self.stats["stall_us"] += int(stalled * 1_000_000)
+            STALL_SECONDS.inc(stalled)
+        if self.closed:
+            raise ConnectionError("Connection closed while waiting for a Bill")
+
+    def complete(self):
+        entry = super().complete()
+        self.wake()
+        return entry
+
+    def close(self):
+        super().close()
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    # FrameProtocol() Class:
+    # Receiving side of a fleet connection. attach() puts it in front of the StreamReader protocol of a new
+    # connection, so the transport reads straight into a FrameReader (no chunk copies) and each complete frame is
+    # handed to the handler given to start() as a memoryview. Frames received before that (the auth reply) are kept
+    # for next_frame(). Flow control and connection loss are passed on to the stream protocol, so the connection's
+    # StreamWriter (drain(), close()) works as before.
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.frames = FrameReader()
+        self.handler = None
+        self.backlog = collections.deque()
+        self.waiter = None
+        # Set to the meter's status text when the connection is done with (see finish()).
+        self.closed = asyncio.get_running_loop().create_future()
+        self.error = None
+
+    @classmethod
+    def attach(cls, writer):
+        # attach() Method:
+        # Takes over receiving on the connection of 'writer' (from asyncio.open_connection()). Must be called before
+        # anything is sent, so the StreamReader has not been given any data yet.
+        protocol = cls(writer.transport.get_protocol())
+        writer.transport.set_protocol(protocol)
+        return protocol
+
+    def get_buffer(self, sizehint):
+        return self.frames.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.frames.buffer_updated(nbytes)
+        for frame in self.frames.frames():
+            if self.closed.done():
+                return
+            if self.handler is not None:
+                self.handler(frame)
+            else:
+                self.backlog.append(bytes(frame))
+                self.wake()
+
+    def eof_received(self):
+        self.finish()
+        return self.stream.eof_received()
+
+    def connection_lost(self, exc):
+        self.error = exc
+        self.finish()
+        self.stream.connection_lost(exc)
+
+    def pause_writing(self):
+        self.stream.pause_writing()
+
+    def resume_writing(self):
+        self.stream.resume_writing()
+
+    def start(self, handler):
+        # start() Method:
+        # Hands every frame to 'handler' from now on, starting with those received so far.
+        self.handler = handler
+        while self.backlog and not self.closed.done():
+            handler(self.backlog.popleft())
+
+    async def next_frame(self):
+        # next_frame() Method:
+        # Returns the next frame (bytes) received before start(), or None if the connection closes first.
+        while not self.backlog:
+            if self.closed.done():
+                return None
+            self.waiter = asyncio.get_running_loop().create_future()
+            await self.waiter
+        return self.backlog.popleft()
+
+    def finish(self, status="Disconnected"):
+        # finish() Method:
+        # Stops handing out frames: the server disconnected, or a handler gave up on the connection ('status').
+        if not self.closed.done():
+            self.closed.set_result(status)
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+
+class FleetMeter:
+    # FleetMeter() Class:
+    # Headless equivalent of SmartMeterGUI. Each meter is a coroutine on the fleet event loop which connects,
+    # authenticates, sends MeterReading messages and processes Bill / power grid messages from the server.
+    # Readings, billing info and status are kept in row 'row' of the fleet's MeterState ('state', a store of its
+    # own if not given), not on the meter object. At most 'max_in_flight' readings per connection wait for their
+    # Bill, the 'backpressure' policy decides what happens to the next (see FleetWindow). Arguments after 'port'
+    # are keyword only.
+
+    # Attributes for readings & billing info from server, stored in the MeterState.
+    cumulative_reading = StateColumn()
+    total_bill = StateColumn()
+    standing_charge = StateColumn()
+    price_per_unit = StateColumn()
+    units_used = StateColumn()
+    readings_taken = StateColumn()
+    last_received = StateColumn()
+
+    def __init__(self, id, counters, context, host=SERVER_HOST, port=SERVER_PORT, *,
+                 min_interval=MIN_READING_INTERVAL, max_interval=MAX_READING_INTERVAL, sessions=None, handshakes=None,
+                 scheduler=None, schedule=None, schedule_row=0, latency=None, wire_formats=WIRE_OFFER, state=None,
+                 row=0, observer=None, trace=None, max_in_flight=MAX_IN_FLIGHT, backpressure=BACKPRESSURE_POLICY):
+        self.id = id
+        self.state = state if state is not None else MeterState((id,))
+        self.row = row
+        self.counters = counters
+        self.context = context
+        # TLS sessions are shared by the fleet so reconnects can resume them.
+        self.sessions = sessions or TLSSessionCache()
+        self.handshakes = handshakes or HandshakeStats()
+        self.scheduler = scheduler or ReconnectScheduler()
+        # Optional precomputed LoadSchedule, this meter uses row 'schedule_row' of it.
+        self.schedule = schedule
+        self.schedule_row = schedule_row
+        # Connection state used by the ReadingScheduler: 'ready' is set while connected with no reading waiting for
+        # its Bill, 'finished' once run() has ended (the meter gave up or was rejected) so no more readings are
+        # scheduled for it ('ready' is set for good then, so an ack paced simulation doesn't wait for it).
+        self.simulated = False
+        self.finished = False
+        self.writer = None
+        # FrameProtocol receiving on the current connection.
+        self.protocol = None
+        self.ready = asyncio.Event()
+        # Readings in flight on the current connection. The server answers readings in order, so each Bill
+        # completes the oldest one and its round trip is recorded in the fleet's LatencyHistogram, if it has one.
+        self.max_in_flight = max_in_flight
+        self.backpressure = backpressure
+        self.window = None
+        self.latency = latency
+        # Told about every power grid message this meter receives, if given (see GridBenchmark.GridObserver).
+        self.observer = observer
+        # TraceWriter recording this meter's session timeline, if given (see TrafficTrace).
+        self.trace = trace
+        # Wire formats offered when authenticating, and the codec agreed for the current connection.
+        self.wire_formats = wire_formats
+        self.codec = CODEC
+        self.host = host
+        self.port = port
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    @property
+    def status(self):
+        return self.state.status_text(self.row)
+
+    @status.setter
+    def status(self, text):
+        self.state.set_status(self.row, text)
+
+    @property
+    def billing_period(self):
+        return self.state.billing_period_text(self.row)
+
+    async def run(self, stop):
+        # run() Method:
+        # Connect / reconnect loop for this meter, runs until 'stop' is set or authentication is rejected.
+        # Retries follow the fleet's ReconnectScheduler (jittered backoff, connect rate and in-flight limits).
+        try:
+            await self.connection_loop(stop)
+        finally:
+            self.finished = True
+            self.ready.set()
+
+    async def connection_loop(self, stop):
+        retries = 0
+        disconnected_at = None
+
+        while not stop.is_set():
+            if (retries or disconnected_at is not None) and \
+                    await wait_or_stop(stop, self.scheduler.retry_delay(retries)):
+                return
+
+            self.counters.connect_attempts += 1
+            try:
+                async with self.scheduler.connecting_async():
+                    reader, writer = await asyncio.wait_for(self.connect(), CONNECT_TIMEOUT)
+            except (OSError, ssl.SSLError, asyncio.TimeoutError) as e:
+                self.counters.errors += 1
+                self.status = f"Connection Failed: {e}"
+                retries += 1
+                continue
+
+            if self.trace is not None:
+                self.trace.connect(self.id)
+            connected = False
+            try:
+                if not await self.authenticate(reader, writer):
+                    self.counters.auth_failures += 1
+                    self.status = "Authentication Failed"
+                    return
+                self.sessions.store(self.id, writer.get_extra_info("ssl_object"))
+
+                self.scheduler.connected(disconnected_at)
+                if disconnected_at is not None:
+                    self.counters.reconnects += 1
+                connected = True
+                retries = 0
+                self.status = "Connected"
+                self.counters.connected += 1
+                try:
+                    await self.session(reader, writer, stop)
+                finally:
+                    self.counters.connected -= 1
+            except (OSError, ssl.SSLError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                self.counters.errors += 1
+                self.status = f"Disconnected: {e}"
+                if not connected:
+                    retries += 1
+            finally:
+                writer.close()
+                if self.trace is not None:
+                    self.trace.disconnect(self.id)
+            if connected:
+                disconnected_at = time.monotonic()
+
+    async def connect(self):
+        # connect() Method:
+        # Opens the connection to the server. With TLS the TCP connect is done first so that the handshake can be
+        # timed on its own, and the meter's previous TLS session is offered for resumption.
+        if self.context is None:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self.protocol = FrameProtocol.attach(writer)
+            return reader, writer
+
+        loop = asyncio.get_running_loop()
+        family, type, proto, _, address = (await loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM))[0]
+        sock = socket.socket(family, type, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+        except BaseException:
+            sock.close()
+            raise
+
+        handshake_start = time.perf_counter()
+        with resuming(self.sessions.get(self.id)):
+            reader, writer = await asyncio.open_connection(sock=sock, ssl=self.context, server_hostname=self.host)
+        self.protocol = FrameProtocol.attach(writer)
+        resumed = writer.get_extra_info("ssl_object").session_reused
+        self.handshakes.record(time.perf_counter() - handshake_start, resumed)
+        self.counters.handshakes += 1
+        if resumed:
+            self.counters.resumed_handshakes += 1
+        return reader, writer
+
+    async def authenticate(self, reader, writer):
+        # authenticate() Method:
+        # Same handshake as authenticate() in ClientCore: send {"id", "token"} (offering the meter's wire formats)
+        # and wait for 'Authentication successful'. Sets the codec for the connection.
+        send_frame(writer, auth_message(self.id, self.wire_formats))
+        await writer.drain()
+
+        response = await asyncio.wait_for(self.protocol.next_frame(), AUTH_TIMEOUT)
+        codec = negotiate(response, self.wire_formats)
+        if codec is None:
+            return False
+        self.codec = codec
+        if self.trace is not None:
+            self.trace.auth(self.id, codec)
+        return True
+
+    async def session(self, reader, writer, stop):
+        # session() Method:
+        # Runs the reading loop and the listener for one authenticated connection, returns when either ends.
+        # Simulated meters are sent readings by the fleet's ReadingScheduler instead of their own loop.
+        self.last_received = time.monotonic()
+        self.window = FleetWindow(self.max_in_flight, self.backpressure)
+        self.writer = writer
+        self.ready.set()
+        tasks = [
+            asyncio.ensure_future(self.listen(reader)),
+            asyncio.ensure_future(self.watchdog()),
+            asyncio.ensure_future(stop.wait()),
+        ]
+        if not self.simulated:
+            tasks.append(asyncio.ensure_future(self.send_readings(writer)))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.writer = None
+            self.ready.clear()
+            self.counters.unanswered += self.window.depth()
+            self.window.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+    async def send_readings(self, writer):
+        # send_readings() Method:
+        # Sends a cumulative meter reading, then waits a random interval before the next one. With a LoadSchedule,
+        # increments and send times come from the meter's row of the schedule instead; the schedule is re-based at
+        # the start of each session so the pending reading goes out straight away, like without one.
+        loop = asyncio.get_running_loop()
+        base = None
+        while True:
+            if self.schedule is not None:
+                due = self.schedule.reading(self.schedule_row, self.readings_taken)[0]
+                if base is None:
+                    base = loop.time() - due
+                delay = base + due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self.wait_for_slot()
+            self.take_reading()
+            self.send_reading()
+            await writer.drain()
+
+            if self.schedule is None:
+                await asyncio.sleep(random.uniform(self.min_interval, self.max_interval))
+
+    def take_reading(self):
+        # take_reading() Method:
+        # Adds the next increment (from the LoadSchedule, or generate_meter_reading()) to the cumulative reading.
+        if self.schedule is not None:
+            increment = self.schedule.reading(self.schedule_row, self.readings_taken)[1]
+        else:
+            increment = generate_meter_reading()
+        self.readings_taken += 1
+        self.cumulative_reading += increment
+
+    async def wait_for_slot(self):
+        # wait_for_slot() Method:
+        # Waits for room in the in-flight window before the next reading is taken ('block' policy).
+        if self.window.policy == "block" and self.window.full():
+            self.counters.stalls += 1
+            await self.window.slot()
+
+    def send_reading(self):
+        # send_reading() Method:
+        # Queues the cumulative reading on the current connection, if the in-flight window lets it go now.
+        # Returns False if the meter is not connected or the reading was dropped or held back.
+        writer = self.writer
+        if writer is None:
+            return False
+        held = self.window.held is not None
+        if not self.window.submit(self.readings_taken, self.cumulative_reading):
+            if self.window.policy == "drop":
+                self.counters.readings_dropped += 1
+            elif held:
+                self.counters.readings_coalesced += 1
+            return False
+        self.write_reading(writer, self.cumulative_reading)
+        return True
+
+    def write_reading(self, writer, reading):
+        # write_reading() Method:
+        # Writes a reading that has taken a slot in the in-flight window.
+        if writer.transport.get_write_buffer_size():
+            self.counters.write_backlogs += 1
+        payload = self.codec.encode_reading(reading)
+        send_frame(writer, payload)
+        self.counters.bytes_sent += FRAME_HEADER.size + len(payload)
+        if self.trace is not None:
+            self.trace.reading(self.id, reading)
+        self.state.last_reading[self.row] = time.monotonic()
+        self.counters.readings_sent += 1
+        self.ready.clear()
+
+    async def listen(self, reader):
+        # listen() Method:
+        # Handles every frame the connection's FrameProtocol receives until the server disconnects.
+        self.protocol.start(self.handle_frame)
+        status = await self.protocol.closed
+        if self.protocol.error is not None:
+            raise self.protocol.error
+        self.status = status
+
+    def handle_frame(self, frame):
+        # handle_frame() Method:
+        # Handles one frame from the server (a memoryview, only valid during the call).
+        self.last_received = time.monotonic()
+        self.counters.frames_received += 1
+        self.counters.bytes_received += FRAME_HEADER.size + len(frame)
+        if self.trace is not None:
+            self.trace.received(self.id, frame)
+        try:
+            self.handle_message(self.codec.decode(frame))
+        except ValueError:
+            # Not a JSON message, e.g. 'Another smart meter is already connected'.
+            self.counters.errors += 1
+            self.protocol.finish("Error")
+
+    async def watchdog(self):
+        # watchdog() Method:
+        # Ends the session with a timeout if nothing has been received for READ_TIMEOUT seconds (the GUI client's
+        # settimeout(90)). Kept out of listen() because cancelling asyncio.wait_for() can be lost on Python 3.11.
+        while True:
+            idle = time.monotonic() - self.last_received
+            if idle >= READ_TIMEOUT:
+                raise asyncio.TimeoutError(f"No message from server for {READ_TIMEOUT} seconds")
+            await asyncio.sleep(READ_TIMEOUT - idle)
+
+    def handle_message(self, message):
+        # handle_message() Method:
+        # Headless version of SmartMeterGUI.handle_server_message(), stores values instead of updating labels.
+        match message:
+            case Bill():
+                self.state.add_bill(self.row, message)
+                self.counters.bills_received += 1
+                answered = self.window.complete() if self.window is not None else None
+                if answered is not None:
+                    round_trip = time.perf_counter() - answered[1]
+                    ROUND_TRIP.record(round_trip)
+                    if self.latency is not None:
+                        self.latency.record(round_trip)
+                if self.writer is not None:
+                    # A reading held back for a free slot goes out straight away.
+                    held = self.window.take_held(0)
+                    if held is not None:
+                        self.write_reading(self.writer, held[1])
+                    else:
+                        self.ready.set()
+
+            case PowerGridIssue():
+                self.status = f"Power Grid Issue: {message.error}"
+                self.counters.grid_alerts += 1
+                if self.observer is not None:
+                    self.observer.grid_message(self.id, message)
+
+            case PowerGridIssueResolved():
+                self.status = "Connected"
+                if self.observer is not None:
+                    self.observer.grid_message(self.id, message)
+
+            case _:
+                self.counters.errors += 1
+
+
+async def wait_or_stop(stop, delay):
+    # wait_or_stop() Function:
+    # Sleeps for 'delay' seconds, returns True early if 'stop' is set in the meantime.
+    try:
+        await asyncio.wait_for(stop.wait(), delay)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+def format_summary(values):
+    # format_summary() Function:
+    # Formats a dict of counter values as a single 'name=value' line.
+    return " ".join(f"{name}={value}" for name, value in values.items())
+
+
+def send_frame(writer, payload):
+    # send_frame() Function:
+    # Writes payload to an asyncio StreamWriter with the 2 byte big-endian length header.
+    writer.write(pack_frame(payload))
+
+
+async def report(counters, stop, interval=REPORT_INTERVAL, handshakes=None, scheduler=None):
+    # report() Function:
+    # Prints the fleet summary (and TLS handshake / reconnect summaries) every 'interval' seconds.
+    while not stop.is_set():
+        await wait_or_stop(stop, interval)
+        print(f"[fleet] {counters.summary()}", flush=True)
+        if handshakes is not None and handshakes.durations:
+            print(f"[fleet] tls {format_summary(handshakes.summary())}", flush=True)
+        if scheduler is not None and scheduler.stats.reconnect_times:
+            print(f"[fleet] reconnect {format_summary(scheduler.stats.summary())}", flush=True)
+
+
+async def run_fleet(ids, ramp_rate, counters=None, host=SERVER_HOST, port=SERVER_PORT, duration=None,
+                    min_interval=MIN_READING_INTERVAL, max_interval=MAX_READING_INTERVAL,
+                    report_interval=REPORT_INTERVAL, stop=None, tls=True, handshakes=None, scheduler=None,
+                    schedule=None, simulation=None, latency=None, wire_formats=WIRE_OFFER, on_start=None,
+                    state=None, observer=None, trace=None, meter_factory=FleetMeter, max_in_flight=MAX_IN_FLIGHT,
+                    backpressure=BACKPRESSURE_POLICY):
+    # run_fleet() Function:
+    # Starts one FleetMeter coroutine per id on the current event loop, 'ramp_rate' meters per second,
+    # and runs them until 'duration' seconds have passed (forever if None) or 'stop' is set.
+    # With a LoadSchedule (one row per id, see LoadProfile) meters take their readings from it. With a
+    # ReadingScheduler ('simulation', see SimClock) readings run on simulated time and the fleet stops when the
+    # simulation ends. With a LatencyHistogram ('latency') every reading's round trip to its Bill is recorded.
+    # Meters offer 'wire_formats' (see ClientCodec) when authenticating, () to stay on JSON.
+    # 'on_start' is called with the list of FleetMeters before they start, e.g. by ClientDashboard to show them.
+    # Meter state is kept in 'state', a MeterState with one row per id in order (a new one if not given).
+    # 'observer' is told about every power grid message any meter receives (see GridBenchmark), 'trace' (a
+    # TrafficTrace.TraceWriter) records every meter's session timeline. Meters are created by 'meter_factory',
+    # called with FleetMeter's arguments, all but the first five by keyword (TrafficTrace replays a trace with its
+    # own FleetMeter subclass).
+    # Each connection has at most 'max_in_flight' readings waiting for their Bill, the 'backpressure' policy
+    # ('block', 'drop' or 'coalesce', see InFlightWindow) decides what happens to readings past that.
+    # While the fleet runs its counters are exported to the process metrics (ClientMetrics.METRICS), along with the
+    # round trip of every reading.
+    if backpressure not in InFlightWindow.POLICIES:
+        raise ValueError(f"Unknown backpressure policy '{backpressure}', expected one of "
+                         f"{', '.join(InFlightWindow.POLICIES)}")
+    counters = counters or FleetCounters()
+    stop = stop or asyncio.Event()
+    context = get_ssl_context() if tls else None
+    sessions = TLSSessionCache()
+    handshakes = handshakes or HandshakeStats()
+    scheduler = scheduler or ReconnectScheduler()
+
+    if schedule is not None and schedule.meters < len(ids):
+        raise ValueError(f"Schedule has {schedule.meters} meters, fleet has {len(ids)}")
+    state = state if state is not None else MeterState(ids)
+    if state.size != len(ids):
+        raise ValueError(f"State store has {state.size} meters, fleet has {len(ids)}")
+
+    meters = [meter_factory(id, counters, context, host, port, min_interval=min_interval, max_interval=max_interval,
+                            sessions=sessions, handshakes=handshakes, scheduler=scheduler, schedule=schedule,
+                            schedule_row=row, latency=latency, wire_formats=wire_formats, state=state, row=row,
+                            observer=observer, trace=trace, max_in_flight=max_in_flight, backpressure=backpressure)
+              for row, id in enumerate(ids)]
+    if on_start is not None:
+        on_start(meters)
+    simulating = None
+    if simulation is not None:
+        for meter in meters:
+            meter.simulated = True
+        simulating = asyncio.ensure_future(simulation.run(meters, stop))
+    reporter = (asyncio.ensure_future(report(counters, stop, report_interval, handshakes, scheduler))
+                if report_interval else None)
+    if duration is not None:
+        asyncio.get_running_loop().call_later(duration, stop.set)
+
+    tasks = []
+    start = time.monotonic()
+    METRICS.add_collector(counters.export)
+    try:
+        for index, meter in enumerate(meters):
+            if stop.is_set():
+                break
+            # Ramp-up: meter N starts N / ramp_rate seconds after the first one.
+            if ramp_rate:
+                delay = start + index / ramp_rate - time.monotonic()
+                if delay > 0 and await wait_or_stop(stop, delay):
+                    break
+            tasks.append(asyncio.ensure_future(meter.run(stop)))
+
+        await stop.wait()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if reporter is not None:
+            await reporter
+        if simulating is not None:
+            await simulating
+    finally:
+        METRICS.remove_collector(counters.export)
+        counters.export()
+    return counters
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the headless fleet.
+    parser = argparse.ArgumentParser(description="Run a headless fleet of smart meters on one asyncio event loop.")
+    parser.add_argument("--meters", type=int, default=20, help="number of meters to simulate")
+    parser.add_argument("--first-id", type=int, default=0, help="id of the first meter, meters use consecutive ids")
+    parser.add_argument("--ramp-rate", type=float, default=50.0, help="meters started per second (0 = all at once)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run for (default: until Ctrl+C)")
+    parser.add_argument("--min-interval", type=float, default=MIN_READING_INTERVAL)
+    parser.add_argument("--max-interval", type=float, default=MAX_READING_INTERVAL)
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    parser.add_argument("--no-tls", action="store_true", help="connect without TLS (directly to the server, not HAProxy)")
+    parser.add_argument("--json-only", action="store_true",
+                        help="don't offer the binary wire format when authenticating")
+    parser.add_argument("--trace", help="record every meter's session timeline to this trace file (see TrafficTrace)")
+    add_reconnect_args(parser)
+    add_backpressure_args(parser)
+    add_metrics_args(parser)
+    add_profile_args(parser)
+    add_simulation_args(parser)
+    return parser.parse_args(argv)
+
+
+def add_metrics_args(parser):
+    # add_metrics_args() Function:
+    # Command line options for the fleet's Prometheus endpoint, shared with FleetSupervisor.
+    parser.add_argument("--metrics-port", type=int, default=FLEET_METRICS_PORT,
+                        help="serve the fleet's metrics on http://localhost:PORT/metrics (0 = any free port)")
+    parser.add_argument("--no-metrics", action="store_true", help="don't serve the metrics endpoint")
+
+
+def start_metrics(port, directory=None, registry=METRICS):
+    # start_metrics() Function:
+    # Serves 'registry' plus the metrics dumped in 'directory' as Prometheus text on 'port' (see
+    # ClientMetrics.serve_metrics). Returns the server, or None if the port can't be used.
+    try:
+        server = serve_metrics(directory, registry, port=port)
+    except OSError as e:
+        print(f"[fleet] metrics endpoint not started: {e}", flush=True)
+        return None
+    print(f"[fleet] metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics", flush=True)
+    return server
+
+
+def add_backpressure_args(parser):
+    # add_backpressure_args() Function:
+    # Command line options for the per connection in-flight window, shared with FleetSupervisor.
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="readings a meter may send before the Bill for the first of them arrives")
+    parser.add_argument("--backpressure", choices=InFlightWindow.POLICIES, default=BACKPRESSURE_POLICY,
+                        help="what happens to a reading when the window is full: wait for a Bill, drop it, or "
+                             "send only the latest once a Bill arrives")
+
+
+def add_simulation_args(parser):
+    # add_simulation_args() Function:
+    # Command line options for a time-compressed simulation, shared with FleetSupervisor.
+    parser.add_argument("--speed", type=float, default=None,
+                        help="run readings on a simulated clock this many times faster than real time")
+    parser.add_argument("--ack-paced", action="store_true",
+                        help="run readings on simulated time as fast as the server answers them with bills")
+    parser.add_argument("--sim-duration", type=float, default=None,
+                        help="simulated seconds to run for (e.g. 2592000 for 30 days)")
+
+
+def build_simulation(args, seed=None):
+    # build_simulation() Function:
+    # Creates the ReadingScheduler asked for on the command line, or returns None when not simulating.
+    if args.speed is None and not args.ack_paced:
+        return None
+    clock = None if args.ack_paced else SimClock(args.speed)
+    return ReadingScheduler(clock, args.sim_duration, args.seed if seed is None else seed, args.min_interval,
+                            args.max_interval)
+
+
+def add_profile_args(parser):
+    # add_profile_args() Function:
+    # Command line options for a seeded LoadSchedule, shared with FleetSupervisor.
+    parser.add_argument("--seed", type=int, default=None,
+                        help="take readings from a seeded load profile (needs numpy) instead of random.uniform")
+    parser.add_argument("--profile-readings", type=int, default=1000,
+                        help="readings per meter precomputed in the load profile (it repeats after that)")
+    parser.add_argument("--start-hour", type=float, default=0.0, help="time of day the load profile starts at")
+
+
+def build_schedule(args, meters, seed=None):
+    # build_schedule() Function:
+    # Generates the LoadSchedule asked for on the command line, or returns None without --seed.
+    if args.seed is None:
+        return None
+    # Imported here so that numpy is only needed when a load profile is used.
+    from LoadProfile import generate_schedule
+    return generate_schedule(meters, args.profile_readings, args.seed if seed is None else seed,
+                             args.min_interval, args.max_interval, args.start_hour)
+
+
+def add_reconnect_args(parser):
+    # add_reconnect_args() Function:
+    # Command line options for the ReconnectScheduler, shared with FleetSupervisor.
+    parser.add_argument("--backoff-base", type=float, default=RECONNECT_BASE_DELAY,
+                        help="first retry waits up to this many seconds, doubling per failed attempt")
+    parser.add_argument("--backoff-max", type=float, default=RECONNECT_MAX_DELAY, help="longest retry wait (seconds)")
+    parser.add_argument("--max-connecting", type=int, default=MAX_CONNECTS_IN_FLIGHT,
+                        help="connect + TLS handshake attempts allowed in flight per process")
+    parser.add_argument("--connect-rate", type=float, default=CONNECT_RATE,
+                        help="connect attempts per second, fleet wide (0 = unlimited)")
+    parser.add_argument("--connect-burst", type=int, default=CONNECT_BURST)
+
+
+def reconnect_options(args, share=1):
+    # reconnect_options() Function:
+    # ReconnectScheduler keyword arguments from the command line, for a process running 'share' of the fleet.
+    return {
+        "base_delay": args.backoff_base,
+        "max_delay": args.backoff_max,
+        "max_in_flight": args.max_connecting,
+        "rate": args.connect_rate * share,
+        "burst": max(1, int(args.connect_burst * share)),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    ids = range(args.first_id, args.first_id + args.meters)
+    simulation = build_simulation(args)
+    trace = None
+    if args.trace:
+        # Imported here, only needed when recording.
+        from TrafficTrace import TraceWriter
+        trace = TraceWriter(args.trace)
+    metrics = None if args.no_metrics else start_metrics(args.metrics_port)
+    try:
+        counters = asyncio.run(run_fleet(ids, args.ramp_rate, host=args.host, port=args.port,
+                                         duration=args.duration, min_interval=args.min_interval,
+                                         max_interval=args.max_interval, report_interval=args.report_interval,
+                                         tls=not args.no_tls,
+                                         scheduler=ReconnectScheduler(**reconnect_options(args)),
+                                         schedule=build_schedule(args, len(ids)), simulation=simulation,
+                                         wire_formats=() if args.json_only else WIRE_OFFER, trace=trace,
+                                         max_in_flight=args.max_in_flight, backpressure=args.backpressure))
+        print(f"[fleet] final {counters.summary()}")
+        if simulation is not None:
+            print(f"[fleet] simulation {format_summary(simulation.summary())}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics is not None:
+            metrics.shutdown()
+        if trace is not None:
+            trace.close()
+            print(f"[fleet] trace {trace.records} records written to {trace.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import socket
+import time
+import random
+import threading
+import customtkinter as ctk
+from datetime import datetime
+import ssl
+import queue
+from ClientCodec import CODEC, Bill, PowerGridIssue, PowerGridIssueResolved
+from ReadingJournal import ReadingJournal, journal_path
+from ClientMetrics import MetricsDumper, verbose
+from TrafficTrace import TRACE_DIR, TraceWriter, trace_path
+from ClientCore import (
+    MIN_READING_INTERVAL,
+    MAX_READING_INTERVAL,
+    BILLS_RECEIVED,
+    BYTES_RECEIVED,
+    FRAME_HEADER,
+    FRAMES_RECEIVED,
+    GRID_ALERTS,
+    ROUND_TRIP,
+    FrameReader,
+    InFlightWindow,
+    generate_meter_reading,
+    send_reading_to_server,
+    run_client,
+)
+
+# Global Vars
+# Most GUI redraws per second. Updates arriving faster than this are coalesced into the next redraw.
+RENDER_FPS = 10
+
+
+class UpdateQueue:
+    # UpdateQueue() Class:
+    # Thread safe hand-off of GUI updates from the listener / reader threads to the Tk thread. Worker threads
+    # put() (kind, value) pairs, the render tick drain()s them, keeping only the latest value of each kind so a
+    # burst of Bills or grid alerts costs one redraw.
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+
+    def put(self, kind, value):
+        # put() Method:
+        # Queues an update, from any thread.
+        self.queue.put((kind, value))
+
+    def drain(self):
+        # drain() Method:
+        # Returns {kind: latest value} of everything queued since the last drain().
+        updates = {}
+        while True:
+            try:
+                kind, value = self.queue.get_nowait()
+            except queue.Empty:
+                return updates
+            updates[kind] = value
+
+
+class LabelCache:
+    # LabelCache() Class:
+    # Remembers the text shown on each label, so set() only reconfigures (and redraws) a label when its
+    # formatted text actually changes.
+
+    def __init__(self):
+        self.texts = {}
+
+    def set(self, label, text):
+        # set() Method:
+        # Shows 'text' on 'label' if it isn't already. Returns True if the label was reconfigured.
+        if self.texts.get(label) == text:
+            return False
+        label.configure(text=text)
+        self.texts[label] = text
+        return True
+
+
+class SmartMeterGUI(ctk.CTk):
+    # SmartMeterGUI() Class:
+    # Handles functionality related to the client side, draws relevant customtkinter GUI elements & updates them. 
+    # Also handles behaviours such as sending reading messages to the server and processing bill responses
+    # from the server.
+    
+    def __init__(self, id):
+        # SmartMeterGUI() Constructor:
+        # Creates window with all relevant customtkinter GUI elements, each elemeent is given an 'initial value'
+        # that is held until the first bill response is recieved from the server.
+
+        super().__init__()
+        # SmartMeter  properties:id, title, size, bg colour.
+        self.id = id
+        self.title("Smart Meter")
+        self.geometry("540x250")
+        self.configure(bg="black")
+        
+
+        # Date and time display : Shows current date/time.
+        self.time_label = ctk.CTkLabel(self, text="", font=("Arial", 12), text_color="white")
+        self.time_label.place(x=310, y=10)  
+
+        # Electricity Icon : Image on GUI.
+        self.electric_icon_label = ctk.CTkLabel(self, text="⚡", font=("Arial", 40), text_color="yellow")
+        self.electric_icon_label.place(x=20, y=60)
+
+        # Cost display : Running count of total cost from bills (Unit : £).
+        self.cost_label = ctk.CTkLabel(self, text="£0.00", font=("Arial", 24), text_color="white")
+        self.cost_label.place(x=100, y=60)
+
+        # Units Used display : Running count of total no of kWh's used (Unit : kWh)
+        self.units_used_label = ctk.CTkLabel(self, text="Units Used: 0.0 kWh", font=("Arial", 12), text_color="white")
+        self.units_used_label.place(x=100, y=90)
+
+        # price per unit display : Displays the cost of each kWh  (Unit : £)
+        self.price_per_unit_label = ctk.CTkLabel(self, text="Price per kWh: £0.00", font=("Arial", 12), text_color="white")
+        self.price_per_unit_label.place(x=100, y=120)
+
+        # Standing Charge display : Displays the total costs of standing charge (Unit : kWh)
+        self.standing_charge_label = ctk.CTkLabel(self, text="Standing Charge: £0.00", font=("Arial", 12), text_color="white")
+        self.standing_charge_label.place(x=300, y=90) 
+
+        # billing period display : Displays the length of the billing period (Unit : Days)
+        self.billing_period_label = ctk.CTkLabel(self, text="Billing Period: 0 Days", font=("Arial", 12), text_color="white")
+        self.billing_period_label.place(x=300, y=120)
+
+        # Status of server connection display : Displays the connection status between this client and the server, also displays if there is a problem with the power grid.
+        self.status_label = ctk.CTkLabel(self, text="Not Connected", font=("Arial", 12), text_color="white")
+        self.status_label.place(x=10, y=180)
+
+        self.last_update_label = ctk.CTkLabel(self, text="Last Update", font=("Arial", 12), text_color="white")
+        self.last_update_label.place(x=300, y=210)
+
+        # Exit button to close the application : Closes this client.
+        self.exit_button = ctk.CTkButton(self, text="Exit", command=self.exit)
+        self.exit_button.place(x=5, y=210)
+
+        # Updates from the listener / reader threads, applied on the Tk thread by render(), and the text shown on
+        # each label (labels are only reconfigured when their text changes).
+        self.updates = UpdateQueue()
+        self.labels = LabelCache()
+        # When the last reading was sent (time.monotonic()), for the 'Last Update' label.
+        self.last_update_time = None
+
+        # Start the render tick (clock, 'last update' counter and any queued updates).
+        self.render()
+        
+
+        # Journal of readings not billed yet, replayed on reconnect (see ReadingJournal). The cumulative reading
+        # carries on from the last one journaled, so a restarted client doesn't go back to 0.
+        self.journal = ReadingJournal(journal_path(self.id))
+        # When the next reading is due (time.monotonic()), readings are taken online or off.
+        self.next_reading_at = time.monotonic()
+
+        # Declare attributes for readings & billing info from server & assign default values.
+        self.cumulative_reading = self.journal.last_reading
+        self.total_bill = 0.0
+        self.units_start = 0.0
+        self.units_end = 0.0
+        self.standing_charge = 0.0
+        self.price_per_unit = 0.0
+        self.billing_period = 0
+
+        # Message codec agreed with the server during authentication (JSON until then).
+        self.codec = CODEC
+
+        # Session timeline recorded for replay when SMART_METER_TRACE_DIR is set (see TrafficTrace).
+        self.trace = TraceWriter(trace_path(self.id)) if TRACE_DIR else None
+
+        # Readings waiting for their Bill on the current connection (replaced by run_client() on every connect)
+        # and the round trip times (the process's metric, each window runs in its own process).
+        self.window = InFlightWindow()
+        self.latency = ROUND_TRIP
+
+        # Start the client automatically
+        threading.Thread(target=self.auto_connect, daemon=True).start()
+
+    def render(self):
+        # render() Method:
+        # The window's single render tick, at most RENDER_FPS times a second on the Tk thread: applies the updates
+        # queued by other threads since the last tick (only the latest of each kind), then refreshes the clock and
+        # 'last update' labels.
+        updates = self.updates.drain()
+        if "bill" in updates:
+            self.update_GUI(*updates["bill"])
+        if "status" in updates:
+            self.labels.set(self.status_label, updates["status"])
+        if "last_update" in updates:
+            self.last_update_time = updates["last_update"]
+
+        self.update_time()
+        if self.last_update_time is not None:
+            seconds = int(time.monotonic() - self.last_update_time)
+            self.labels.set(self.last_update_label, f"Last Update: {seconds} seconds ago")
+
+        self.after(1000 // RENDER_FPS, self.render)
+
+    def update_time(self):
+        # update_time() Method:
+        # Updates current time display on GUI.
+        self.labels.set(self.time_label, datetime.now().strftime("%A, %B %d, %Y %H:%M:%S"))
+
+
+    def auto_connect(self):
+        # auto_connect() Method:
+        # Updates status label and tries to connect the client to the server.
+        self.set_status("Connecting...")
+        run_client(self, self.id)
+
+
+    def exit(self):
+        # exit() Method:
+        # Closes the current SmartMeter client.
+        if self.latency.count:
+            print(f"Client {self.id} Reading round trip {self.latency.summary()}")
+        print(f"Client {self.id} Journal {self.journal.summary()}")
+        print(f"Client {self.id} In flight {self.window.summary()}")
+        if self.trace is not None:
+            self.trace.close()
+        self.destroy()
+
+
+    def update_GUI(self, total_bill, standing_charge, price_per_unit, units_used, billing_period):
+        # update_GUI() Method:
+        # Receives billing info as paramaters and updates related GUI labels. Tk thread only (called by render()).
+
+        # Update labels (column 1 : Energy info)
+        self.labels.set(self.cost_label, f"£{total_bill:.2f}")
+        self.labels.set(self.units_used_label, f"Units Used: {units_used:.2f} kWh")
+        self.labels.set(self.price_per_unit_label, f"Price per kWh: £{price_per_unit:.2f}")
+        # Update labels (column 2 : Standing charge & billing period info)
+        self.labels.set(self.standing_charge_label, f"Standing Charge: £{standing_charge:.2f}")
+        self.labels.set(self.billing_period_label, f"Billing Period: {billing_period}")
+
+
+    def set_status(self, message):
+        # set_status() Method:
+        # Updates the status of the connection between the client and the server. Safe to call from any thread,
+        # the label changes on the next render tick.
+        self.updates.put("status", message)
+
+    def take_reading(self):
+        # take_reading() Method:
+        # Adds a new reading to the cumulative reading and journals it (before it is sent, so it isn't lost if
+        # the send fails), then schedules the next one. Returns its journal sequence number.
+        self.cumulative_reading += generate_meter_reading()
+        self.next_reading_at = time.monotonic() + random.uniform(MIN_READING_INTERVAL, MAX_READING_INTERVAL)
+        return self.journal.append(self.cumulative_reading)
+
+    def wait_offline(self, seconds):
+        # wait_offline() Method:
+        # Waits 'seconds' while disconnected (reconnect backoff), still taking readings into the journal as they
+        # fall due. They are replayed once the client reconnects.
+        end = time.monotonic() + seconds
+        while (now := time.monotonic()) < end:
+            if now >= self.next_reading_at:
+                self.take_reading()
+            else:
+                time.sleep(min(end, self.next_reading_at) - now)
+
+    def send_reading(self, reading):
+        # send_reading() Method:
+        # Sends a cumulative reading that already has a slot in the in-flight window. Returns "" or an error.
+        # Create the reading data with cumulative reading
+        reading_data = {
+            "type": "MeterReading",
+            "reading": reading,  # Send cumulative reading
+        }
+        error = send_reading_to_server(self.sock, reading_data, 10, self.writer, self.codec)
+        if self.trace is not None and not error:
+            self.trace.reading(self.id, reading)
+        return error
+
+    def trigger_reading_event(self):
+        # trigger_reading_event() Method:
+        # Take a new reading
+        seq = self.take_reading()
+
+        # Send it if the in-flight window has room (otherwise BACKPRESSURE_POLICY decides, the journal keeps it).
+        try:
+            if not self.window.submit(seq, self.cumulative_reading):
+                return ""
+        except OSError as e:
+            print(f"Client {self.id} {e}")
+            return f"Error: {e}"
+        return self.send_reading(self.cumulative_reading)
+        
+    def start_reading_events(self):
+        # start_reading_events() Method:
+        # Send meter readings to the server, until sending fails or the listener finds the connection closed.
+
+        while True:
+            # Wait for a random interval before the next reading (set by take_reading()), meanwhile sending a
+            # reading held back by the in-flight window as soon as a Bill frees a slot.
+            while (delay := self.next_reading_at - time.monotonic()) > 0:
+                held = self.window.take_held(delay)
+                if self.window.closed:
+                    return
+                if held is not None and len(self.send_reading(held[1])):
+                    return
+
+            # Trigger a reading event and send it to the server
+            if len(self.trigger_reading_event()):
+                break
+
+            self.update_last_updated()
+            
+
+
+    def handle_server_message(self, message):
+        # handle_server_message() Method:
+        # Handles a decoded server message (a ClientCodec record) & unpacks data into variables for the smart meter.
+        # Calls method to update the SmartMeterGUI elements.
+
+        try:
+            match message:
+                case Bill():
+                    # The reading this Bill answers is done with (it frees its in-flight slot), and its round trip.
+                    answered = self.window.complete()
+                    if answered is not None:
+                        seq, sent = answered
+                        self.journal.ack(seq)
+                        self.latency.record(time.perf_counter() - sent)
+
+                    BILLS_RECEIVED.inc()
+
+                    # Update the cumulative total bill
+                    self.total_bill = message.total
+
+                    # Update other attributes for GUI display
+                    self.standing_charge = message.standing_charge
+                    self.daily_standing_charge = message.daily_standing_charge
+                    self.price_per_unit = message.price_per_unit
+                    self.billing_period = message.billing_period
+                    self.units_used = message.units_used
+
+                    # Update the GUI with the new data (on the next render tick)
+                    self.updates.put("bill", (
+                        self.total_bill,
+                        self.standing_charge, 
+                        self.price_per_unit,
+                        self.units_used, 
+                        self.billing_period))
+
+                case PowerGridIssue():
+                    # Update on GUI and print message.
+                    GRID_ALERTS.inc()
+                    if verbose():
+                        print(f"Client {self.id} Power Grid Issue: {message.error}")
+                    self.set_status(f"Power Grid Issue: {message.error}")
+                
+                case PowerGridIssueResolved():
+                    # Update on GUI and print message.
+                    if verbose():
+                        print(f"Client {self.id} Power Grid Issue Resolved")
+                    self.set_status("Connected")
+
+                case _:
+                    # Else case.
+                    # If the message type is not recognized, print a warning message.
+                    print(f"Client {self.id} Unknown message type received: {message}")
+
+        except Exception as e:
+            print(f"Client {self.id} {e}")
+
+
+    def update_last_updated(self):
+        # update_last_updated() Method:
+        # Restarts the 'last update:' counter, which render() advances every second. Safe to call from any thread.
+        self.updates.put("last_update", time.monotonic())
+
+    def start_listener(self):
+        # Start the listener thread
+        
+        try:
+            self.sock.settimeout(90)
+            frames = FrameReader()
+            while True:
+                # One recv can carry several frames (or only part of one), FrameReader keeps whatever is left over.
+                if not frames.read_from(self.sock):
+                    self.set_status("Disconnected")
+                    print("Server disconnected")
+                    break
+
+                if not all(self.process_frame(frame) for frame in frames.frames()):
+                    break
+                
+        except (socket.error, ssl.SSLError) as e:
+            print(f"Client {self.id} Listener error: {e}")
+            self.set_status("Error")
+        except Exception as e:
+            print(f"Client {self.id} Unexpected error in listener: {e}")
+        finally:
+            # Wakes up the reading thread if it is waiting for an in-flight slot.
+            self.window.close()
+            self.sock.shutdown(socket.SHUT_RDWR)
+
+    def process_frame(self, frame):
+        # process_frame() Method:
+        # Decodes one frame (bytes or a memoryview) from the server and handles it. Returns False if the listener
+        # should stop.
+        FRAMES_RECEIVED.inc()
+        BYTES_RECEIVED.inc(FRAME_HEADER.size + len(frame))
+        if self.trace is not None:
+            self.trace.received(self.id, frame)
+        try:
+            # Decode the message from the server
+            message = self.codec.decode(frame)
+        except ValueError as e:
+            # Error decoding server response
+            print(f"Client {self.id} Error parsing server response {bytes(frame)}: {e}")
+            self.set_status("Error")
+            return False
+
+        if verbose():
+            print(f"Client {self.id} Server response: {message}")
+        self.handle_server_message(message)
+        return True
+
+
+def create_client(id):
+    # create_client() Function.
+    # Instantiates SmartMeterGUI() class and starts the GUI event loop. The process's metrics are dumped for the
+    # launcher to aggregate (see ClientMetrics) until the window closes.
+    metrics = MetricsDumper(f"meter-{id}")
+    metrics.start()
+
+    # Set default appearance mode and color theme
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("green")
+    app = SmartMeterGUI(id)
+    try:
+        app.mainloop()
+    finally:
+        metrics.stop()
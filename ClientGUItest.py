@@ -0,0 +1,83 @@
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock, patch
+
+from ClientCodec import Bill
+from ClientCore import InFlightWindow
+from ClientGUI import LabelCache, SmartMeterGUI, UpdateQueue
+from ReadingJournal import ReadingJournal
+
+
+class TestRendering(unittest.TestCase):
+    def test_updates_are_coalesced(self):
+        """Test that a burst of updates from several threads drains to the latest value of each kind."""
+        updates = UpdateQueue()
+        threads = [threading.Thread(target=lambda: [updates.put("bill", n) for n in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        updates.put("status", "Connected")
+        self.assertEqual(updates.drain(), {"bill": 999, "status": "Connected"})
+        self.assertEqual(updates.drain(), {})
+
+    def test_label_only_reconfigured_on_change(self):
+        """Test that a label is only reconfigured when its text changes."""
+        labels = LabelCache()
+        label = Mock()
+        self.assertTrue(labels.set(label, "£1.00"))
+        self.assertFalse(labels.set(label, "£1.00"))
+        self.assertTrue(labels.set(label, "£1.20"))
+        self.assertEqual(label.configure.call_count, 2)
+
+    def test_render_tick(self):
+        """Test that one render tick applies only the latest Bill and status, then schedules the next tick."""
+        gui = Mock(updates=UpdateQueue(), labels=LabelCache(), last_update_time=None)
+        for total in (1.0, 2.0, 3.0):
+            gui.updates.put("bill", (total, 0.4, 0.2, 13.0, "2024-11-01 - 2024-12-01"))
+        gui.updates.put("status", "Connecting...")
+        gui.updates.put("status", "Connected")
+        SmartMeterGUI.render(gui)
+        gui.update_GUI.assert_called_once_with(3.0, 0.4, 0.2, 13.0, "2024-11-01 - 2024-12-01")
+        gui.status_label.configure.assert_called_once_with(text="Connected")
+        gui.after.assert_called_once_with(100, gui.render)
+
+        # Nothing new: the next tick redraws nothing but the clock.
+        SmartMeterGUI.render(gui)
+        gui.update_GUI.assert_called_once()
+        gui.status_label.configure.assert_called_once()
+
+
+class TestJournaling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.gui = Mock(id=1, cumulative_reading=0.0, next_reading_at=0.0, window=InFlightWindow(),
+                        updates=UpdateQueue(), journal=ReadingJournal(self.directory.name + "/meter-1.journal"))
+        self.gui.take_reading = lambda: SmartMeterGUI.take_reading(self.gui)
+
+    def tearDown(self):
+        self.gui.journal.close()
+        self.directory.cleanup()
+
+    def test_bill_acknowledges_reading(self):
+        """Test that readings are journaled when taken and acknowledged by the Bill that answers them."""
+        for _ in range(2):
+            self.assertTrue(self.gui.window.submit(SmartMeterGUI.take_reading(self.gui), self.gui.cumulative_reading))
+        first, second = self.gui.journal.backlog()
+        self.assertEqual(second, self.gui.cumulative_reading)
+        SmartMeterGUI.handle_server_message(self.gui, Bill(total=1.0))
+        self.assertEqual(self.gui.journal.backlog(), [second])
+        self.assertEqual(self.gui.window.depth(), 1)
+
+    @patch("ClientGUI.MAX_READING_INTERVAL", 0.02)
+    @patch("ClientGUI.MIN_READING_INTERVAL", 0.01)
+    def test_readings_taken_while_offline(self):
+        """Test that readings keep going into the journal while the client waits to reconnect."""
+        SmartMeterGUI.wait_offline(self.gui, 0.1)
+        self.assertGreaterEqual(len(self.gui.journal), 4)
+        self.assertEqual(self.gui.journal.last_reading, self.gui.cumulative_reading)
+
+
+if __name__ == "__main__":
+    unittest.main()
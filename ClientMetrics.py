@@ -0,0 +1,338 @@
+# In-process metrics (counters, gauges and histograms) for the client, with a Prometheus text endpoint and
+# periodic JSON dumps so the numbers of every client process can be aggregated, plus the log level / sampling
+# that keeps per frame messages off stdout. Recording a value costs a lock and an addition, no I/O.
+import json
+import os
+import random
+import threading
+import time
+
+from ClientStats import LatencyHistogram
+
+# Global Vars
+# Where client processes dump their metrics (one JSON file each) and where the aggregated Prometheus text is
+# served (http://METRICS_HOST:METRICS_PORT/metrics).
+METRICS_DIR = "./metrics"
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+DUMP_INTERVAL = 5.0
+# Upper bounds (seconds) of the Prometheus histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Log levels, least verbose first. 'debug' adds the per frame messages, of which only a LOG_SAMPLE_RATE fraction
+# is printed. Set from the environment so every client process started by ClientSide gets the same settings.
+LOG_LEVELS = ("error", "info", "debug")
+LOG_LEVEL = os.environ.get("SMART_METER_LOG_LEVEL", "info")
+LOG_SAMPLE_RATE = float(os.environ.get("SMART_METER_LOG_SAMPLE", "0.01"))
+
+
+def set_log_level(level, sample_rate=None):
+    # set_log_level() Function:
+    # Sets the log level (one of LOG_LEVELS) and, optionally, the fraction of per frame messages printed.
+    global LOG_LEVEL, LOG_SAMPLE_RATE
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level '{level}', expected one of {', '.join(LOG_LEVELS)}")
+    LOG_LEVEL = level
+    if sample_rate is not None:
+        LOG_SAMPLE_RATE = sample_rate
+
+
+def log_enabled(level):
+    # log_enabled() Function:
+    # True if messages of 'level' are printed at the current LOG_LEVEL.
+    return LOG_LEVELS.index(level) <= LOG_LEVELS.index(LOG_LEVEL)
+
+
+def verbose():
+    # verbose() Function:
+    # True if this per frame message should be printed: the level is 'debug' and it falls in the sample.
+    # Check it before formatting the message, so unprinted messages cost nothing but the check.
+    return LOG_LEVEL == "debug" and (LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE)
+
+
+class Counter:
+    # Counter() Class:
+    # Value that only goes up (events, bytes).
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Counter):
+    # Gauge() Class:
+    # Value that goes up and down (connections open, readings in flight). Summed across processes.
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class Histogram(LatencyHistogram):
+    # Histogram() Class:
+    # Thread safe LatencyHistogram of durations (seconds), exported as a Prometheus histogram.
+    kind = "histogram"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        super().__init__()
+
+    def record(self, seconds):
+        with self.lock:
+            super().record(seconds)
+
+    def reset(self):
+        with self.lock:
+            LatencyHistogram.__init__(self)
+
+    def snapshot(self):
+        with self.lock:
+            return self.to_dict()
+
+
+class MetricsRegistry:
+    # MetricsRegistry() Class:
+    # The metrics of one process. counter() / gauge() / histogram() return the metric registered under a name,
+    # creating it the first time, so modules can declare the metrics they update at import time. Values counted
+    # elsewhere (e.g. a fleet's FleetCounters) are brought in by collectors, called before every snapshot.
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def _register(self, cls, name, help):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help):
+        return self._register(Counter, name, help)
+
+    def gauge(self, name, help):
+        return self._register(Gauge, name, help)
+
+    def histogram(self, name, help):
+        return self._register(Histogram, name, help)
+
+    def add_collector(self, collector):
+        # add_collector() Method:
+        # Calls 'collector' (no arguments) before every snapshot, to update metrics from counts kept elsewhere.
+        with self.lock:
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        with self.lock:
+            self.collectors.remove(collector)
+
+    def snapshot(self):
+        # snapshot() Method:
+        # JSON friendly copy of every metric, see merge_snapshots().
+        for collector in list(self.collectors):
+            collector()
+        return {
+            "pid": os.getpid(),
+            "time": time.time(),
+            "metrics": {name: {"type": metric.kind, "help": metric.help, "value": metric.snapshot()}
+                        for name, metric in list(self.metrics.items())},
+        }
+
+
+# Metrics of this process.
+METRICS = MetricsRegistry()
+
+
+def merge_snapshots(snapshots):
+    # merge_snapshots() Function:
+    # Adds up the snapshots of several processes. Returns {name: (type, help, value)}, histogram values as
+    # LatencyHistograms.
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot["metrics"].items():
+            value = metric["value"]
+            if metric["type"] == "histogram":
+                value = LatencyHistogram.from_dict(value)
+            if name not in merged:
+                merged[name] = (metric["type"], metric["help"], value)
+            elif metric["type"] == "histogram":
+                merged[name][2].merge(value)
+            else:
+                merged[name] = (metric["type"], metric["help"], merged[name][2] + value)
+    return merged
+
+
+def prometheus_text(snapshots, buckets=LATENCY_BUCKETS):
+    # prometheus_text() Function:
+    # The aggregate of 'snapshots' in the Prometheus text exposition format.
+    lines = ["# HELP smartmeter_metrics_processes Client processes reporting metrics.",
+             "# TYPE smartmeter_metrics_processes gauge",
+             f"smartmeter_metrics_processes {len(snapshots)}"]
+    for name, (kind, help, value) in sorted(merge_snapshots(snapshots).items()):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        if kind != "histogram":
+            lines.append(f"{name} {value}")
+            continue
+        counts = value.to_dict()["buckets"]
+        for bound in buckets:
+            count = sum(count for micros, count in counts if micros <= bound * 1_000_000)
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines += [f'{name}_bucket{{le="+Inf"}} {value.count}', f"{name}_sum {value.total / 1_000_000}",
+                  f"{name}_count {value.count}"]
+    return "\n".join(lines) + "\n"
+
+
+def dump_metrics(registry, path):
+    # dump_metrics() Function:
+    # Writes a snapshot of 'registry' to 'path' (to a temporary file renamed over it, so readers never see half
+    # a file).
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w") as file:
+        json.dump(registry.snapshot(), file)
+    os.replace(temp, path)
+
+
+def load_snapshots(directory=METRICS_DIR):
+    # load_snapshots() Function:
+    # Every snapshot dumped in 'directory'.
+    snapshots = []
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return snapshots
+    for name in names:
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(directory, name)) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):
+                # Removed or replaced while reading, it is read on the next scrape.
+                continue
+    return snapshots
+
+
+def clear_dumps(directory=METRICS_DIR):
+    # clear_dumps() Function:
+    # Removes the snapshots left by earlier runs.
+    for snapshot in os.listdir(directory) if os.path.isdir(directory) else ():
+        if snapshot.endswith(".json"):
+            os.remove(os.path.join(directory, snapshot))
+
+
+class MetricsDumper(threading.Thread):
+    # MetricsDumper() Class:
+    # Daemon thread dumping a registry to 'directory'/'name'.json every 'interval' seconds, for the process
+    # serving the aggregated metrics. stop() writes a final dump.
+
+    def __init__(self, name, registry=METRICS, directory=METRICS_DIR, interval=DUMP_INTERVAL):
+        super().__init__(name=f"metrics-{name}", daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.json")
+        self.registry = registry
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            dump_metrics(self.registry, self.path)
+
+    def stop(self):
+        # stop() Method:
+        # Stops dumping after one last dump.
+        self.stopping.set()
+        dump_metrics(self.registry, self.path)
+
+
+def serve_metrics(directory=METRICS_DIR, registry=None, host=METRICS_HOST, port=METRICS_PORT):
+    # serve_metrics() Function:
+    # Serves GET /metrics on a daemon thread: the Prometheus text of every snapshot in 'directory' (None: none)
+    # plus 'registry' (this process), read at each scrape. Returns the server (server.server_address for the port,
+    # server.shutdown() to stop it).
+    # Imported here: only the process serving the endpoint needs an HTTP server.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            snapshots = load_snapshots(directory) if directory is not None else []
+            if registry is not None:
+                snapshots.append(registry.snapshot())
+            body = prometheus_text(snapshots).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes are not logged.
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+    return server
+
+
+def measure_overhead(count=1_000_000):
+    # measure_overhead() Function:
+    # Nanoseconds per Counter.inc(), Histogram.record() and (not sampled) verbose() check.
+    registry = MetricsRegistry()
+    counter = registry.counter("benchmark_total", "Benchmark counter.")
+    histogram = registry.histogram("benchmark_seconds", "Benchmark histogram.")
+    results = {}
+    for name, call in (("counter_ns", counter.inc), ("histogram_ns", lambda: histogram.record(0.0123)),
+                       ("verbose_ns", verbose)):
+        start = time.perf_counter()
+        for _ in range(count):
+            call()
+        results[name] = round((time.perf_counter() - start) * 1e9 / count, 1)
+    return results
+
+
+def main(argv=None):
+    # argparse is only needed by the command line.
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Aggregate the metrics dumped by client processes.")
+    parser.add_argument("--dir", default=METRICS_DIR, help="directory the clients dump their metrics to")
+    parser.add_argument("--port", type=int, default=METRICS_PORT, help="serve /metrics on this localhost port")
+    parser.add_argument("--once", action="store_true", help="print the Prometheus text once and exit")
+    parser.add_argument("--overhead", action="store_true", help="measure the cost of recording a metric")
+    args = parser.parse_args(argv)
+
+    if args.overhead:
+        print(measure_overhead())
+        return
+    if args.once:
+        print(prometheus_text(load_snapshots(args.dir)), end="")
+        return
+    server = serve_metrics(args.dir, port=args.port)
+    print(f"Serving metrics of {args.dir} on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
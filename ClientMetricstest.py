@@ -0,0 +1,129 @@
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+import ClientMetrics
+from ClientCodec import BinaryCodec
+from ClientCore import BYTES_SENT, READINGS_SENT, FrameWriter, send_reading_to_server
+from ClientMetrics import (
+    MetricsDumper,
+    MetricsRegistry,
+    load_snapshots,
+    merge_snapshots,
+    prometheus_text,
+    serve_metrics,
+    set_log_level,
+    verbose,
+)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.readings = self.registry.counter("readings_total", "Readings sent.")
+        self.connected = self.registry.gauge("connected", "Meters connected.")
+        self.round_trip = self.registry.histogram("round_trip_seconds", "Reading round trip.")
+
+    def test_metrics_are_registered_once(self):
+        """Test that registering a name again returns the same metric, and another type is rejected."""
+        self.assertIs(self.registry.counter("readings_total", "Readings sent."), self.readings)
+        with self.assertRaises(ValueError):
+            self.registry.gauge("readings_total", "Readings sent.")
+
+    def test_collectors_run_before_snapshot(self):
+        """Test that collectors update the registry before each snapshot, and stop once removed."""
+        collector = self.readings.inc
+        self.registry.add_collector(collector)
+        self.assertEqual(self.registry.snapshot()["metrics"]["readings_total"]["value"], 1)
+        self.assertEqual(self.registry.snapshot()["metrics"]["readings_total"]["value"], 2)
+        self.registry.remove_collector(collector)
+        self.assertEqual(self.registry.snapshot()["metrics"]["readings_total"]["value"], 2)
+
+    def test_counter_from_threads(self):
+        """Test that increments from several threads are all counted."""
+        threads = [threading.Thread(target=lambda: [self.readings.inc() for _ in range(10000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.readings.value, 40000)
+
+    def test_processes_are_aggregated(self):
+        """Test that counters, gauges and histograms of several processes add up in the Prometheus text."""
+        self.readings.inc(3)
+        self.connected.inc()
+        self.round_trip.record(0.004)
+        other = MetricsRegistry()
+        other.counter("readings_total", "Readings sent.").inc(2)
+        other.gauge("connected", "Meters connected.").set(4)
+        other.histogram("round_trip_seconds", "Reading round trip.").record(0.2)
+
+        snapshots = [self.registry.snapshot(), other.snapshot()]
+        merged = merge_snapshots(snapshots)
+        self.assertEqual(merged["readings_total"][2], 5)
+        self.assertEqual(merged["connected"][2], 5)
+        self.assertEqual(merged["round_trip_seconds"][2].count, 2)
+
+        lines = prometheus_text(snapshots, buckets=(0.01, 0.1, 1.0)).splitlines()
+        self.assertIn("smartmeter_metrics_processes 2", lines)
+        self.assertIn("# TYPE readings_total counter", lines)
+        self.assertIn("readings_total 5", lines)
+        self.assertIn("connected 5", lines)
+        self.assertIn('round_trip_seconds_bucket{le="0.01"} 1', lines)
+        self.assertIn('round_trip_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('round_trip_seconds_bucket{le="1.0"} 2', lines)
+        self.assertIn('round_trip_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn("round_trip_seconds_count 2", lines)
+
+    def test_dump_and_serve(self):
+        """Test that dumped snapshots and the serving process are added up at the /metrics endpoint."""
+        with tempfile.TemporaryDirectory() as directory:
+            dumper = MetricsDumper("meter-1", self.registry, directory, interval=60)
+            self.readings.inc(7)
+            dumper.stop()
+            self.assertEqual(len(load_snapshots(directory)), 1)
+
+            server = serve_metrics(directory, self.registry, port=0)
+            try:
+                host, port = server.server_address[:2]
+                with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+                    text = response.read().decode()
+            finally:
+                server.shutdown()
+                server.server_close()
+        self.assertIn("readings_total 14", text.splitlines())
+        self.assertIn("smartmeter_metrics_processes 2", text.splitlines())
+
+
+class TestLogging(unittest.TestCase):
+    def tearDown(self):
+        set_log_level("info", 0.01)
+
+    def test_verbose_is_sampled(self):
+        """Test that per frame messages are off below 'debug' and sampled at 'debug'."""
+        set_log_level("info", 1.0)
+        self.assertFalse(verbose())
+        self.assertTrue(ClientMetrics.log_enabled("error"))
+        set_log_level("debug", 1.0)
+        self.assertTrue(verbose())
+        set_log_level("debug", 0.0)
+        self.assertFalse(any(verbose() for _ in range(1000)))
+        with self.assertRaises(ValueError):
+            set_log_level("trace")
+
+    def test_readings_are_counted_not_printed(self):
+        """Test that sending a reading updates the metrics and prints nothing at the default level."""
+        left, right = socket.socketpair()
+        sent, nbytes = READINGS_SENT.value, BYTES_SENT.value
+        with left, right, patch("builtins.print") as printed:
+            self.assertEqual(send_reading_to_server(left, {"reading": 1.5}, 10, FrameWriter(), BinaryCodec()), "")
+        printed.assert_not_called()
+        self.assertEqual(READINGS_SENT.value - sent, 1)
+        self.assertGreater(BYTES_SENT.value, nbytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import contextlib
+import random
+import threading
+import time
+
+from ClientStats import duration_percentiles
+
+# Global Vars
+# Default reconnect settings: exponential backoff with full jitter, connect admission control.
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+RECONNECT_BACKOFF_FACTOR = 2.0
+MAX_CONNECTS_IN_FLIGHT = 64
+CONNECT_RATE = 200.0
+CONNECT_BURST = 50
+
+
+class Backoff:
+    # Backoff() Class:
+    # Exponential backoff with full jitter: retry N waits a random time between 0 and
+    # min(max_delay, base_delay * factor ** N), so a fleet that lost its connections at the same moment
+    # spreads its reconnects out instead of coming back in waves.
+
+    def __init__(self, base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY, factor=RECONNECT_BACKOFF_FACTOR,
+                 rng=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        # delay() Method:
+        # Seconds to wait before retry number 'attempt' (0 = first retry after a disconnect).
+        ceiling = min(self.max_delay, self.base_delay * self.factor ** min(attempt, 64))
+        return self.rng.uniform(0, ceiling)
+
+
+class TokenBucket:
+    # TokenBucket() Class:
+    # Limits the connect rate to 'rate' per second with bursts of up to 'burst'. reserve() always hands out a
+    # token and returns how long the caller has to wait for it, so waiting callers are queued in order.
+
+    def __init__(self, rate=CONNECT_RATE, burst=CONNECT_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # reserve() Method:
+        # Takes one token, returns the number of seconds to wait before using it (0 if one was available).
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class ReconnectStats:
+    # ReconnectStats() Class:
+    # Connect attempt counters and time-to-reconnect (from losing a connection to the next successful one).
+
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+        self.reconnect_times = []
+
+    def summary(self):
+        # summary() Method:
+        # Returns the counters and time-to-reconnect percentiles (milliseconds).
+        summary = {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+            "reconnects": len(self.reconnect_times),
+        }
+        summary.update(duration_percentiles(self.reconnect_times))
+        return summary
+
+
+class ReconnectScheduler:
+    # ReconnectScheduler() Class:
+    # Decides when a meter may (re)connect. Combines the jittered backoff between retries, a per process cap on
+    # connect + TLS handshake attempts in flight and a token bucket on the connect rate. Give each worker process
+    # its share of the fleet wide rate. Usable from threads (connecting()) and asyncio (connecting_async()).
+
+    def __init__(self, base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY, factor=RECONNECT_BACKOFF_FACTOR,
+                 max_in_flight=MAX_CONNECTS_IN_FLIGHT, rate=CONNECT_RATE, burst=CONNECT_BURST, rng=None):
+        self.backoff = Backoff(base_delay, max_delay, factor, rng)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.stats = ReconnectStats()
+        self.thread_slots = threading.BoundedSemaphore(max_in_flight)
+        self.async_slots = None
+
+    def retry_delay(self, attempt):
+        # retry_delay() Method:
+        # Seconds to wait before retry number 'attempt'.
+        return self.backoff.delay(attempt)
+
+    @contextlib.contextmanager
+    def connecting(self):
+        # connecting() Method:
+        # Context manager around a blocking connect + handshake: waits for a token and a free slot, and counts
+        # the attempt as failed if the block raises.
+        time.sleep(self.bucket.reserve())
+        with self.thread_slots:
+            with self._attempt():
+                yield
+
+    @contextlib.asynccontextmanager
+    async def connecting_async(self):
+        # connecting_async() Method:
+        # asyncio version of connecting(). asyncio is imported here, not at the top, so the threaded client
+        # (ClientCore) starts without it.
+        import asyncio
+
+        wait = self.bucket.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        if self.async_slots is None:
+            self.async_slots = asyncio.Semaphore(self.max_in_flight)
+        async with self.async_slots:
+            with self._attempt():
+                yield
+
+    @contextlib.contextmanager
+    def _attempt(self):
+        self.stats.attempts += 1
+        self.in_flight += 1
+        try:
+            yield
+        except BaseException:
+            self.stats.failures += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def connected(self, disconnected_at=None):
+        # connected() Method:
+        # Records a successful connection. 'disconnected_at' (time.monotonic()) is when the previous connection was
+        # lost, if there was one.
+        self.stats.successes += 1
+        if disconnected_at is not None:
+            self.stats.reconnect_times.append(time.monotonic() - disconnected_at)
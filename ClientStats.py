@@ -0,0 +1,141 @@
+# Small statistics helpers shared by the client modules (no dependencies on the rest of the client).
+import collections
+import json
+import math
+import os
+import platform
+
+
+def duration_percentiles(durations, quantiles=(("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99), ("max_ms", 1.0))):
+    # duration_percentiles() Function:
+    # Returns the given percentiles of a list of durations in seconds, as milliseconds rounded to 0.01 ms.
+    durations = sorted(durations)
+    count = len(durations)
+    return {name: round(durations[min(count - 1, int(q * count))] * 1000, 2) if count else 0.0
+            for name, q in quantiles}
+
+
+class LatencyHistogram:
+    # LatencyHistogram() Class:
+    # HDR style histogram of durations: values are counted in microseconds in log-linear buckets, exact below
+    # 2 ** SUB_BUCKET_BITS us and within 1 / 2 ** (SUB_BUCKET_BITS - 1) (about 0.1%) above, so recording is O(1),
+    # memory stays small however many values are recorded and histograms from several processes can be merged.
+
+    SUB_BUCKET_BITS = 11
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds):
+        # record() Method:
+        # Counts one duration (in seconds).
+        value = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        # merge() Method:
+        # Adds the values recorded in another LatencyHistogram.
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        # reset() Method:
+        # Forgets every value recorded so far (e.g. after a warm-up).
+        self.__init__()
+
+    def _index(self, value):
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        half = 1 << (self.SUB_BUCKET_BITS - 1)
+        return (1 << self.SUB_BUCKET_BITS) + (shift - 1) * half + (value >> shift) - half
+
+    def _value(self, index):
+        # Middle of the range of values counted in bucket 'index' (microseconds).
+        if index < 1 << self.SUB_BUCKET_BITS:
+            return index
+        half = 1 << (self.SUB_BUCKET_BITS - 1)
+        shift, offset = divmod(index - (1 << self.SUB_BUCKET_BITS), half)
+        shift += 1
+        return ((offset + half) << shift) + (1 << (shift - 1))
+
+    def percentile(self, q):
+        # percentile() Method:
+        # Value (microseconds) below which a fraction 'q' of the recorded values lie.
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def summary(self, quantiles=(("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99), ("p99_9_ms", 0.999))):
+        # summary() Method:
+        # Returns the count, mean, min, max and percentiles in milliseconds rounded to 0.001 ms.
+        summary = {"count": self.count}
+        summary.update({name: round(self.percentile(q) / 1000, 3) for name, q in quantiles})
+        summary["min_ms"] = round((self.min or 0) / 1000, 3)
+        summary["mean_ms"] = round(self.total / self.count / 1000, 3) if self.count else 0.0
+        summary["max_ms"] = round(self.max / 1000, 3)
+        return summary
+
+    def to_dict(self):
+        # to_dict() Method:
+        # JSON friendly form (bucket values in microseconds -> counts), see from_dict().
+        return {"unit": "us", "min": self.min, "max": self.max, "total": self.total,
+                "buckets": [[self._value(index), count] for index, count in sorted(self.counts.items())]}
+
+    @classmethod
+    def from_dict(cls, data):
+        # from_dict() Method:
+        # Rebuilds a LatencyHistogram saved with to_dict().
+        histogram = cls()
+        for value, count in data["buckets"]:
+            histogram.counts[histogram._index(value)] += count
+            histogram.count += count
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+def machine_key():
+    # machine_key() Function:
+    # Benchmark baselines are only comparable on the same machine and Python version.
+    return f"{platform.node()} {platform.machine()} python {platform.python_version()}"
+
+
+def load_baselines(path):
+    # load_baselines() Function:
+    # {machine key: report} stored in 'path' (empty if there is no file yet).
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(report, path):
+    # save_baseline() Function:
+    # Stores 'report' as the baseline of its machine (report["machine"]), keeping the other machines' baselines.
+    baselines = load_baselines(path)
+    baselines[report["machine"]] = report
+    temp = path + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+    os.replace(temp, path)
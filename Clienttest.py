@@ -1,12 +1,25 @@
 import unittest
 import socket 
+import asyncio
+import json
 from unittest.mock import Mock, patch
 from ClientSide import (
+    FrameReader,
+    FrameWriter,
+    HandshakeStats,
+    InFlightWindow,
+    READ_BUFFER_SIZE,
+    get_ssl_context,
     generate_meter_reading,
+    receive_frame,
     send_reading_to_server,
     authenticate,
 )
+from ClientCodec import BinaryCodec
 import struct
+import threading
+import time
+import tracemalloc
 
 # Helper function for creating headers
 def create_header(length):
@@ -21,7 +34,7 @@ class TestSmartMeter(unittest.TestCase):
             self.assertGreaterEqual(reading, 0.5)
             self.assertLessEqual(reading, 2.5)
 
-    @patch("ClientSide.socket.socket")
+    @patch("ClientCore.socket.socket")
     def test_send_reading_to_server_success(self, mock_socket):
         """Test sending a meter reading to the server successfully."""
         mock_socket_instance = mock_socket.return_value
@@ -33,7 +46,7 @@ class TestSmartMeter(unittest.TestCase):
         self.assertEqual(result, "")
         mock_socket_instance.send.assert_called()
 
-    @patch("ClientSide.socket.socket")
+    @patch("ClientCore.socket.socket")
     def test_send_reading_to_server_failure(self, mock_socket):
         """Test failure in sending a meter reading to the server."""
         mock_socket_instance = mock_socket.return_value
@@ -43,35 +56,274 @@ class TestSmartMeter(unittest.TestCase):
         result = send_reading_to_server(mock_socket_instance, {"type": "MeterReading", "reading": 5.0})
         self.assertIn("Error", result)
 
-    @patch("ClientSide.socket.socket")
+    @patch("ClientCore.socket.socket")
     def test_authenticate_success(self, mock_socket):
         """Test successful authentication with the server."""
         mock_socket_instance = mock_socket.return_value
+        mock_socket_instance.send.side_effect = len
         # Simulate server response: header indicating 24 bytes followed by "Authentication successful"
         mock_socket_instance.recv.side_effect = [create_header(24), b"Authentication successful"]
 
         result = authenticate(mock_socket_instance, 12345)
         self.assertTrue(result)
 
-    @patch("ClientSide.socket.socket")
+    @patch("ClientCore.socket.socket")
+    def test_authenticate_negotiates_binary(self, mock_socket):
+        """Test that authentication switches to the binary wire format when the server accepts it."""
+        mock_socket_instance = mock_socket.return_value
+        sent = []
+        mock_socket_instance.send.side_effect = lambda view: sent.append(bytes(view)) or len(view)
+        reply = b"Authentication successful wire=binary1"
+        mock_socket_instance.recv.side_effect = [create_header(len(reply)), reply]
+
+        codec = authenticate(mock_socket_instance, 12345)
+        self.assertIsInstance(codec, BinaryCodec)
+        self.assertEqual(json.loads(sent[0][2:])["wire"], ["binary1"])
+
+    @patch("ClientCore.socket.socket")
     def test_authenticate_failure(self, mock_socket):
         """Test failed authentication with the server."""
         mock_socket_instance = mock_socket.return_value
+        mock_socket_instance.send.side_effect = len
         # Simulate server response: header indicating 18 bytes followed by "Authentication failed"
         mock_socket_instance.recv.side_effect = [create_header(18), b"Authentication failed"]
 
         result = authenticate(mock_socket_instance, 12345)
         self.assertFalse(result)
 
-    @patch("ClientSide.socket.socket")
+    @patch("ClientCore.socket.socket")
     def test_authenticate_timeout(self, mock_socket):
         """Test timeout during authentication."""
         mock_socket_instance = mock_socket.return_value
+        mock_socket_instance.send.side_effect = len
         # Simulate a socket timeout
         mock_socket_instance.recv.side_effect = socket.timeout
 
         result = authenticate(mock_socket_instance, 12345)
         self.assertFalse(result)
 
+class TestFrameReader(unittest.TestCase):
+    def test_multiple_frames_in_one_read(self):
+        """Test that every complete frame in one chunk is returned, in order."""
+        reader = FrameReader()
+        reader.feed(create_header(3) + b"one" + create_header(3) + b"two" + create_header(5) + b"th")
+        self.assertEqual([bytes(frame) for frame in reader.frames()], [b"one", b"two"])
+        self.assertEqual(reader.pending(), 4)
+        reader.feed(b"ree")
+        self.assertEqual([bytes(frame) for frame in reader.frames()], [b"three"])
+
+    def test_partial_header_and_body_byte_by_byte(self):
+        """Test that frames split at every possible byte boundary are reassembled."""
+        data = create_header(5) + b"hello" + create_header(0) + create_header(2) + b"hi"
+        reader = FrameReader()
+        frames = []
+        for index in range(len(data)):
+            reader.feed(data[index:index + 1])
+            frames.extend(bytes(frame) for frame in reader.frames())
+        self.assertEqual(frames, [b"hello", b"", b"hi"])
+
+    def test_buffer_compaction_keeps_partial_frame(self):
+        """Test that a frame straddling the end of the buffer survives compaction."""
+        reader = FrameReader(size=0)
+        body = bytes(range(256)) * 200
+        frame = create_header(len(body)) + body
+        received = []
+        for _ in range(10):
+            for start in range(0, len(frame), 30000):
+                reader.feed(frame[start:start + 30000])
+                received.extend(bytes(frame) for frame in reader.frames())
+        self.assertEqual(received, [body] * 10)
+
+    def test_buffer_grows_for_large_frames_only(self):
+        """Test that the buffer starts small, grows for a frame larger than it and shrinks back afterwards."""
+        reader = FrameReader()
+        body = bytes(range(256)) * 200
+        data = create_header(3) + b"one" + create_header(len(body)) + body
+        received = []
+        for start in range(0, len(data), 1000):
+            reader.feed(data[start:start + 1000])
+            received.extend(bytes(frame) for frame in reader.frames())
+        self.assertEqual(received, [b"one", body])
+        self.assertGreaterEqual(len(reader.buffer), len(body))
+        self.assertEqual(len(reader.get_buffer()), READ_BUFFER_SIZE)
+
+    def test_memory_per_reader(self):
+        """Test that an idle reader takes a few KB, not a maximum size frame."""
+        tracemalloc.start()
+        readers = [FrameReader() for _ in range(1000)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.assertEqual(len(readers), 1000)
+        self.assertLess(size / 1000, 2 * READ_BUFFER_SIZE)
+
+    def test_read_from_socket(self):
+        """Test reading frames from a real socket, including a short read and the peer closing."""
+        left, right = socket.socketpair()
+        with left, right:
+            reader = FrameReader()
+            right.sendall(create_header(4) + b"Bill" + create_header(4) + b"Po")
+            self.assertTrue(reader.read_from(left))
+            self.assertEqual([bytes(frame) for frame in reader.frames()], [b"Bill"])
+            right.sendall(b"we")
+            right.shutdown(socket.SHUT_WR)
+            self.assertTrue(reader.read_from(left))
+            self.assertEqual([bytes(frame) for frame in reader.frames()], [b"Powe"])
+            self.assertFalse(reader.read_from(left))
+
+    def test_asyncio_buffered_protocol(self):
+        """Test that FrameReader can be the buffer of an asyncio BufferedProtocol."""
+        class Protocol(asyncio.BufferedProtocol):
+            def __init__(self):
+                self.reader = FrameReader()
+                self.frames = []
+                self.closed = asyncio.get_running_loop().create_future()
+
+            def get_buffer(self, sizehint):
+                return self.reader.get_buffer(sizehint)
+
+            def buffer_updated(self, nbytes):
+                self.reader.buffer_updated(nbytes)
+                self.frames.extend(bytes(frame) for frame in self.reader.frames())
+
+            def connection_lost(self, exc):
+                self.closed.set_result(None)
+
+        async def run():
+            left, right = socket.socketpair()
+            transport, protocol = await asyncio.get_running_loop().connect_accepted_socket(Protocol, left)
+            right.sendall(create_header(2) + b"ab" + create_header(3))
+            right.sendall(b"cde")
+            right.close()
+            await protocol.closed
+            transport.close()
+            return protocol.frames
+
+        self.assertEqual(asyncio.run(run()), [b"ab", b"cde"])
+
+    def test_receive_frame_short_reads(self):
+        """Test that receive_frame keeps reading when recv returns less than asked for."""
+        sock = Mock()
+        sock.recv.side_effect = [b"\x00", b"\x07", b"Bil", b"l {}"]
+        self.assertEqual(receive_frame(sock), "Bill {}")
+
+class TestFrameWriter(unittest.TestCase):
+    def test_partial_sends(self):
+        """Test that partial sends continue from where they stopped, through memoryviews."""
+        sock = Mock()
+        chunks = []
+        def send(view):
+            self.assertIsInstance(view, memoryview)
+            chunks.append(bytes(view[:3]))
+            return len(chunks[-1])
+        sock.send.side_effect = send
+        writer = FrameWriter()
+        writer.send(sock, b"reading")
+        self.assertEqual(b"".join(chunks), create_header(7) + b"reading")
+        self.assertEqual(writer.depth(), 0)
+
+    def test_queued_frames_are_coalesced(self):
+        """Test that frames queued behind a failed send go out together in one send call."""
+        sock = Mock()
+        sock.send.side_effect = socket.error("Socket error")
+        writer = FrameWriter()
+        writer.enqueue(b"one")
+        with self.assertRaises(socket.error):
+            writer.flush(sock)
+        writer.enqueue(b"two")
+        self.assertEqual(writer.depth(), 2)
+        self.assertEqual(writer.queued_bytes(), 10)
+
+        sent = []
+        sock.send.side_effect = lambda view: sent.append(bytes(view)) or len(view)
+        writer.flush(sock)
+        self.assertEqual(sent, [create_header(3) + b"one" + create_header(3) + b"two"])
+        self.assertEqual(writer.depth(), 0)
+        self.assertEqual(writer.queued_bytes(), 0)
+
+    def test_reading_uses_connection_writer(self):
+        """Test that send_reading_to_server frames the reading through the given writer."""
+        left, right = socket.socketpair()
+        with left, right:
+            writer = FrameWriter()
+            self.assertEqual(send_reading_to_server(left, {"type": "MeterReading", "reading": 1.5}, writer=writer), "")
+            self.assertEqual(receive_frame(right), '{"type": "MeterReading", "reading": 1.5}')
+
+class TestTLS(unittest.TestCase):
+    def test_ssl_context_is_built_once(self):
+        """Test that every connect in a process shares one SSL context."""
+        self.assertIs(get_ssl_context(), get_ssl_context())
+
+    def test_handshake_summary(self):
+        """Test the handshake resumption rate and percentiles."""
+        stats = HandshakeStats()
+        for index in range(100):
+            stats.record((index + 1) / 1000, resumed=index % 4 != 0)
+        summary = stats.summary()
+        self.assertEqual(summary["handshakes"], 100)
+        self.assertEqual(summary["resumption_rate"], 0.75)
+        self.assertEqual(summary["p50_ms"], 51.0)
+        self.assertEqual(summary["max_ms"], 100.0)
+
+
+class TestInFlightWindow(unittest.TestCase):
+    def test_block_waits_for_bill(self):
+        """Test that 'block' holds the next reading until a Bill frees a slot, and counts the stall."""
+        window = InFlightWindow(limit=2, policy="block", timeout=5)
+        self.assertTrue(window.submit(1, 1.0))
+        self.assertTrue(window.submit(2, 2.0))
+        self.assertTrue(window.full())
+        bill = threading.Timer(0.05, window.complete)
+        bill.start()
+        self.assertTrue(window.submit(3, 3.0))
+        bill.join()
+        self.assertEqual([seq for seq, _ in window.in_flight], [2, 3])
+        summary = window.summary()
+        self.assertEqual((summary["stalls"], summary["max_depth"], summary["sent"]), (1, 2, 3))
+        self.assertGreater(summary["stalled_s"], 0.0)
+
+    def test_block_times_out(self):
+        """Test that 'block' gives up after its stall timeout."""
+        window = InFlightWindow(limit=1, policy="block", timeout=0.01)
+        window.submit(1, 1.0)
+        with self.assertRaises(TimeoutError):
+            window.submit(2, 2.0)
+
+    def test_close_wakes_blocked_sender(self):
+        """Test that closing the connection wakes up a reading waiting for a slot."""
+        window = InFlightWindow(limit=1, policy="block", timeout=5)
+        window.submit(1, 1.0)
+        threading.Timer(0.05, window.close).start()
+        with self.assertRaises(ConnectionError):
+            window.submit(2, 2.0)
+        self.assertIsNone(window.take_held(5))
+
+    def test_drop(self):
+        """Test that 'drop' skips readings while the window is full."""
+        window = InFlightWindow(limit=1, policy="drop")
+        self.assertTrue(window.submit(1, 1.0))
+        self.assertFalse(window.submit(2, 2.0))
+        self.assertEqual(window.complete()[0], 1)
+        self.assertTrue(window.submit(3, 3.0))
+        self.assertEqual(window.summary()["dropped"], 1)
+
+    def test_coalesce(self):
+        """Test that 'coalesce' keeps only the newest held reading and sends it once a slot is free."""
+        window = InFlightWindow(limit=1, policy="coalesce")
+        window.submit(1, 1.0)
+        self.assertFalse(window.submit(2, 2.0))
+        self.assertFalse(window.submit(3, 3.0))
+        self.assertIsNone(window.take_held(0.01))
+        window.complete()
+        start = time.monotonic()
+        self.assertEqual(window.take_held(5), (3, 3.0))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((window.depth(), window.summary()["coalesced"]), (1, 1))
+
+    def test_unknown_policy(self):
+        """Test that an unknown backpressure policy is rejected."""
+        with self.assertRaises(ValueError):
+            InFlightWindow(policy="queue")
+
+
 if __name__ == "__main__":
     unittest.main()
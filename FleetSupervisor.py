@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import ctypes
+import multiprocessing
+import os
+import sys
+import time
+
+from ClientCodec import WIRE_OFFER
+from ClientMetrics import MetricsDumper, clear_dumps
+from SimClock import ReadingScheduler, SimClock
+from ClientFleet import (
+    SERVER_HOST,
+    SERVER_PORT,
+    MIN_READING_INTERVAL,
+    MAX_READING_INTERVAL,
+    REPORT_INTERVAL,
+    FLEET_METRICS_DIR,
+    FLEET_METRICS_PORT,
+    FleetCounters,
+    HandshakeStats,
+    ReconnectScheduler,
+    add_backpressure_args,
+    add_metrics_args,
+    add_profile_args,
+    add_reconnect_args,
+    add_simulation_args,
+    reconnect_options,
+    format_summary,
+    run_fleet,
+    start_metrics,
+    wait_or_stop,
+)
+
+# Global Vars
+# How often each worker copies its counters into shared memory (seconds).
+PUBLISH_INTERVAL = 0.5
+
+
+def split_shards(first_id, count, workers):
+    # split_shards() Function:
+    # Splits the meter ids first_id .. first_id + count - 1 into 'workers' contiguous ranges of near equal size.
+    # Shards that would be empty (more workers than meters) are dropped.
+    workers = max(1, min(workers, count))
+    size, remainder = divmod(count, workers)
+    shards = []
+    start = first_id
+    for index in range(workers):
+        end = start + size + (1 if index < remainder else 0)
+        shards.append(range(start, end))
+        start = end
+    return [shard for shard in shards if len(shard)]
+
+
+def run_shard(index, ids, shared, start_delay, options):
+    # run_shard() Function:
+    # Worker process entry point: runs one headless fleet for 'ids' on its own event loop and publishes its
+    # counters into row 'index' of the shared counter array. With 'metrics_dir' in the options, the shard's
+    # metrics (ClientMetrics) are dumped there for the supervisor to serve.
+    try:
+        asyncio.run(_run_shard(index, ids, shared, start_delay, options))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _run_shard(index, ids, shared, start_delay, options):
+    counters = FleetCounters()
+    handshakes = HandshakeStats()
+    scheduler = ReconnectScheduler(**options.pop("reconnect", {}))
+    profile = options.pop("profile", None)
+    simulation = options.pop("simulation", None)
+    metrics_dir = options.pop("metrics_dir", None)
+    if simulation is not None:
+        # Each shard draws its own reading times, seeded by (seed, first meter id of the shard).
+        clock = None if simulation["speed"] is None else SimClock(simulation["speed"])
+        seed = None if simulation["seed"] is None else f"{simulation['seed']}:{ids.start}"
+        simulation = ReadingScheduler(clock, simulation["until"], seed,
+                                      options.get("min_interval", MIN_READING_INTERVAL),
+                                      options.get("max_interval", MAX_READING_INTERVAL))
+    schedule = None
+    if profile is not None:
+        # Each shard draws its own rows, seeded by (seed, first meter id of the shard).
+        from LoadProfile import generate_schedule
+        schedule = generate_schedule(len(ids), profile["readings"], [profile["seed"], ids.start],
+                                     options.get("min_interval", MIN_READING_INTERVAL),
+                                     options.get("max_interval", MAX_READING_INTERVAL), profile["start_hour"])
+    stop = asyncio.Event()
+    offset = index * len(FleetCounters.FIELDS)
+
+    def publish():
+        for position, field in enumerate(FleetCounters.FIELDS):
+            shared[offset + position] = getattr(counters, field)
+
+    async def publisher():
+        while not stop.is_set():
+            publish()
+            await wait_or_stop(stop, PUBLISH_INTERVAL)
+
+    # Stagger the shards so their ramp-ups interleave instead of all starting at once.
+    await asyncio.sleep(start_delay)
+    publishing = asyncio.ensure_future(publisher())
+    dumper = None
+    if metrics_dir is not None:
+        dumper = MetricsDumper(f"shard-{index}", directory=metrics_dir)
+        dumper.start()
+    try:
+        await run_fleet(ids, counters=counters, stop=stop, report_interval=0, handshakes=handshakes,
+                        scheduler=scheduler, schedule=schedule, simulation=simulation, **options)
+    finally:
+        stop.set()
+        await publishing
+        publish()
+        if dumper is not None:
+            dumper.stop()
+    if handshakes.durations:
+        print(f"[shard {index}] tls {format_summary(handshakes.summary())}", flush=True)
+    if simulation is not None:
+        print(f"[shard {index}] simulation {format_summary(simulation.summary())}", flush=True)
+    if scheduler.stats.reconnect_times:
+        print(f"[shard {index}] reconnect {format_summary(scheduler.stats.summary())}", flush=True)
+
+
+def collect(shared, shards):
+    # collect() Function:
+    # Reads every shard's counters from shared memory. Returns (fleet totals, list of per-shard dicts).
+    width = len(FleetCounters.FIELDS)
+    per_shard = []
+    for index in range(shards):
+        row = shared[index * width:(index + 1) * width]
+        per_shard.append(dict(zip(FleetCounters.FIELDS, row)))
+    totals = {field: sum(shard[field] for shard in per_shard) for field in FleetCounters.FIELDS}
+    return totals, per_shard
+
+
+def run_supervisor(first_id, count, workers=None, ramp_rate=50.0, duration=None, report_interval=REPORT_INTERVAL,
+                   per_shard=False, reconnect=None, profile=None, simulation=None, metrics_dir=FLEET_METRICS_DIR,
+                   metrics_port=FLEET_METRICS_PORT, **options):
+    # run_supervisor() Function:
+    # Splits the id range across 'workers' processes (default: one per core), starts them with staggered ramp-up
+    # and prints a live fleet summary built from the per-shard counters until every worker exits.
+    # 'ramp_rate' and the connect rate in 'reconnect' (ReconnectScheduler options) are fleet wide, each shard
+    # gets its share of them. 'profile' ({"seed", "readings", "start_hour"}) makes the workers use a LoadSchedule,
+    # 'simulation' ({"speed", "until", "seed"}, speed None for ack paced) a ReadingScheduler each.
+    # Every shard dumps its metrics into 'metrics_dir' (None: no dumps), served added up as Prometheus text on
+    # 'metrics_port' (None: not served) while the fleet runs.
+    # Returns the fleet totals, with 'failed_shards': the workers that exited with an error.
+    shards = split_shards(first_id, count, workers or os.cpu_count() or 1)
+    # Spawn rather than fork: a forked worker can inherit locks held by other threads of the parent.
+    context = multiprocessing.get_context("spawn")
+    shared = context.Array(ctypes.c_longlong, len(shards) * len(FleetCounters.FIELDS), lock=False)
+
+    metrics = None
+    if metrics_dir is not None:
+        clear_dumps(metrics_dir)
+        if metrics_port is not None:
+            metrics = start_metrics(metrics_port, metrics_dir, registry=None)
+
+    processes = []
+    for index, ids in enumerate(shards):
+        shard_options = dict(options, ramp_rate=ramp_rate / len(shards) if ramp_rate else 0, duration=duration,
+                             metrics_dir=metrics_dir)
+        if profile is not None:
+            shard_options["profile"] = profile
+        if simulation is not None:
+            shard_options["simulation"] = simulation
+        if reconnect:
+            shard_options["reconnect"] = dict(reconnect, rate=reconnect.get("rate", 0) / len(shards),
+                                              burst=max(1, reconnect.get("burst", 1) // len(shards)))
+        start_delay = index / ramp_rate if ramp_rate else 0
+        process = context.Process(target=run_shard, args=(index, ids, shared, start_delay, shard_options),
+                                  daemon=True)
+        process.start()
+        processes.append(process)
+
+    interrupted = False
+    try:
+        while any(process.is_alive() for process in processes):
+            deadline = time.monotonic() + (report_interval or PUBLISH_INTERVAL)
+            for process in processes:
+                process.join(max(0, deadline - time.monotonic()))
+            if report_interval:
+                totals, shard_values = collect(shared, len(shards))
+                print(f"[fleet] workers={sum(p.is_alive() for p in processes)}/{len(processes)} "
+                      f"{format_summary(totals)}", flush=True)
+                if per_shard:
+                    for index, values in enumerate(shard_values):
+                        print(f"  [shard {index} ids {shards[index].start}-{shards[index].stop - 1}] "
+                              f"{format_summary(values)}", flush=True)
+    except KeyboardInterrupt:
+        interrupted = True
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    finally:
+        if metrics is not None:
+            metrics.shutdown()
+            metrics.server_close()
+
+    totals = collect(shared, len(shards))[0]
+    totals["failed_shards"] = 0
+    for index, process in enumerate(processes):
+        if process.exitcode and not interrupted:
+            print(f"[shard {index}] worker exited with code {process.exitcode}", flush=True)
+            totals["failed_shards"] += 1
+    return totals
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the sharded fleet.
+    parser = argparse.ArgumentParser(description="Run a headless meter fleet sharded across CPU cores.")
+    parser.add_argument("--meters", type=int, default=20, help="number of meters to simulate")
+    parser.add_argument("--first-id", type=int, default=0, help="id of the first meter, meters use consecutive ids")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--ramp-rate", type=float, default=50.0, help="meters started per second, fleet wide")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run for (default: until Ctrl+C)")
+    parser.add_argument("--min-interval", type=float, default=MIN_READING_INTERVAL)
+    parser.add_argument("--max-interval", type=float, default=MAX_READING_INTERVAL)
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    parser.add_argument("--per-shard", action="store_true", help="also print each shard's counters")
+    parser.add_argument("--no-tls", action="store_true", help="connect without TLS (directly to the server, not HAProxy)")
+    parser.add_argument("--json-only", action="store_true",
+                        help="don't offer the binary wire format when authenticating")
+    add_reconnect_args(parser)
+    add_backpressure_args(parser)
+    add_metrics_args(parser)
+    add_profile_args(parser)
+    add_simulation_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    totals = run_supervisor(args.first_id, args.meters, workers=args.workers, ramp_rate=args.ramp_rate,
+                            duration=args.duration, report_interval=args.report_interval, per_shard=args.per_shard,
+                            host=args.host, port=args.port, min_interval=args.min_interval,
+                            max_interval=args.max_interval, tls=not args.no_tls, reconnect=reconnect_options(args),
+                            profile=None if args.seed is None else {"seed": args.seed,
+                                                                    "readings": args.profile_readings,
+                                                                    "start_hour": args.start_hour},
+                            simulation=None if args.speed is None and not args.ack_paced else {
+                                "speed": None if args.ack_paced else args.speed, "until": args.sim_duration,
+                                "seed": args.seed},
+                            wire_formats=() if args.json_only else WIRE_OFFER, max_in_flight=args.max_in_flight,
+                            backpressure=args.backpressure, metrics_dir=None if args.no_metrics else FLEET_METRICS_DIR,
+                            metrics_port=None if args.no_metrics else args.metrics_port)
+    print(f"[fleet] final {format_summary(totals)}")
+    return 1 if totals["failed_shards"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import ssl
+import struct
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from ClientFleet import FleetCounters, FleetMeter, FleetWindow, run_fleet
+from ClientCore import BYTES_SENT, READINGS_SENT, ROUND_TRIP
+from ClientMetrics import load_snapshots, merge_snapshots
+from ClientReconnect import ReconnectScheduler
+from ClientCore import create_ssl_context
+import FleetSupervisor
+from FleetSupervisor import run_supervisor, split_shards
+from StandInServer import read_frame
+
+
+async def fake_server(reader, writer, max_readings=None, delay=0):
+    """Minimal server: accepts any auth and answers every reading with a Bill ('delay' seconds later), optionally
+    disconnecting after max_readings readings."""
+    async def send(payload):
+        writer.write(struct.pack('>H', len(payload)) + payload)
+        await writer.drain()
+
+    auth = json.loads(await read_frame(reader))
+    await send(b"Authentication successful" if auth["id"] != 99 else b"Authentication failed")
+    while True:
+        frame = await read_frame(reader)
+        if frame is None:
+            break
+        reading = json.loads(frame)["reading"]
+        if delay:
+            await asyncio.sleep(delay)
+        await send(json.dumps({
+            "type": "Bill", "total": reading * 0.2 + 0.4, "standing_charge": 0.4,
+            "units_start": 0.0, "units_end": reading, "price_per_unit": 0.2,
+            "daily_standing_charge": 0.4, "billing_period": {"start": "2024-11-01", "end": "2024-12-01"},
+        }).encode('utf-8'))
+        if max_readings is not None:
+            max_readings -= 1
+            if max_readings == 0:
+                break
+    writer.close()
+
+
+class TestFleet(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await asyncio.start_server(fake_server, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_fleet_sends_readings_and_receives_bills(self):
+        """Test that every meter in the fleet authenticates and gets bills back."""
+        counters = await run_fleet(range(10), ramp_rate=0, host="127.0.0.1", port=self.port, duration=0.5,
+                                   min_interval=0.05, max_interval=0.1, report_interval=0, tls=False)
+        self.assertEqual(counters.connected, 0)
+        self.assertEqual(counters.errors, 0)
+        self.assertGreaterEqual(counters.readings_sent, 10)
+        self.assertGreaterEqual(counters.bills_received, 10)
+
+    async def test_fleet_counters_are_exported_to_metrics(self):
+        """Test that the fleet's counters and reading round trips are added to the process metrics."""
+        readings, sent, round_trips = READINGS_SENT.value, BYTES_SENT.value, ROUND_TRIP.count
+        counters = await run_fleet(range(5), ramp_rate=0, host="127.0.0.1", port=self.port, duration=0.5,
+                                   min_interval=0.05, max_interval=0.1, report_interval=0, tls=False)
+        self.assertGreater(counters.readings_sent, 0)
+        self.assertEqual(READINGS_SENT.value - readings, counters.readings_sent)
+        self.assertEqual(BYTES_SENT.value - sent, counters.bytes_sent)
+        self.assertEqual(ROUND_TRIP.count - round_trips, counters.bills_received)
+
+    async def test_meter_stops_on_auth_failure(self):
+        """Test that a rejected meter stops instead of reconnecting."""
+        counters = FleetCounters()
+        meter = FleetMeter(99, counters, None, "127.0.0.1", self.port)
+        await asyncio.wait_for(meter.run(asyncio.Event()), 2)
+        self.assertEqual(counters.auth_failures, 1)
+        self.assertEqual(meter.status, "Authentication Failed")
+
+    async def test_meters_reconnect_after_server_drops_them(self):
+        """Test that meters reconnect (with backoff) after the server closes their connections."""
+        server = await asyncio.start_server(lambda r, w: fake_server(r, w, max_readings=1), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        scheduler = ReconnectScheduler(base_delay=0.05, max_delay=0.1, rate=0)
+        try:
+            counters = await run_fleet(range(5), ramp_rate=0, host="127.0.0.1", port=port, duration=1.0,
+                                       min_interval=0.01, max_interval=0.02, report_interval=0, tls=False,
+                                       scheduler=scheduler)
+        finally:
+            server.close()
+            await server.wait_closed()
+        self.assertGreaterEqual(counters.reconnects, 5)
+        self.assertEqual(counters.connect_attempts, scheduler.stats.attempts)
+        self.assertEqual(len(scheduler.stats.reconnect_times), counters.reconnects)
+
+    async def test_in_flight_window_against_slow_server(self):
+        """Test that each policy keeps at most max_in_flight readings unbilled per connection on a slow server."""
+        server = await asyncio.start_server(lambda r, w: fake_server(r, w, delay=0.1), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        results = {}
+        try:
+            for policy in ("block", "drop", "coalesce"):
+                results[policy] = await run_fleet(range(3), ramp_rate=0, host="127.0.0.1", port=port, duration=1.0,
+                                                  min_interval=0.005, max_interval=0.01, report_interval=0,
+                                                  tls=False, max_in_flight=2, backpressure=policy)
+        finally:
+            server.close()
+            await server.wait_closed()
+        for policy, counters in results.items():
+            with self.subTest(policy):
+                self.assertEqual(counters.errors, 0)
+                self.assertLessEqual(counters.unanswered, 3 * 2)
+                self.assertLessEqual(counters.readings_sent - counters.bills_received, 3 * 2)
+        self.assertGreater(results["block"].stalls, 0)
+        self.assertGreater(results["drop"].readings_dropped, 0)
+        self.assertGreater(results["coalesce"].readings_coalesced, 0)
+        self.assertEqual((results["block"].readings_dropped, results["drop"].stalls), (0, 0))
+
+    async def test_fleet_window_never_blocks_the_loop(self):
+        """Test that a full 'block' window holds a submitted reading back and slot() awaits a Bill or times out."""
+        window = FleetWindow(limit=1, policy="block", timeout=0.05)
+        self.assertTrue(window.submit(1, 1.0))
+        self.assertFalse(window.submit(2, 2.0))
+        with self.assertRaises(asyncio.TimeoutError):
+            await window.slot()
+        asyncio.get_running_loop().call_later(0.01, window.complete)
+        window.timeout = 5
+        await window.slot()
+        self.assertEqual(window.take_held(0), (2, 2.0))
+        self.assertEqual(window.summary()["stalls"], 2)
+
+    async def test_fleet_takes_readings_from_schedule(self):
+        """Test that meters send the cumulative kWh of their schedule rows."""
+        from LoadProfile import generate_schedule
+        schedule = generate_schedule(3, 50, seed=5, min_interval=0.01, max_interval=0.02)
+        counters = FleetCounters()
+        stop = asyncio.Event()
+        meters = [FleetMeter(id, counters, None, "127.0.0.1", self.port, schedule=schedule, schedule_row=id)
+                  for id in range(3)]
+        tasks = [asyncio.ensure_future(meter.run(stop)) for meter in meters]
+        await asyncio.sleep(0.3)
+        stop.set()
+        await asyncio.gather(*tasks)
+        for row, meter in enumerate(meters):
+            self.assertGreater(meter.readings_taken, 5)
+            expected = sum(schedule.reading(row, n)[1] for n in range(meter.readings_taken))
+            self.assertAlmostEqual(meter.cumulative_reading, expected)
+
+    def test_handle_bill(self):
+        """Test that a Bill message updates the meter's billing attributes."""
+        meter = FleetMeter(1, FleetCounters(), None)
+        meter.handle_frame(memoryview(json.dumps({"type": "Bill", "total": 3.0, "units_start": 1.0, "units_end": 6.0,
+                                                  "billing_period": {"start": "a", "end": "b"}}).encode()))
+        self.assertEqual(meter.total_bill, 3.0)
+        self.assertEqual(meter.units_used, 5.0)
+        self.assertEqual(meter.billing_period, "a - b")
+        self.assertEqual(meter.counters.bills_received, 1)
+
+
+class TestFleetTLS(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain("./Certificates/haproxy.pem")
+        self.server = await asyncio.start_server(fake_server, "127.0.0.1", 0, ssl=server_context)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.context = create_ssl_context()
+        # The checked in test certificate has expired, only the handshake is under test here.
+        self.context.verify_mode = ssl.CERT_NONE
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_reconnect_resumes_tls_session(self):
+        """Test that a meter's second connection resumes the TLS session of its first one."""
+        counters = FleetCounters()
+        meter = FleetMeter(1, counters, self.context, "127.0.0.1", self.port)
+        for _ in range(2):
+            reader, writer = await meter.connect()
+            self.assertTrue(await meter.authenticate(reader, writer))
+            meter.sessions.store(meter.id, writer.get_extra_info("ssl_object"))
+            writer.close()
+            await writer.wait_closed()
+
+        self.assertEqual(counters.handshakes, 2)
+        self.assertEqual(counters.resumed_handshakes, 1)
+        summary = meter.handshakes.summary()
+        self.assertEqual(summary["handshakes"], 2)
+        self.assertEqual(summary["resumption_rate"], 0.5)
+
+
+class TestFleetSupervisor(unittest.TestCase):
+    def setUp(self):
+        # The workers are separate processes: serve them from an event loop on a thread of this one.
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(fake_server, "127.0.0.1", 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def test_split_shards(self):
+        """Test that shards cover the id range exactly once with near equal sizes."""
+        shards = split_shards(100, 10, 3)
+        self.assertEqual([list(shard) for shard in shards], [list(range(100, 104)), list(range(104, 107)),
+                                                             list(range(107, 110))])
+        self.assertEqual(len(split_shards(0, 2, 8)), 2)
+
+    def test_supervisor_collects_shard_counters(self):
+        """Test that counters from every worker process are summed into the fleet totals."""
+        totals = run_supervisor(0, 6, workers=2, ramp_rate=0, duration=1.0, report_interval=0,
+                                host="127.0.0.1", port=self.port, min_interval=0.05, max_interval=0.1, tls=False,
+                                metrics_dir=None)
+        self.assertEqual(totals["failed_shards"], 0)
+        self.assertEqual(totals["errors"], 0)
+        self.assertGreaterEqual(totals["readings_sent"], 6)
+        self.assertGreaterEqual(totals["bills_received"], 6)
+
+    def test_supervisor_runs_simulated_shards(self):
+        """Test that every shard runs an ack paced simulation to its end."""
+        totals = run_supervisor(0, 4, workers=2, ramp_rate=0, report_interval=0, host="127.0.0.1",
+                                port=self.port, tls=False, metrics_dir=None,
+                                simulation={"speed": None, "until": 600, "seed": 3})
+        self.assertEqual(totals["failed_shards"], 0)
+        self.assertEqual(totals["errors"], 0)
+        # 600 simulated seconds at one reading every 15-60 s: at least 10 readings per meter.
+        self.assertGreaterEqual(totals["readings_sent"], 40)
+
+    def test_failed_shards_are_counted(self):
+        """Test that workers exiting with an error are reported in the fleet totals."""
+        totals = run_supervisor(0, 2, workers=2, ramp_rate=0, duration=0.5, report_interval=0,
+                                host="127.0.0.1", port=self.port, tls=False, metrics_dir=None,
+                                backpressure="unknown")
+        self.assertEqual(totals["failed_shards"], 2)
+
+    def test_no_metrics_option(self):
+        """Test that --no-metrics turns off the shards' metric dumps as well as the endpoint."""
+        with patch.object(FleetSupervisor, "run_supervisor", return_value={"failed_shards": 0}) as run:
+            self.assertEqual(FleetSupervisor.main(["--meters", "2", "--no-metrics"]), 0)
+        self.assertIsNone(run.call_args.kwargs["metrics_dir"])
+        self.assertIsNone(run.call_args.kwargs["metrics_port"])
+
+    def test_shards_dump_their_metrics(self):
+        """Test that every shard dumps its metrics and that they add up to the fleet totals."""
+        with tempfile.TemporaryDirectory() as directory:
+            totals = run_supervisor(0, 4, workers=2, ramp_rate=0, duration=1.0, report_interval=0,
+                                    host="127.0.0.1", port=self.port, min_interval=0.05, max_interval=0.1,
+                                    tls=False, metrics_dir=directory, metrics_port=0)
+            snapshots = load_snapshots(directory)
+        self.assertEqual(len(snapshots), 2)
+        metrics = merge_snapshots(snapshots)
+        self.assertGreater(totals["readings_sent"], 0)
+        self.assertEqual(metrics["smartmeter_readings_sent_total"][2], totals["readings_sent"])
+        self.assertEqual(metrics["smartmeter_bills_received_total"][2], totals["bills_received"])
+        self.assertEqual(metrics["smartmeter_fleet_connect_attempts_total"][2], totals["connect_attempts"])
+        self.assertEqual(metrics["smartmeter_reading_round_trip_seconds"][2].count, totals["bills_received"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import statistics
+import time
+from datetime import datetime, timezone
+
+from ClientFleet import FleetCounters, run_fleet
+from ClientStats import duration_percentiles
+from StandInServer import SERVER_HOST, StandInServer
+
+# Global Vars
+# Fleet sizes and seconds between a meter's readings (on average) swept by the benchmark, broadcasts (issue +
+# resolution pairs) sent at each step and how long each broadcast is given to reach the fleet.
+GRID_METERS = (100, 500, 1000)
+GRID_INTERVALS = (1.0, 0.1)
+GRID_BROADCASTS = 3
+SETTLE_SECONDS = 1.0
+# Seconds allowed for the whole fleet to connect before broadcasting (meters still missing then count as missed).
+CONNECT_WAIT = 30.0
+GRID_ISSUE = "PowerGridIssue"
+GRID_RESOLVED = "PowerGridIssueResolved"
+# Ids of the meters that missed a broadcast listed in a report, at most.
+MISSED_IDS_SHOWN = 20
+RESULT_HEADER = (f"{'meters':>7} {'interval s':>10} {'readings/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+                 f"{'spread ms':>10} {'missed':>7}")
+
+
+class GridEvent:
+    # GridEvent() Class:
+    # One power grid broadcast as seen by the fleet: its kind (message type), when it was sent (perf_counter(),
+    # None if not known) and when each meter first received it.
+
+    def __init__(self, kind, sent=None):
+        self.kind = kind
+        self.error = None
+        self.sent = sent
+        self.received = {}
+        self.duplicates = 0
+
+    def summary(self, ids):
+        # summary() Method:
+        # Delivery of this broadcast to the meters 'ids': how many got it, the first to last receive spread and
+        # the delivery latency percentiles, from the send time (or the first receipt if it isn't known).
+        times = sorted(self.received.values())
+        start = self.sent if self.sent is not None else (times[0] if times else 0.0)
+        missed = [id for id in ids if id not in self.received]
+        summary = {
+            "kind": self.kind,
+            "received": len(times),
+            "missed": len(missed),
+            "missed_ids": missed[:MISSED_IDS_SHOWN],
+            "duplicates": self.duplicates,
+            "spread_ms": round((times[-1] - times[0]) * 1000, 3) if times else 0.0,
+        }
+        summary.update(duration_percentiles([received - start for received in times]))
+        return summary
+
+
+class GridObserver:
+    # GridObserver() Class:
+    # Fleet wide observer of power grid messages (pass it to run_fleet() as 'observer'). Every meter's receipt is
+    # timestamped and deduplicated into one GridEvent per broadcast. Call broadcast() just before a broadcast is
+    # sent to time delivery from the send. Receipts of broadcasts that weren't announced (e.g. the server's
+    # SIGUSR1 toggles) still open events of their own, timed from their first receipt.
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.events = []
+
+    def broadcast(self, kind):
+        # broadcast() Method:
+        # Announces a broadcast of message type 'kind' about to be sent. Returns its GridEvent.
+        event = GridEvent(kind, self.clock())
+        self.events.append(event)
+        return event
+
+    def grid_message(self, id, message):
+        # grid_message() Method:
+        # Meter 'id' received a PowerGridIssue / PowerGridIssueResolved. It belongs to the latest event of its
+        # kind unless the meter already had that one: a repeat of an announced broadcast is counted as a duplicate,
+        # otherwise it is a new broadcast.
+        now = self.clock()
+        kind = type(message).__name__
+        event = next((event for event in reversed(self.events) if event.kind == kind), None)
+        if event is not None and id in event.received:
+            if event.sent is not None:
+                event.duplicates += 1
+                return
+            event = None
+        if event is None:
+            event = GridEvent(kind)
+            self.events.append(event)
+        if event.error is None:
+            event.error = getattr(message, "error", None)
+        event.received[id] = now
+
+
+def summarise_events(events, ids):
+    # summarise_events() Function:
+    # Summary of several broadcasts to the meters 'ids': delivery latency percentiles over every receipt, the
+    # median and worst first to last spread and the meters that missed at least one.
+    latencies = []
+    missed = set()
+    for event in events:
+        times = sorted(event.received.values())
+        if times:
+            start = event.sent if event.sent is not None else times[0]
+            latencies += [received - start for received in times]
+        missed.update(id for id in ids if id not in event.received)
+    spreads = [event.summary(ids)["spread_ms"] for event in events]
+    summary = {"broadcasts": len(events), "receipts": len(latencies)}
+    summary.update(duration_percentiles(latencies))
+    summary["spread_p50_ms"] = round(statistics.median(spreads), 3) if spreads else 0.0
+    summary["spread_max_ms"] = max(spreads, default=0.0)
+    summary["missed_meters"] = len(missed)
+    summary["missed_ids"] = sorted(missed)[:MISSED_IDS_SHOWN]
+    return summary
+
+
+async def wait_connected(counters, meters, timeout=CONNECT_WAIT):
+    # wait_connected() Function:
+    # Waits until 'meters' meters are connected or 'timeout' seconds have passed. Returns the number connected.
+    deadline = time.monotonic() + timeout
+    while counters.connected < meters and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return counters.connected
+
+
+async def run_grid_benchmark(meters, interval, broadcasts=GRID_BROADCASTS, settle=SETTLE_SECONDS, host=None,
+                             port=None, server_pid=None, tls=False, ramp_rate=0.0, connect_wait=CONNECT_WAIT):
+    # run_grid_benchmark() Function:
+    # Connects a fleet of 'meters' meters (ids 0 .. meters - 1) sending a reading every 'interval' seconds on
+    # average, then sends 'broadcasts' power grid issues, each followed by its resolution, 'settle' seconds apart.
+    # Without 'port' the broadcasts come from a StandInServer on this event loop. Otherwise the fleet connects to
+    # host:port and each broadcast is triggered with SIGUSR1 to 'server_pid' (the server must start with no grid
+    # issue). Returns the result of this step, see summarise_events().
+    server = None
+    if port is None:
+        server = await StandInServer(port=0, clients=meters).start()
+        host, port = server.host, server.port
+    observer = GridObserver()
+    counters = FleetCounters()
+    stop = asyncio.Event()
+    ids = range(meters)
+    fleet = asyncio.ensure_future(run_fleet(ids, ramp_rate, counters, host, port, None, interval / 2,
+                                            interval * 1.5, report_interval=0, stop=stop, tls=tls,
+                                            observer=observer))
+    try:
+        connected = await wait_connected(counters, meters, connect_wait)
+        readings = counters.readings_sent
+        start = time.perf_counter()
+        for _ in range(broadcasts):
+            for kind in (GRID_ISSUE, GRID_RESOLVED):
+                observer.broadcast(kind)
+                if server is None:
+                    os.kill(server_pid, signal.SIGUSR1)
+                elif kind == GRID_ISSUE:
+                    server.broadcast_grid_issue()
+                else:
+                    server.broadcast_grid_resolved()
+                await asyncio.sleep(settle)
+        elapsed = time.perf_counter() - start
+        readings = counters.readings_sent - readings
+    finally:
+        stop.set()
+        await fleet
+        if server is not None:
+            await server.close()
+
+    result = {"meters": meters, "interval_s": interval, "connected": connected,
+              "readings_per_second": round(readings / elapsed, 1) if elapsed else 0.0}
+    result.update(summarise_events(observer.events, ids))
+    result["events"] = [event.summary(ids) for event in observer.events]
+    return result
+
+
+def format_result(result):
+    # format_result() Function:
+    # One line of the results table (see RESULT_HEADER) for a fleet size and reading interval.
+    return (f"{result['meters']:>7} {result['interval_s']:>10} {result['readings_per_second']:>11} "
+            f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['max_ms']:>8} {result['spread_max_ms']:>10} "
+            f"{result['missed_meters']:>7}")
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the benchmark.
+    parser = argparse.ArgumentParser(description="Measure how long power grid broadcasts take to reach the whole "
+                                                 "fleet, at increasing fleet sizes and reading rates.")
+    parser.add_argument("--meters", type=int, nargs="+", default=GRID_METERS, help="fleet sizes to run")
+    parser.add_argument("--intervals", type=float, nargs="+", default=GRID_INTERVALS,
+                        help="average seconds between a meter's readings")
+    parser.add_argument("--broadcasts", type=int, default=GRID_BROADCASTS,
+                        help="grid issue + resolution pairs per fleet size and interval")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="seconds between broadcasts")
+    parser.add_argument("--ramp-rate", type=float, default=0.0, help="meters started per second (0 = all at once)")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=None,
+                        help="server to connect to (default: a stand-in server in this process)")
+    parser.add_argument("--server-pid", type=int, default=None,
+                        help="process id of the server at --port, sent SIGUSR1 to broadcast")
+    parser.add_argument("--tls", action="store_true", help="connect to --port with TLS")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if (args.port is None) != (args.server_pid is None):
+        parser.error("--port and --server-pid go together")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    print(RESULT_HEADER, flush=True)
+    for meters in args.meters:
+        for interval in args.intervals:
+            results.append(asyncio.run(run_grid_benchmark(meters, interval, args.broadcasts, args.settle, args.host,
+                                                          args.port, args.server_pid, args.tls, args.ramp_rate)))
+            print(format_result(results[-1]), flush=True)
+
+    if args.output:
+        report = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "config": {"broadcasts": args.broadcasts, "settle_s": args.settle, "port": args.port,
+                       "tls": args.tls},
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
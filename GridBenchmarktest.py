@@ -0,0 +1,67 @@
+import unittest
+
+from ClientCodec import PowerGridIssue, PowerGridIssueResolved
+from GridBenchmark import GRID_ISSUE, GRID_RESOLVED, GridObserver, run_grid_benchmark, summarise_events
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestGridObserver(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.observer = GridObserver(self.clock)
+
+    def receive(self, at, id, message):
+        self.clock.now = at
+        self.observer.grid_message(id, message)
+
+    def test_receipts_are_grouped_per_broadcast(self):
+        """Test that receipts join the announced broadcast, repeats are duplicates and missing meters are listed."""
+        self.observer.broadcast(GRID_ISSUE)
+        for at, id in ((0.002, 0), (0.004, 1), (0.010, 2), (0.011, 1)):
+            self.receive(at, id, PowerGridIssue(error="storm"))
+        self.clock.now = 1.0
+        self.observer.broadcast(GRID_RESOLVED)
+        for at, id in ((1.001, 0), (1.003, 1)):
+            self.receive(at, id, PowerGridIssueResolved())
+
+        issue, resolved = self.observer.events
+        summary = issue.summary(range(4))
+        self.assertEqual((summary["received"], summary["missed_ids"], summary["duplicates"]), (3, [3], 1))
+        self.assertEqual(summary["spread_ms"], 8.0)
+        self.assertEqual(summary["max_ms"], 10.0)
+        self.assertEqual(issue.error, "storm")
+        self.assertEqual(resolved.summary(range(4))["missed_ids"], [2, 3])
+
+        fleet = summarise_events(self.observer.events, range(4))
+        self.assertEqual((fleet["broadcasts"], fleet["receipts"], fleet["missed_meters"]), (2, 5, 2))
+        self.assertEqual(fleet["spread_max_ms"], 8.0)
+
+    def test_unannounced_broadcasts(self):
+        """Test that broadcasts nobody announced are told apart and timed from their first receipt."""
+        for at, id in ((5.0, 0), (5.002, 1), (9.0, 0), (9.005, 1)):
+            self.receive(at, id, PowerGridIssue(error="storm"))
+        first, second = self.observer.events
+        self.assertEqual(first.summary(range(2))["max_ms"], 2.0)
+        self.assertEqual(second.summary(range(2))["max_ms"], 5.0)
+
+
+class TestGridBenchmark(unittest.IsolatedAsyncioTestCase):
+    async def test_broadcasts_reach_fleet(self):
+        """Test that every meter of a small fleet gets every broadcast from the stand-in server."""
+        result = await run_grid_benchmark(10, 0.05, broadcasts=2, settle=0.2, connect_wait=5)
+        self.assertEqual(result["connected"], 10)
+        self.assertEqual((result["broadcasts"], result["receipts"], result["missed_meters"]), (4, 40, 0))
+        self.assertEqual([event["kind"] for event in result["events"]], [GRID_ISSUE, GRID_RESOLVED] * 2)
+        self.assertGreater(result["readings_per_second"], 0)
+        self.assertLess(result["max_ms"], 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import platform
+import queue
+import socket
+import ssl
+import statistics
+import sys
+import threading
+import time
+import types
+
+import ClientMetrics
+from ClientCodec import CODEC, SAMPLE_BILL, BinaryCodec, PowerGridIssue, PowerGridIssueResolved
+from ClientCore import FrameWriter, InFlightWindow, authenticate, create_ssl_context, pack_frame, receive_frame, \
+    send_reading_to_server
+from ClientStats import LatencyHistogram, load_baselines, machine_key, save_baseline
+from StandInServer import CERT_FILE, KEY_FILE
+
+# Global Vars
+# Stored baselines: one report per machine (see machine_key()), compared against with --compare.
+BASELINE_FILE = "./hotpath-baselines.json"
+# Timing rounds per benchmark (the median round is reported) and how much slower than its baseline a path may
+# get: a relative tolerance plus a few nanoseconds of timer noise.
+HOTPATH_ROUNDS = 7
+HOTPATH_TOLERANCE = 0.20
+HOTPATH_SLACK_NS = 50.0
+# Frames receive_frame() reads before its buffer is rewound.
+FRAMES_BUFFERED = 1000
+# Lines of cProfile / tracemalloc output printed by --profile / --tracemalloc.
+PROFILE_LINES = 25
+
+
+class MemorySocket:
+    # MemorySocket() Class:
+    # In-memory stand-in for a connected socket: recv() reads from 'data' (rewind() starts it over), whatever is
+    # sent is counted and dropped.
+
+    def __init__(self, data=b""):
+        self.data = data
+        self.offset = 0
+        self.sent = 0
+
+    def recv(self, size):
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+    def rewind(self):
+        self.offset = 0
+
+    def send(self, data):
+        self.sent += len(data)
+        return len(data)
+
+    def fileno(self):
+        return 0
+
+    def settimeout(self, timeout):
+        pass
+
+
+# Benchmarks: each is a context manager yielding run(number), which goes through the path 'number' times.
+# Setup and cleanup are outside the timed calls.
+
+@contextlib.contextmanager
+def receive_frame_bench():
+    # A JSON Bill frame read from a socket buffer, header first then the body.
+    sock = MemorySocket(pack_frame(SAMPLE_BILL) * FRAMES_BUFFERED)
+
+    def run(number):
+        for _ in range(number):
+            if sock.offset == len(sock.data):
+                sock.rewind()
+            receive_frame(sock)
+    yield run
+
+
+@contextlib.contextmanager
+def send_reading_bench(codec):
+    # One reading encoded, framed and sent on its own (the GUI client's per reading path).
+    sock = MemorySocket()
+    writer = FrameWriter()
+    reading = {"type": "MeterReading", "reading": 1234.56}
+
+    def run(number):
+        for _ in range(number):
+            send_reading_to_server(sock, reading, 10, writer, codec)
+    yield run
+
+
+def meter_window():
+    # Just enough of a SmartMeterGUI for its message handling, without Tk widgets. Nothing is in flight, so Bills
+    # do not touch a journal.
+    from ClientGUI import SmartMeterGUI, UpdateQueue
+    gui = types.SimpleNamespace(id=0, window=InFlightWindow(), journal=None, latency=LatencyHistogram(),
+                                updates=UpdateQueue())
+    gui.set_status = functools.partial(SmartMeterGUI.set_status, gui)
+    return gui, SmartMeterGUI.handle_server_message
+
+
+@contextlib.contextmanager
+def handle_message_bench(message):
+    # SmartMeterGUI.handle_server_message() of a decoded message, the queued GUI updates drained as by the
+    # render tick.
+    gui, handle = meter_window()
+
+    def run(number):
+        for _ in range(number):
+            handle(gui, message)
+        gui.updates.drain()
+    yield run
+
+
+@contextlib.contextmanager
+def auth_bench(tls):
+    # Full authentication on a new local connection: socketpair, TLS handshake (with 'tls'), auth message and
+    # the server's reply. The server end runs on a thread.
+    server_context = client_context = None
+    if tls:
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(CERT_FILE, KEY_FILE)
+        client_context = create_ssl_context()
+        # The checked in test certificate has expired.
+        client_context.verify_mode = ssl.CERT_NONE
+    connections = queue.SimpleQueue()
+
+    def serve():
+        while (sock := connections.get()) is not None:
+            try:
+                if server_context is not None:
+                    sock = server_context.wrap_socket(sock, server_side=True)
+                receive_frame(sock)
+                FrameWriter().send(sock, b"Authentication successful wire=binary1")
+            except OSError:
+                pass
+            finally:
+                sock.close()
+
+    server = threading.Thread(target=serve, daemon=True)
+    server.start()
+
+    def run(number):
+        for _ in range(number):
+            left, right = socket.socketpair()
+            connections.put(right)
+            sock = left
+            try:
+                if client_context is not None:
+                    sock = client_context.wrap_socket(left, server_hostname="localhost")
+                if not authenticate(sock, 1):
+                    raise RuntimeError("Authentication failed")
+            finally:
+                sock.close()
+    try:
+        yield run
+    finally:
+        connections.put(None)
+        server.join()
+
+
+# name: (benchmark, default number of calls per round)
+BENCHMARKS = {
+    "receive_frame": (receive_frame_bench, 20000),
+    "send_reading_json": (functools.partial(send_reading_bench, CODEC), 20000),
+    "send_reading_binary": (functools.partial(send_reading_bench, BinaryCodec()), 20000),
+    "handle_bill": (functools.partial(handle_message_bench, CODEC.decode(SAMPLE_BILL)), 20000),
+    "handle_grid_issue": (functools.partial(handle_message_bench, PowerGridIssue("storm")), 20000),
+    "handle_grid_resolved": (functools.partial(handle_message_bench, PowerGridIssueResolved()), 20000),
+    "auth_round_trip": (functools.partial(auth_bench, False), 200),
+    "auth_round_trip_tls": (functools.partial(auth_bench, True), 50),
+}
+
+
+@contextlib.contextmanager
+def quiet():
+    # Benchmarks time the paths as they run by default, without any logging.
+    level = ClientMetrics.LOG_LEVEL
+    ClientMetrics.set_log_level("error")
+    try:
+        yield
+    finally:
+        ClientMetrics.set_log_level(level)
+
+
+def time_benchmark(name, number=None, rounds=HOTPATH_ROUNDS):
+    # time_benchmark() Function:
+    # Times benchmark 'name' over 'rounds' rounds of 'number' calls (its default if None) after a short warm-up.
+    # Returns nanoseconds per call of the median and best rounds.
+    benchmark, default = BENCHMARKS[name]
+    number = number or default
+    samples = []
+    with quiet(), benchmark() as run:
+        run(max(1, number // 10))
+        for _ in range(rounds):
+            start = time.perf_counter()
+            run(number)
+            samples.append((time.perf_counter() - start) * 1e9 / number)
+    return {"ns_per_op": round(statistics.median(samples), 1), "best_ns": round(min(samples), 1),
+            "ops_per_second": round(1e9 / statistics.median(samples), 1), "number": number}
+
+
+def build_report(names=None, scale=1.0, rounds=HOTPATH_ROUNDS):
+    # build_report() Function:
+    # JSON report timing the benchmarks 'names' (all of them by default), with 'scale' times their default
+    # number of calls per round.
+    names = names or list(BENCHMARKS)
+    return {
+        "machine": machine_key(),
+        "python": platform.python_version(),
+        "rounds": rounds,
+        "benchmarks": {name: time_benchmark(name, max(1, int(BENCHMARKS[name][1] * scale)), rounds)
+                       for name in names},
+    }
+
+
+def check_report(report, baseline, tolerance=HOTPATH_TOLERANCE, slack_ns=HOTPATH_SLACK_NS):
+    # check_report() Function:
+    # Benchmarks that got slower than their baseline by more than 'tolerance' plus 'slack_ns'. An empty list
+    # means no regression.
+    problems = []
+    for name, result in report["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is not None and result["ns_per_op"] > old["ns_per_op"] * (1 + tolerance) + slack_ns:
+            change = result["ns_per_op"] / old["ns_per_op"] - 1
+            problems.append(f"{name} {old['ns_per_op']} ns -> {result['ns_per_op']} ns ({change:+.1%})")
+    return problems
+
+
+def profile_benchmark(name, number=None, lines=PROFILE_LINES):
+    # profile_benchmark() Function:
+    # cProfile statistics (sorted by cumulative time) of one round of benchmark 'name', as text.
+    # Imported here: only needed when profiling.
+    import cProfile
+    import pstats
+
+    benchmark, default = BENCHMARKS[name]
+    profiler = cProfile.Profile()
+    with quiet(), benchmark() as run:
+        profiler.runcall(run, number or default)
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(lines)
+    return output.getvalue()
+
+
+def trace_allocations(name, number=None, lines=PROFILE_LINES):
+    # trace_allocations() Function:
+    # Memory allocated by one round of benchmark 'name': ({bytes left allocated and peak bytes, per call},
+    # the lines allocating the most, as text).
+    # Imported here: only needed when tracing allocations.
+    import tracemalloc
+
+    benchmark, default = BENCHMARKS[name]
+    number = number or default
+    with quiet(), benchmark() as run:
+        run(1)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        run(number)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    top = after.compare_to(before, "lineno")[:lines]
+    return ({"bytes_per_op": round(current / number, 2), "peak_bytes_per_op": round(peak / number, 2)},
+            "\n".join(str(stat) for stat in top))
+
+
+def format_report(report, baseline=None):
+    # format_report() Function:
+    # One line per benchmark, with the change from 'baseline' if given.
+    lines = [f"{'benchmark':22} {'ns/op':>12} {'best ns':>12} {'ops/s':>14} {'baseline':>12}"]
+    for name, result in report["benchmarks"].items():
+        old = (baseline or {}).get("benchmarks", {}).get(name)
+        change = f"{result['ns_per_op'] / old['ns_per_op'] - 1:+.1%}" if old else ""
+        lines.append(f"{name:22} {result['ns_per_op']:>12,.1f} {result['best_ns']:>12,.1f} "
+                     f"{result['ops_per_second']:>14,.1f} {change:>12}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the client's per reading hot paths and check them against "
+                                                 "a stored baseline.")
+    parser.add_argument("--benchmark", action="append", choices=list(BENCHMARKS),
+                        help="benchmark to run (default: all)")
+    parser.add_argument("--rounds", type=int, default=HOTPATH_ROUNDS)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every benchmark's calls per round")
+    parser.add_argument("--baselines", default=BASELINE_FILE, help="stored baselines file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as this machine's baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit non-zero if a path got slower than this machine's baseline")
+    parser.add_argument("--tolerance", type=float, default=HOTPATH_TOLERANCE,
+                        help="allowed relative slow-down over the baseline")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--profile", choices=list(BENCHMARKS), help="print cProfile statistics of one benchmark")
+    parser.add_argument("--tracemalloc", choices=list(BENCHMARKS), help="print allocations of one benchmark")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print(profile_benchmark(args.profile))
+        return 0
+    if args.tracemalloc:
+        per_op, top = trace_allocations(args.tracemalloc)
+        print(per_op)
+        print(top)
+        return 0
+
+    report = build_report(args.benchmark, args.scale, args.rounds)
+    baseline = load_baselines(args.baselines).get(report["machine"])
+    print(format_report(report, baseline))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        save_baseline(report, args.baselines)
+        print(f"Baseline for '{report['machine']}' saved to {args.baselines}")
+    if not args.compare:
+        return 0
+    if baseline is None:
+        print(f"No baseline for '{report['machine']}' in {args.baselines}, run with --save-baseline first",
+              file=sys.stderr)
+        return 1
+    problems = check_report(report, baseline, args.tolerance)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
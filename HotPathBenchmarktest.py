@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from HotPathBenchmark import (
+    BENCHMARKS,
+    build_report,
+    check_report,
+    load_baselines,
+    profile_benchmark,
+    save_baseline,
+    time_benchmark,
+    trace_allocations,
+)
+
+
+class TestHotPathBenchmark(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        """Test that each hot path benchmark runs, including the plain and TLS auth round trips."""
+        for name in BENCHMARKS:
+            with self.subTest(name):
+                result = time_benchmark(name, number=5, rounds=1)
+                self.assertGreater(result["ns_per_op"], 0)
+                self.assertEqual(result["number"], 5)
+
+    def test_regressions_against_baseline(self):
+        """Test that only paths slower than the baseline by more than the tolerance are reported."""
+        baseline = {"benchmarks": {"receive_frame": {"ns_per_op": 1000.0}, "handle_bill": {"ns_per_op": 1000.0}}}
+        report = {"benchmarks": {"receive_frame": {"ns_per_op": 1100.0}, "handle_bill": {"ns_per_op": 1500.0},
+                                 "auth_round_trip": {"ns_per_op": 99999.0}}}
+        problems = check_report(report, baseline, tolerance=0.2, slack_ns=0)
+        self.assertEqual(len(problems), 1)
+        self.assertIn("handle_bill", problems[0])
+        self.assertEqual(check_report(report, baseline, tolerance=0.6, slack_ns=0), [])
+
+    def test_baselines_are_kept_per_machine(self):
+        """Test that saving a baseline keeps those stored for other machines."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baselines.json")
+            save_baseline({"machine": "other", "benchmarks": {}}, path)
+            report = build_report(["handle_grid_resolved"], scale=0.001, rounds=1)
+            save_baseline(report, path)
+            baselines = load_baselines(path)
+            self.assertEqual(set(baselines), {"other", report["machine"]})
+            self.assertEqual(check_report(report, baselines[report["machine"]]), [])
+
+    def test_profile_and_allocations(self):
+        """Test that a single benchmark can be run under cProfile and tracemalloc."""
+        self.assertIn("send_reading_to_server", profile_benchmark("send_reading_binary", number=10))
+        per_op, top = trace_allocations("handle_bill", number=10)
+        self.assertGreaterEqual(per_op["peak_bytes_per_op"], per_op["bytes_per_op"])
+        self.assertIsInstance(top, str)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import argparse
+import time
+
+import numpy as np
+
+# Global Vars
+# Default load shape. Hourly weights of household demand (00:00 .. 23:00), relative to the daily mean: low
+# overnight, a morning peak and a larger evening peak.
+DAILY_CURVE = np.array([
+    0.45, 0.40, 0.37, 0.36, 0.37, 0.45, 0.75, 1.15, 1.25, 1.00, 0.90, 0.90,
+    0.95, 0.90, 0.85, 0.90, 1.10, 1.55, 1.85, 1.80, 1.60, 1.35, 1.00, 0.65,
+])
+DAILY_CURVE = DAILY_CURVE / DAILY_CURVE.mean()
+# Mean household demand (kW) and the spread of per-meter demand. Meter scales are lognormal, which gives the
+# heavy tail of high users (sigma 0.8: the top 10% of meters use roughly a third of the energy).
+MEAN_DEMAND_KW = 0.45
+DEMAND_SIGMA = 0.8
+# Shape of the reading-to-reading noise (gamma, mean 1). Larger is smoother.
+NOISE_SHAPE = 4.0
+
+
+class LoadSchedule:
+    # LoadSchedule() Class:
+    # Precomputed readings for a whole fleet: arrival[m, n] is when meter m sends its reading n (seconds from
+    # the start of the run) and increments[m, n] the kWh used since its previous reading. Meters look readings
+    # up by index, reading() wraps around (shifted by 'span') when a meter runs past the end.
+
+    def __init__(self, arrival, increments, span, scale, seed):
+        self.arrival = arrival
+        self.increments = increments
+        self.span = span
+        self.scale = scale
+        self.seed = seed
+
+    @property
+    def meters(self):
+        return self.arrival.shape[0]
+
+    @property
+    def readings(self):
+        return self.arrival.shape[1]
+
+    def reading(self, meter, n):
+        # reading() Method:
+        # Returns (arrival time, kWh increment) of reading 'n' of meter index 'meter'.
+        cycle, index = divmod(n, self.readings)
+        return (float(self.arrival[meter, index] + cycle * self.span[meter]),
+                float(self.increments[meter, index]))
+
+    def total_kwh(self):
+        # total_kwh() Method:
+        # kWh per meter over one pass of the schedule.
+        return self.increments.sum(axis=1)
+
+
+def generate_schedule(meters, readings, seed=0, min_interval=15, max_interval=60, start_hour=0.0,
+                      mean_demand_kw=MEAN_DEMAND_KW, demand_sigma=DEMAND_SIGMA, daily_curve=DAILY_CURVE,
+                      noise_shape=NOISE_SHAPE):
+    # generate_schedule() Function:
+    # Builds a LoadSchedule for 'meters' meters with 'readings' readings each, reproducible from 'seed'.
+    # Reading intervals are uniform between min_interval and max_interval (as in the GUI client), each meter
+    # starts at a random phase in its first interval, and each increment is the meter's demand at the middle of
+    # the interval (per-meter scale x daily curve at that time of day x noise) times the interval length.
+    rng = np.random.default_rng(seed)
+
+    intervals = rng.uniform(min_interval, max_interval, size=(meters, readings))
+    phase = rng.uniform(0, max_interval, size=(meters, 1))
+    ends = np.cumsum(intervals, axis=1)
+    # Reading n is sent once the first n intervals have passed.
+    arrival = phase + ends - intervals
+    span = ends[:, -1]
+
+    # Lognormal with mean 1, so the fleet mean stays at mean_demand_kw whatever the spread.
+    scale = rng.lognormal(-demand_sigma ** 2 / 2, demand_sigma, size=meters)
+    midpoint_hours = (start_hour + (arrival - intervals / 2) / 3600) % 24
+    curve = np.interp(midpoint_hours, np.arange(25), np.append(daily_curve, daily_curve[0]))
+    noise = rng.gamma(noise_shape, 1 / noise_shape, size=(meters, readings))
+
+    demand_kw = mean_demand_kw * scale[:, None] * curve * noise
+    increments = demand_kw * intervals / 3600
+    return LoadSchedule(arrival, increments, span, scale, seed)
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the schedule generator benchmark.
+    parser = argparse.ArgumentParser(description="Time generation of a seeded fleet load schedule.")
+    parser.add_argument("--meters", type=int, default=10000)
+    parser.add_argument("--readings", type=int, default=100, help="readings per meter")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        schedule = generate_schedule(args.meters, args.readings, args.seed)
+        best = min(best, time.perf_counter() - start)
+
+    total = schedule.total_kwh()
+    top = np.sort(total)[-max(1, args.meters // 10):].sum() / total.sum()
+    print(f"{args.meters * args.readings} readings for {args.meters} meters in {best * 1000:.1f} ms "
+          f"(best of {args.repeat})")
+    print(f"fleet kWh {total.sum():.1f}, top 10% of meters use {top:.0%}")
+
+
+if __name__ == "__main__":
+    main()
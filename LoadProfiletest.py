@@ -0,0 +1,50 @@
+import time
+import unittest
+
+import numpy as np
+
+from LoadProfile import generate_schedule
+
+
+class TestLoadProfile(unittest.TestCase):
+    def test_same_seed_same_schedule(self):
+        """Test that a seed reproduces the schedule exactly and a different seed does not."""
+        first = generate_schedule(50, 20, seed=7)
+        second = generate_schedule(50, 20, seed=7)
+        other = generate_schedule(50, 20, seed=8)
+        np.testing.assert_array_equal(first.arrival, second.arrival)
+        np.testing.assert_array_equal(first.increments, second.increments)
+        self.assertFalse(np.array_equal(first.increments, other.increments))
+
+    def test_intervals_and_wraparound(self):
+        """Test that readings are spaced by the configured intervals and repeat after the last one."""
+        schedule = generate_schedule(20, 10, seed=1, min_interval=15, max_interval=60)
+        gaps = np.diff(schedule.arrival, axis=1)
+        self.assertTrue(((gaps >= 15) & (gaps <= 60)).all())
+        self.assertTrue((schedule.arrival[:, 0] < 60).all())
+        due, increment = schedule.reading(3, 12)
+        self.assertAlmostEqual(due, schedule.arrival[3, 2] + schedule.span[3])
+        self.assertEqual(increment, schedule.increments[3, 2])
+
+    def test_daily_peak_and_heavy_tail(self):
+        """Test that evening demand exceeds overnight demand and a minority of meters dominates usage."""
+        schedule = generate_schedule(1000, 3000, seed=3, min_interval=30, max_interval=30)
+        hours = (schedule.arrival / 3600) % 24
+        rate = schedule.increments / 30
+        evening = rate[(hours >= 17) & (hours < 20)].mean()
+        night = rate[(hours >= 1) & (hours < 4)].mean()
+        self.assertGreater(evening, 3 * night)
+
+        total = np.sort(schedule.total_kwh())
+        self.assertGreater(total[-100:].sum() / total.sum(), 0.25)
+
+    def test_million_readings_is_fast(self):
+        """Test that a million-reading schedule is generated in well under a second."""
+        start = time.perf_counter()
+        schedule = generate_schedule(10000, 100, seed=0)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(schedule.increments.shape, (10000, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,276 @@
+import argparse
+import array
+import gc
+import math
+import time
+import tracemalloc
+
+# Global Vars
+# Connection states stored per meter, and the text shown for each. A status text with more detail (e.g.
+# 'Power Grid Issue: <error>') keeps the state of its prefix and refers to the full text, stored once in the
+# MeterState's text table and shared by every meter showing it.
+NOT_CONNECTED = 0
+CONNECTED = 1
+GRID_ISSUE = 2
+DISCONNECTED = 3
+CONNECTION_FAILED = 4
+AUTH_FAILED = 5
+ERROR = 6
+STATUS_LABELS = ("Not Connected", "Connected", "Power Grid Issue", "Disconnected", "Connection Failed",
+                 "Authentication Failed", "Error")
+STATUS_CODES = {label: code for code, label in enumerate(STATUS_LABELS)}
+# Columns of a MeterState: (name, array typecode). Floats are 'd', texts (billing period, status detail) indexes
+# into the text table (0 = none), timestamps time.monotonic() seconds (0 = never).
+COLUMNS = (
+    ("id", "q"),
+    ("cumulative_reading", "d"),
+    ("total_bill", "d"),
+    ("standing_charge", "d"),
+    ("price_per_unit", "d"),
+    ("units_used", "d"),
+    ("billing_period", "I"),
+    ("status", "B"),
+    ("detail", "I"),
+    ("readings_taken", "I"),
+    ("last_received", "d"),
+    ("last_reading", "d"),
+    ("last_bill", "d"),
+)
+# Fleet sizes reported by the memory benchmark.
+BENCHMARK_SIZES = (10_000, 100_000, 1_000_000)
+
+# numpy, imported by numpy_module() the first time an aggregate needs it (None: not looked for yet, False: not
+# installed). Importing it up front would double the startup time of the headless fleet.
+_numpy = None
+
+
+def numpy_module():
+    # numpy_module() Function:
+    # numpy if it is installed, else None.
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+class MeterState:
+    # MeterState() Class:
+    # Struct of arrays holding the state of every meter in a fleet: one packed array.array column per field
+    # (see COLUMNS), one row per meter, under 100 bytes per meter instead of an object with a dict of attributes.
+    # Fleet wide totals are reductions over whole columns, done by numpy on zero-copy views of the arrays when it
+    # is installed.
+
+    def __init__(self, ids):
+        self.id = array.array("q", ids)
+        self.size = len(self.id)
+        for name, typecode in COLUMNS[1:]:
+            setattr(self, name, array.array(typecode, bytes(array.array(typecode).itemsize * self.size)))
+        # Texts referenced by the 'billing_period' and 'detail' columns. Every meter in a fleet usually shows the
+        # same few, so each is stored once.
+        self.texts = [None]
+        self.text_index = {}
+
+    def row_of(self, id):
+        # row_of() Method:
+        # Row of meter 'id'. Raises KeyError if it isn't in this store.
+        if self.size and self.id[-1] - self.id[0] == self.size - 1 and self.id[0] <= id <= self.id[-1]:
+            # The usual contiguous range of ids.
+            return id - self.id[0]
+        try:
+            return self.id.index(id)
+        except ValueError:
+            raise KeyError(id) from None
+
+    def add_bill(self, row, bill, now=None):
+        # add_bill() Method:
+        # Stores a Bill record (see ClientCodec) as the latest bill of the meter in 'row'.
+        self.total_bill[row] = bill.total
+        self.standing_charge[row] = bill.standing_charge
+        self.price_per_unit[row] = bill.price_per_unit
+        self.units_used[row] = bill.units_used
+        self.billing_period[row] = self.intern(bill.billing_period)
+        self.last_bill[row] = time.monotonic() if now is None else now
+
+    def intern(self, text):
+        # intern() Method:
+        # Index of 'text' in the text table, adding it if it's new.
+        index = self.text_index.get(text)
+        if index is None:
+            index = self.text_index[text] = len(self.texts)
+            self.texts.append(text)
+        return index
+
+    def billing_period_text(self, row):
+        # billing_period_text() Method:
+        # Billing period of the latest bill, as Bill.billing_period ("" before the first bill).
+        return self.texts[self.billing_period[row]] or ""
+
+    def set_status(self, row, text):
+        # set_status() Method:
+        # Stores a status text such as 'Connected' or 'Power Grid Issue: <error>' (unknown texts count as ERROR).
+        code = STATUS_CODES.get(text.split(":", 1)[0], ERROR)
+        self.status[row] = code
+        self.detail[row] = self.intern(text) if text != STATUS_LABELS[code] else 0
+
+    def status_text(self, row):
+        # status_text() Method:
+        # Status text of the meter in 'row', as stored by set_status().
+        detail = self.detail[row]
+        return self.texts[detail] if detail else STATUS_LABELS[self.status[row]]
+
+    def _sum(self, column):
+        np = numpy_module()
+        if np is not None:
+            return float(np.frombuffer(column, dtype=column.typecode).sum())
+        return math.fsum(column)
+
+    def _count(self, column, *values):
+        np = numpy_module()
+        if np is not None:
+            view = np.frombuffer(column, dtype=column.typecode)
+            return sum(int(np.count_nonzero(view == value)) for value in values)
+        return sum(column.count(value) for value in values)
+
+    def total_kwh(self):
+        # total_kwh() Method:
+        # kWh read by the whole fleet (sum of the cumulative readings).
+        return self._sum(self.cumulative_reading)
+
+    def total_billed(self):
+        # total_billed() Method:
+        # Sum of every meter's latest bill total.
+        return self._sum(self.total_bill)
+
+    def grid_alerts(self):
+        # grid_alerts() Method:
+        # Number of meters currently showing a power grid issue.
+        return self._count(self.status, GRID_ISSUE)
+
+    def connected(self):
+        # connected() Method:
+        # Number of meters currently connected (with or without a grid issue).
+        return self._count(self.status, CONNECTED, GRID_ISSUE)
+
+    def summary(self):
+        # summary() Method:
+        # Fleet wide totals.
+        return {
+            "meters": self.size,
+            "connected": self.connected(),
+            "grid_alerts": self.grid_alerts(),
+            "kwh_read": round(self.total_kwh(), 3),
+            "total_billed": round(self.total_billed(), 2),
+        }
+
+    def nbytes(self):
+        # nbytes() Method:
+        # Bytes used by the columns.
+        return sum(len(column) * column.itemsize for column in (getattr(self, name) for name, _ in COLUMNS))
+
+
+class StateColumn:
+    # StateColumn() Class:
+    # Attribute stored in a MeterState column, for classes whose instances have 'state' (a MeterState) and 'row'
+    # attributes, e.g. FleetMeter.cumulative_reading = StateColumn().
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, meter, owner=None):
+        if meter is None:
+            return self
+        return getattr(meter.state, self.name)[meter.row]
+
+    def __set__(self, meter, value):
+        getattr(meter.state, self.name)[meter.row] = value
+
+
+def fleet_states(meters):
+    # fleet_states() Function:
+    # The distinct MeterStates the given meters are stored in (one per fleet, see ClientFleet.run_fleet).
+    return list({id(meter.state): meter.state for meter in meters}.values())
+
+
+class MeterAttributes:
+    # MeterAttributes() Class:
+    # Per meter state as attributes of one object per meter (the layout MeterState replaces), for the benchmark.
+
+    def __init__(self, id):
+        self.id = id
+        self.cumulative_reading = 0.0
+        self.total_bill = 0.0
+        self.standing_charge = 0.0
+        self.price_per_unit = 0.0
+        self.units_used = 0.0
+        self.billing_period = ""
+        self.status = "Not Connected"
+        self.readings_taken = 0
+        self.last_received = 0.0
+        self.last_reading = 0.0
+        self.last_bill = 0.0
+
+
+def measure(build):
+    # measure() Function:
+    # (result of build(), bytes allocated while building it).
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def build_objects(count):
+    # build_objects() Function:
+    # One MeterAttributes per meter, each with its own reading and bill as in a running fleet.
+    meters = [MeterAttributes(id) for id in range(count)]
+    for meter in meters:
+        meter.cumulative_reading = meter.id * 0.37
+        meter.total_bill = meter.id * 0.074
+    return meters
+
+
+def build_state(count):
+    # build_state() Function:
+    # MeterState with the same readings and bills as build_objects().
+    state = MeterState(range(count))
+    for row in range(count):
+        state.cumulative_reading[row] = row * 0.37
+        state.total_bill[row] = row * 0.074
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory per meter and fleet aggregate times of MeterState "
+                                                 "against one object per meter.")
+    parser.add_argument("--meters", type=int, nargs="+", default=BENCHMARK_SIZES)
+    args = parser.parse_args(argv)
+
+    numpy_module()
+    print(f"{'meters':>10} {'state B/meter':>14} {'objects B/meter':>16} {'state sum ms':>13} "
+          f"{'objects sum ms':>15}")
+    for count in args.meters:
+        state, state_bytes = measure(lambda: build_state(count))
+        objects, object_bytes = measure(lambda: build_objects(count))
+
+        # Timed on the second call, the first one also loads numpy's reduction code.
+        state.summary()
+        start = time.perf_counter()
+        state.total_kwh(), state.total_billed(), state.grid_alerts()
+        state_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        (sum(meter.cumulative_reading for meter in objects), sum(meter.total_bill for meter in objects),
+         sum(meter.status.startswith("Power Grid Issue") for meter in objects))
+        objects_ms = (time.perf_counter() - start) * 1000
+        print(f"{count:>10,} {state_bytes / count:>14.1f} {object_bytes / count:>16.1f} {state_ms:>13.2f} "
+              f"{objects_ms:>15.2f}")
+        del state, objects
+
+
+if __name__ == "__main__":
+    main()
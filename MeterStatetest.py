@@ -0,0 +1,79 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import MeterState as meter_state
+from ClientCodec import Bill
+from ClientFleet import FleetCounters, FleetMeter, run_fleet
+from MeterState import CONNECTED, GRID_ISSUE, MeterState, fleet_states
+
+
+class TestMeterState(unittest.TestCase):
+    def setUp(self):
+        self.state = MeterState(range(100, 110))
+        for row in range(10):
+            self.state.cumulative_reading[row] = row * 1.5
+            self.state.add_bill(row, Bill(total=row * 0.3, units_start=0.0, units_end=row * 1.5,
+                                          billing_start="2024-11-01", billing_end="2024-12-01"))
+            self.state.set_status(row, "Connected")
+        self.state.set_status(2, "Power Grid Issue: outage")
+        self.state.set_status(3, "Power Grid Issue: outage")
+        self.state.set_status(4, "Disconnected: reset")
+
+    def test_status_texts(self):
+        """Test that status texts map to states and detailed texts are stored once."""
+        self.assertEqual(self.state.status_text(2), "Power Grid Issue: outage")
+        self.assertEqual(self.state.status_text(5), "Connected")
+        self.assertEqual(self.state.status[2], GRID_ISSUE)
+        self.assertEqual(self.state.status[5], CONNECTED)
+        self.assertEqual(self.state.detail[2], self.state.detail[3])
+        self.assertEqual(self.state.texts.count("Power Grid Issue: outage"), 1)
+        self.state.set_status(9, "Something odd")
+        self.assertEqual(self.state.status_text(9), "Something odd")
+
+    def test_bill_fields(self):
+        """Test that a Bill's fields land in the meter's row."""
+        self.assertAlmostEqual(self.state.total_bill[4], 1.2)
+        self.assertAlmostEqual(self.state.units_used[4], 6.0)
+        self.assertEqual(self.state.billing_period_text(4), "2024-11-01 - 2024-12-01")
+        self.assertEqual(MeterState([1]).billing_period_text(0), "")
+
+    def test_aggregates(self):
+        """Test the fleet totals with numpy and with the stdlib fallback."""
+        expected = {"meters": 10, "connected": 9, "grid_alerts": 2, "kwh_read": 67.5, "total_billed": 13.5}
+        self.assertEqual(self.state.summary(), expected)
+        with patch.object(meter_state, "_numpy", False):
+            self.assertEqual(self.state.summary(), expected)
+
+    def test_row_of(self):
+        """Test finding a meter's row by id."""
+        self.assertEqual(self.state.row_of(104), 4)
+        self.assertEqual(MeterState([7, 3, 9]).row_of(9), 2)
+        with self.assertRaises(KeyError):
+            self.state.row_of(200)
+
+    def test_memory_per_meter(self):
+        """Test that a meter's columns take under 100 bytes."""
+        self.assertLess(MeterState(range(1000)).nbytes() / 1000, 100)
+
+
+class TestFleetState(unittest.TestCase):
+    def test_meters_share_fleet_state(self):
+        """Test that FleetMeter attributes are rows of the fleet's MeterState."""
+        state = MeterState(range(3))
+        meters = [FleetMeter(id, FleetCounters(), None, state=state, row=id) for id in range(3)]
+        meters[1].cumulative_reading += 2.5
+        meters[1].status = "Power Grid Issue: storm"
+        self.assertEqual(state.cumulative_reading[1], 2.5)
+        self.assertEqual(state.grid_alerts(), 1)
+        self.assertEqual(fleet_states(meters), [state])
+        self.assertEqual(meters[0].status, "Not Connected")
+
+    def test_state_must_match_fleet(self):
+        """Test that run_fleet rejects a MeterState sized for another fleet."""
+        with self.assertRaises(ValueError):
+            asyncio.run(run_fleet(range(3), 0, duration=0, report_interval=0, tls=False, state=MeterState(range(2))))
+
+
+if __name__ == "__main__":
+    unittest.main()
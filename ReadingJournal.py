@@ -0,0 +1,243 @@
+import argparse
+import collections
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+
+# Global Vars
+# Directory holding one journal file per meter.
+JOURNAL_DIR = "./journal"
+# Journal records: kind, sequence number, reading. A READING record is written before the reading is sent, a
+# DONE record marks every reading up to its sequence number as finished with (billed, or dropped to keep the
+# journal bounded). The server bills readings in order, so one DONE per Bill is enough.
+RECORD = struct.Struct('>BQd')
+READING = 1
+DONE = 2
+# Most unbilled readings kept (about 3.5 days of readings at the slowest pace). Beyond this the oldest are
+# dropped: readings are cumulative, so the kWh is still counted by the next one.
+MAX_PENDING = 5000
+# The file is rewritten with only the unbilled readings once it reaches COMPACT_BYTES and at least half of it is
+# finished records, so it stays under max(COMPACT_BYTES, 2 * MAX_PENDING * RECORD.size) bytes.
+COMPACT_BYTES = 256 * 1024
+
+
+def journal_path(id, directory=JOURNAL_DIR):
+    # journal_path() Function:
+    # Journal file of meter 'id'.
+    return os.path.join(directory, f"meter-{id}.journal")
+
+
+class ReadingJournal:
+    # ReadingJournal() Class:
+    # Append only on-disk journal of one meter's readings (store and forward). Readings are appended before they
+    # are sent and stay pending until the Bill answering them arrives (ack()), so readings that could not be sent,
+    # or were lost with the connection, are replayed after a reconnect or a restart. Thread safe: readings are
+    # appended by the reading thread and acknowledged by the listener thread. 'sync' fsyncs every record, by
+    # default records are flushed to the OS (they survive the process, not a power cut).
+
+    def __init__(self, path, max_pending=MAX_PENDING, compact_bytes=COMPACT_BYTES, sync=False):
+        self.path = path
+        self.max_pending = max_pending
+        self.compact_bytes = compact_bytes
+        self.sync = sync
+        self.lock = threading.Lock()
+        # (sequence number, reading) of the readings not billed yet, oldest first.
+        self.pending = collections.deque()
+        self.next_seq = 1
+        self.last_reading = 0.0
+        self.stats = collections.Counter()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.size = self._load()
+        self.file = open(path, "ab")
+
+    def _load(self):
+        # Rebuilds the pending readings from an existing journal, dropping a record cut short by a crash.
+        # Returns the size of the valid part of the file.
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        done = 0
+        size = len(data) - len(data) % RECORD.size
+        for kind, seq, reading in RECORD.iter_unpack(memoryview(data)[:size]):
+            if kind == READING:
+                self.pending.append((seq, reading))
+                self.last_reading = reading
+            elif kind == DONE:
+                done = max(done, seq)
+            self.next_seq = max(self.next_seq, seq + 1)
+        while self.pending and self.pending[0][0] <= done:
+            self.pending.popleft()
+        if size != len(data):
+            os.truncate(self.path, size)
+        self.stats["recovered"] = len(self.pending)
+        return size
+
+    def _write(self, kind, seq, reading=0.0):
+        self.file.write(RECORD.pack(kind, seq, reading))
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        self.size += RECORD.size
+
+    def append(self, reading):
+        # append() Method:
+        # Journals a reading before it is sent. Returns its sequence number.
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self._write(READING, seq, reading)
+            self.pending.append((seq, reading))
+            self.last_reading = reading
+            self.stats["written"] += 1
+            if len(self.pending) > self.max_pending:
+                dropped, _ = self.pending.popleft()
+                self._write(DONE, dropped)
+                self.stats["dropped"] += 1
+            self._maybe_compact()
+            return seq
+
+    def ack(self, seq=None):
+        # ack() Method:
+        # Marks the reading with sequence number 'seq' as billed, along with any older ones that were never sent
+        # (dropped or coalesced, the billed reading includes them), or the oldest pending reading if 'seq' is None.
+        # Returns the sequence number, None if nothing was pending.
+        with self.lock:
+            if not self.pending:
+                return None
+            if seq is None:
+                seq = self.pending[0][0]
+            while self.pending and self.pending[0][0] <= seq:
+                self.pending.popleft()
+                self.stats["acked"] += 1
+            self._write(DONE, seq)
+            self._maybe_compact()
+            return seq
+
+    def backlog(self):
+        # backlog() Method:
+        # Readings not billed yet, oldest first (to replay after a reconnect).
+        with self.lock:
+            return [reading for _, reading in self.pending]
+
+    def items(self):
+        # items() Method:
+        # (sequence number, reading) of the readings not billed yet, oldest first.
+        with self.lock:
+            return list(self.pending)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def _maybe_compact(self):
+        if self.size >= self.compact_bytes and self.size >= 2 * len(self.pending) * RECORD.size:
+            self._compact()
+
+    def compact(self):
+        # compact() Method:
+        # Rewrites the journal with only the pending readings (or, with none pending, the last reading marked
+        # finished, so last_reading and the sequence numbers carry on after a restart).
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        # Written to a temporary file and renamed over the journal, so a crash leaves the old or the new one.
+        temp = self.path + ".tmp"
+        records = [RECORD.pack(READING, seq, reading) for seq, reading in self.pending]
+        if not records and self.next_seq > 1:
+            records = [RECORD.pack(READING, self.next_seq - 1, self.last_reading),
+                       RECORD.pack(DONE, self.next_seq - 1, 0.0)]
+        with open(temp, "wb") as file:
+            file.write(b"".join(records))
+            file.flush()
+            os.fsync(file.fileno())
+        self.file.close()
+        os.replace(temp, self.path)
+        self.file = open(self.path, "ab")
+        self.size = len(records) * RECORD.size
+        self.stats["compactions"] += 1
+
+    def record_replay(self, count, seconds):
+        # record_replay() Method:
+        # Counts a replay of 'count' readings that took 'seconds'.
+        self.stats["replays"] += 1
+        self.stats["replayed"] += count
+        self.stats["replay_us"] += int(seconds * 1_000_000)
+
+    def summary(self):
+        # summary() Method:
+        # Journal counters, plus the replay throughput in readings per second.
+        summary = dict(self.stats, pending=len(self.pending), bytes=self.size)
+        replay_us = summary.pop("replay_us", 0)
+        summary["replay_per_second"] = round(summary["replayed"] * 1_000_000 / replay_us, 1) if replay_us else 0.0
+        return summary
+
+    def close(self):
+        # close() Method:
+        # Closes the journal file.
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    # Imported here: ClientCore doesn't need to be loaded by code that only uses the journal.
+    from ClientCore import FrameReader, replay_journal
+    from ClientCodec import CODEC
+
+    parser = argparse.ArgumentParser(description="Journal append / ack and replay throughput.")
+    parser.add_argument("--readings", type=int, default=MAX_PENDING, help="backlog size to replay")
+    parser.add_argument("--sync", action="store_true", help="fsync every record")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = ReadingJournal(journal_path(0, directory), max_pending=args.readings, sync=args.sync)
+        start = time.perf_counter()
+        for n in range(args.readings):
+            journal.append(n * 0.37)
+        append_rate = args.readings / (time.perf_counter() - start)
+
+        # Replay the backlog over a local socket, with the other end read (not billed) by a thread.
+        left, right = socket.socketpair()
+        received = collections.Counter()
+
+        def drain():
+            frames = FrameReader()
+            while received["frames"] < args.readings and frames.read_from(right):
+                received["frames"] += sum(1 for _ in frames.frames())
+
+        reader = threading.Thread(target=drain)
+        reader.start()
+        count, seconds = replay_journal(left, journal, codec=CODEC)
+        reader.join()
+        left.close()
+        right.close()
+
+        start = time.perf_counter()
+        for _ in range(args.readings):
+            journal.ack()
+        ack_rate = args.readings / (time.perf_counter() - start)
+        journal.close()
+
+        start = time.perf_counter()
+        ReadingJournal(journal_path(0, directory)).close()
+        reopen_ms = (time.perf_counter() - start) * 1000
+
+    print(f"append {append_rate:,.0f}/s   ack {ack_rate:,.0f}/s   replay {count / seconds:,.0f} readings/s "
+          f"({count} in {seconds * 1000:.1f} ms)   reopen {reopen_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import socket
+import tempfile
+import unittest
+
+from ClientCodec import BinaryCodec
+from ClientCore import FrameReader, FrameWriter, InFlightWindow, replay_journal
+from ReadingJournal import RECORD, ReadingJournal, journal_path
+
+
+class TestReadingJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = journal_path(7, self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unbilled_readings_survive_restart(self):
+        """Test that readings not acknowledged by a Bill are still pending after reopening the journal."""
+        journal = ReadingJournal(self.path)
+        for reading in (1.0, 2.5, 4.0):
+            journal.append(reading)
+        journal.ack()
+        journal.close()
+
+        journal = ReadingJournal(self.path)
+        self.assertEqual(journal.backlog(), [2.5, 4.0])
+        self.assertEqual(journal.last_reading, 4.0)
+        self.assertEqual(journal.append(5.0), 4)
+        journal.close()
+
+    def test_torn_record_is_dropped(self):
+        """Test that a record cut short by a crash is ignored and trimmed from the file."""
+        journal = ReadingJournal(self.path)
+        journal.append(1.0)
+        journal.close()
+        with open(self.path, "ab") as file:
+            file.write(RECORD.pack(1, 2, 2.0)[:5])
+
+        journal = ReadingJournal(self.path)
+        self.assertEqual(journal.backlog(), [1.0])
+        self.assertEqual(os.path.getsize(self.path), RECORD.size)
+        journal.close()
+
+    def test_pending_readings_are_bounded(self):
+        """Test that only the newest max_pending readings are kept, also after a restart."""
+        journal = ReadingJournal(self.path, max_pending=3)
+        for reading in range(10):
+            journal.append(float(reading))
+        self.assertEqual(journal.backlog(), [7.0, 8.0, 9.0])
+        self.assertEqual(journal.stats["dropped"], 7)
+        journal.close()
+        with ReadingJournal(self.path) as journal:
+            self.assertEqual(journal.backlog(), [7.0, 8.0, 9.0])
+
+    def test_ack_covers_older_readings(self):
+        """Test that acknowledging a reading also finishes the older ones that were never sent."""
+        with ReadingJournal(self.path) as journal:
+            seqs = [journal.append(reading) for reading in (1.0, 2.0, 3.0, 4.0)]
+            self.assertEqual(journal.ack(seqs[2]), seqs[2])
+            self.assertEqual(journal.backlog(), [4.0])
+        with ReadingJournal(self.path) as journal:
+            self.assertEqual(journal.backlog(), [4.0])
+
+    def test_compaction_bounds_disk_usage(self):
+        """Test that billed readings are compacted away once the file reaches compact_bytes."""
+        journal = ReadingJournal(self.path, compact_bytes=1000)
+        for reading in range(500):
+            journal.append(float(reading))
+            if reading % 10:
+                journal.ack()
+        self.assertGreater(journal.stats["compactions"], 0)
+        pending = journal.backlog()
+        journal.close()
+        self.assertEqual(len(pending), 50)
+        self.assertLessEqual(os.path.getsize(self.path), max(1000, 2 * len(pending) * RECORD.size) + RECORD.size)
+        with ReadingJournal(self.path) as journal:
+            self.assertEqual(journal.backlog(), pending)
+
+    def test_last_reading_survives_full_compaction(self):
+        """Test that the last reading and sequence number are kept when compaction finds nothing pending."""
+        journal = ReadingJournal(self.path, compact_bytes=170)
+        for reading in range(1, 11):
+            journal.ack(journal.append(reading * 1.5))
+        self.assertGreater(journal.stats["compactions"], 0)
+        journal.close()
+        self.assertGreater(os.path.getsize(self.path), 0)
+
+        with ReadingJournal(self.path) as journal:
+            self.assertEqual(journal.backlog(), [])
+            self.assertEqual(journal.last_reading, 15.0)
+            self.assertEqual(journal.append(16.5), 11)
+
+    def test_replay(self):
+        """Test that the backlog is resent in order and the replay is counted."""
+        journal = ReadingJournal(self.path)
+        for reading in (1.5, 3.0, 4.5):
+            journal.append(reading)
+        left, right = socket.socketpair()
+        with left, right:
+            window = InFlightWindow()
+            count, seconds = replay_journal(left, journal, FrameWriter(), BinaryCodec(), window)
+            frames = FrameReader()
+            received = []
+            while len(received) < 3 and frames.read_from(right):
+                received += [BinaryCodec().decode_reading(frame) for frame in frames.frames()]
+        self.assertEqual(received, [1.5, 3.0, 4.5])
+        self.assertEqual((count, window.depth()), (3, 3))
+        self.assertEqual(journal.summary()["replayed"], 3)
+        self.assertEqual(len(journal), 3)
+        journal.close()
+
+    def test_replay_is_bounded_by_window(self):
+        """Test that a replay sends no more readings than the in-flight window's limit under 'drop'."""
+        with ReadingJournal(self.path) as journal:
+            for reading in range(10):
+                journal.append(float(reading))
+            left, right = socket.socketpair()
+            with left, right:
+                window = InFlightWindow(limit=4, policy="drop")
+                count, _ = replay_journal(left, journal, FrameWriter(), BinaryCodec(), window)
+            self.assertEqual((count, window.depth(), window.summary()["dropped"]), (4, 4, 6))
+            self.assertEqual(len(journal), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import random
+import unittest
+
+from ClientReconnect import Backoff, ReconnectScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestBackoff(unittest.TestCase):
+    def test_full_jitter_within_exponential_ceiling(self):
+        """Test that retry delays are spread between 0 and base * factor ** attempt, capped at max_delay."""
+        backoff = Backoff(base_delay=1.0, max_delay=10.0, factor=2.0, rng=random.Random(1))
+        for attempt, ceiling in ((0, 1.0), (1, 2.0), (3, 8.0), (4, 10.0), (1000, 10.0)):
+            delays = [backoff.delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+            self.assertGreater(max(delays) - min(delays), ceiling / 2)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_rate(self):
+        """Test that the bucket allows a burst, then queues callers at the configured rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=3, clock=clock)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+        self.assertAlmostEqual(bucket.reserve(), 0.2)
+        clock.now = 1.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_unlimited(self):
+        """Test that a rate of 0 never delays."""
+        bucket = TokenBucket(rate=0, burst=1)
+        self.assertEqual(max(bucket.reserve() for _ in range(100)), 0.0)
+
+
+class TestReconnectScheduler(unittest.TestCase):
+    def test_in_flight_cap(self):
+        """Test that no more than max_in_flight asyncio connects run at once."""
+        scheduler = ReconnectScheduler(max_in_flight=3, rate=0)
+        peak = 0
+
+        async def connect():
+            nonlocal peak
+            async with scheduler.connecting_async():
+                peak = max(peak, scheduler.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(connect() for _ in range(20)))
+
+        asyncio.run(run())
+        self.assertEqual(peak, 3)
+        self.assertEqual(scheduler.stats.attempts, 20)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_failed_attempts_and_reconnect_time(self):
+        """Test the attempt, failure and time-to-reconnect counters."""
+        scheduler = ReconnectScheduler(rate=0)
+        with self.assertRaises(OSError):
+            with scheduler.connecting():
+                raise OSError("Connection refused")
+        with scheduler.connecting():
+            pass
+        scheduler.connected(disconnected_at=0.0)
+        summary = scheduler.stats.summary()
+        self.assertEqual((summary["attempts"], summary["failures"], summary["successes"]), (2, 1, 1))
+        self.assertEqual(summary["reconnects"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
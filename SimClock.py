@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import random
+import time
+
+from MeterState import fleet_states
+
+# Global Vars
+# Default reading intervals (seconds of simulated time), same as ClientCore.
+MIN_READING_INTERVAL = 15
+MAX_READING_INTERVAL = 60
+# Seconds an ack paced run waits for the Bills of its last readings before stopping the fleet.
+SETTLE_TIMEOUT = 5
+
+
+class SimClock:
+    # SimClock() Class:
+    # Simulated time running 'speed' times faster than real time (speed=1000: one real second is 1000 simulated
+    # seconds). Simulated time starts at 'start' when start() is called.
+
+    def __init__(self, speed=1.0, start=0.0, time_source=time.monotonic):
+        self.speed = speed
+        self.origin = start
+        self.time_source = time_source
+        self.real_start = None
+
+    def start(self):
+        # start() Method:
+        # Starts the clock (simulated time 'start' is now).
+        self.real_start = self.time_source()
+
+    def now(self):
+        # now() Method:
+        # Current simulated time.
+        return self.origin + (self.time_source() - self.real_start) * self.speed
+
+    def real_delay(self, sim_time):
+        # real_delay() Method:
+        # Real seconds until the clock reaches 'sim_time' (0 if it already has).
+        return max(0.0, (sim_time - self.now()) / self.speed)
+
+
+class ReadingScheduler:
+    # ReadingScheduler() Class:
+    # Drives the readings of a whole fleet from one heap of next-fire times (simulated seconds), instead of each
+    # meter sleeping between its own readings. Two modes:
+    #   - SimClock: fires each reading when the clock reaches it, so a speed-up of 1000 replays a month of
+    #     readings in about 45 minutes.
+    #   - ack paced (clock=None): simulated time jumps straight to the next reading, which is only sent once
+    #     the meter's previous reading has been answered with a Bill, so the fleet runs as fast as the server acks.
+    # Meters need take_reading(), send_reading() (returns False if not connected), an asyncio.Event 'ready' and
+    # 'finished' (True once the meter has stopped for good, e.g. rejected at auth: it is dropped from the schedule).
+    # With a LoadSchedule on the meters the fire times come from it, otherwise from a seeded RNG.
+
+    def __init__(self, clock=None, until=None, seed=None, min_interval=MIN_READING_INTERVAL,
+                 max_interval=MAX_READING_INTERVAL):
+        self.clock = clock
+        self.until = until
+        self.rng = random.Random(seed)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.sim_time = 0.0
+        self.fired = 0
+        self.real_start = None
+        self.real_end = None
+        self.meters = []
+
+    def next_due(self, meter, due):
+        # next_due() Method:
+        # Simulated time of the meter's next reading, 'due' being the time of its previous one (None if first).
+        if meter.schedule is not None:
+            return meter.schedule.reading(meter.schedule_row, meter.readings_taken)[0]
+        if due is None:
+            return self.rng.uniform(0, self.max_interval)
+        return due + self.rng.uniform(self.min_interval, self.max_interval)
+
+    async def run(self, meters, stop):
+        # run() Method:
+        # Fires readings in simulated time order until 'until' simulated seconds (or 'stop' is set), then sets
+        # 'stop' so the fleet finishes.
+        self.meters = meters
+        heap = [(self.next_due(meter, None), index) for index, meter in enumerate(meters)]
+        heapq.heapify(heap)
+        self.real_start = time.monotonic()
+        if self.clock is not None:
+            self.clock.start()
+
+        try:
+            while heap and not stop.is_set():
+                due, index = heap[0]
+                if self.until is not None and due > self.until:
+                    self.sim_time = self.until
+                    break
+
+                meter = meters[index]
+                if meter.finished:
+                    # Its connection task has ended, it won't send readings again.
+                    heapq.heappop(heap)
+                    continue
+                if self.clock is not None:
+                    delay = self.clock.real_delay(due)
+                    if delay > 0:
+                        await self._wait(stop, delay)
+                        continue
+                elif not meter.ready.is_set():
+                    # Ack paced: the meter's last reading has not been billed yet.
+                    await self._wait(stop, None, meter.ready)
+                    continue
+
+                self.sim_time = due
+                meter.take_reading()
+                if meter.send_reading():
+                    self.fired += 1
+                heapq.heapreplace(heap, (self.next_due(meter, due), index))
+
+                # Let the listeners run now and then when many readings are due at once.
+                if self.fired % 256 == 0:
+                    await asyncio.sleep(0)
+
+            if self.clock is None and not stop.is_set():
+                # Let the last readings be billed, so readings and Bills match at the end.
+                waiters = [asyncio.ensure_future(meter.ready.wait()) for meter in meters]
+                await asyncio.wait(waiters, timeout=SETTLE_TIMEOUT)
+                for waiter in waiters:
+                    waiter.cancel()
+        finally:
+            self.real_end = time.monotonic()
+            stop.set()
+
+    async def _wait(self, stop, timeout, event=None):
+        waiters = [asyncio.ensure_future(stop.wait())]
+        if event is not None:
+            waiters.append(asyncio.ensure_future(event.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def summary(self):
+        # summary() Method:
+        # Simulated and real time covered, the effective speed-up and readings per real second, plus the kWh read
+        # and the latest Bill totals over all meters (to check against the server's billing).
+        real = (self.real_end or time.monotonic()) - self.real_start if self.real_start else 0.0
+        return {
+            "sim_seconds": round(self.sim_time, 1),
+            "real_seconds": round(real, 3),
+            "speedup": round(self.sim_time / real, 1) if real else 0.0,
+            "readings_fired": self.fired,
+            "readings_per_second": round(self.fired / real, 1) if real else 0.0,
+            "kwh_read": round(sum(state.total_kwh() for state in fleet_states(self.meters)), 3),
+            "total_billed": round(sum(state.total_billed() for state in fleet_states(self.meters)), 2),
+        }
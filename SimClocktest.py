@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from ClientFleet import run_fleet, send_frame
+from Fleettest import fake_server
+from SimClock import ReadingScheduler, SimClock
+from StandInServer import read_frame
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSimClock(unittest.TestCase):
+    def test_clock_runs_faster_than_real_time(self):
+        """Test that simulated time advances 'speed' times faster and real_delay scales back to real seconds."""
+        source = FakeTime()
+        clock = SimClock(speed=1000, start=50, time_source=source)
+        clock.start()
+        self.assertEqual(clock.now(), 50)
+        source.now += 2.5
+        self.assertEqual(clock.now(), 2550)
+        self.assertAlmostEqual(clock.real_delay(3550), 1.0)
+        self.assertEqual(clock.real_delay(1000), 0.0)
+
+
+class TestReadingScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await asyncio.start_server(fake_server, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def run_simulation(self, simulation, meters=5):
+        return await run_fleet(range(meters), ramp_rate=0, host="127.0.0.1", port=self.port, duration=10,
+                               report_interval=0, tls=False, simulation=simulation)
+
+    async def test_ack_paced_simulation(self):
+        """Test that an ack paced run covers the simulated period much faster than real time, one bill per reading."""
+        simulation = ReadingScheduler(until=6 * 3600, seed=1)
+        counters = await self.run_simulation(simulation)
+        summary = simulation.summary()
+        self.assertEqual(summary["sim_seconds"], 6 * 3600)
+        self.assertGreater(summary["speedup"], 100)
+        self.assertGreater(counters.readings_sent, 5 * 6 * 60)
+        self.assertEqual(counters.readings_sent, summary["readings_fired"])
+        self.assertEqual(counters.bills_received, counters.readings_sent)
+        self.assertEqual(summary["total_billed"], round(sum(m.total_bill for m in simulation.meters), 2))
+
+    async def test_clock_simulation(self):
+        """Test that a SimClock run fires every reading due in the simulated period."""
+        simulation = ReadingScheduler(SimClock(speed=3600), until=1800, seed=2)
+        counters = await self.run_simulation(simulation)
+        summary = simulation.summary()
+        self.assertLess(summary["real_seconds"], 2)
+        # Readings every 15..60 s: between 30 and 120 per meter in half an hour.
+        self.assertGreaterEqual(counters.readings_sent, 5 * 29)
+        self.assertLessEqual(counters.readings_sent, 5 * 121)
+        self.assertEqual(counters.errors, 0)
+
+    async def test_same_seed_same_readings(self):
+        """Test that a seeded simulation sends the same readings every run."""
+        first = ReadingScheduler(until=3600, seed=3)
+        second = ReadingScheduler(until=3600, seed=3)
+        await self.run_simulation(first, meters=3)
+        await self.run_simulation(second, meters=3)
+        self.assertEqual(first.summary()["readings_fired"], second.summary()["readings_fired"])
+
+    async def test_rejected_meters_leave_schedule(self):
+        """Test that meters rejected at auth take no readings and don't advance simulated time."""
+        async def reject(reader, writer):
+            await read_frame(reader)
+            send_frame(writer, b"Authentication failed")
+            writer.close()
+
+        server = await asyncio.start_server(reject, "127.0.0.1", 0)
+        async with server:
+            simulation = ReadingScheduler(until=30 * 86400, seed=4)
+            counters = await run_fleet(range(5), ramp_rate=0, host="127.0.0.1",
+                                       port=server.sockets[0].getsockname()[1], duration=10, report_interval=0,
+                                       tls=False, simulation=simulation)
+        summary = simulation.summary()
+        self.assertEqual(counters.auth_failures, 5)
+        self.assertEqual((summary["readings_fired"], summary["sim_seconds"], summary["kwh_read"]), (0, 0.0, 0.0))
+        self.assertLess(summary["real_seconds"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import signal
+import ssl
+
+from ClientCodec import BinaryCodec, bill_from_dict
+from ClientCore import FRAME_HEADER, pack_frame
+
+# Global Vars
+# Stand-in for smart-meter-server: same framing, auth, Bill and power grid messages, no Rust, HAProxy or database.
+# Settings below match the server's defaults.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+NCLIENT = 128
+UNIT_COST = 0.2
+STANDING_CHARGE = 0.4
+AUTH_TIMEOUT = 10
+IDLE_TIMEOUT = 120
+GRID_ERROR = "someone unplugged the power cable!"
+# server.crt is the certificate HAProxy serves, its private key is in haproxy.pem.
+CERT_FILE = "./Certificates/server.crt"
+KEY_FILE = "./Certificates/haproxy.pem"
+# Wire formats accepted when a client offers them (see ClientCodec).
+WIRE_FORMATS = (BinaryCodec.name,)
+BINARY = BinaryCodec()
+
+
+class MeterAccount:
+    # MeterAccount() Class:
+    # One client's readings and current Bill, kept across connections like the server's mock database. Billing
+    # follows ConnectionContext in the server: a month long billing period starting on the first reading, usage at
+    # UNIT_COST per kWh plus STANDING_CHARGE per day of the period so far.
+
+    def __init__(self, id, rng):
+        self.id = id
+        # The server seeds every client with readings that end somewhere between 9 and 10 kWh.
+        self.reading = rng.uniform(9.0, 10.0)
+        today = datetime.date.today()
+        self.bill = {
+            "type": "Bill",
+            "actual_usage": self.reading * UNIT_COST,
+            "standing_charge": STANDING_CHARGE,
+            "total": self.reading * UNIT_COST + STANDING_CHARGE,
+            "units_start": 0.0,
+            "units_end": self.reading,
+            "price_per_unit": UNIT_COST,
+            "daily_standing_charge": STANDING_CHARGE,
+            "billing_period": {"start": today.isoformat(), "end": add_month(today).isoformat()},
+        }
+
+    def add_reading(self, reading, offset, today=None):
+        # add_reading() Method:
+        # Adds a reading (plus the connection's starting reading 'offset', as the server does) and returns the
+        # updated Bill, or None if the reading went backwards.
+        reading += offset
+        if reading < self.reading:
+            return None
+        self.reading = reading
+
+        today = today or datetime.date.today()
+        start = datetime.date.fromisoformat(self.bill["billing_period"]["start"])
+        bill = self.bill
+        bill["units_end"] = reading
+        bill["actual_usage"] = (reading - bill["units_start"]) * UNIT_COST
+        bill["standing_charge"] = ((today - start).days + 1) * STANDING_CHARGE
+        bill["total"] = bill["actual_usage"] + bill["standing_charge"]
+        return bill
+
+
+class StandInServer:
+    # StandInServer() Class:
+    # asyncio server speaking the smart meter protocol: u16 length framed messages, {"id", "token"} auth (the
+    # token is the id as a string, like the real server's test clients), a Bill for every MeterReading and
+    # PowerGridIssue / PowerGridIssueResolved broadcasts. 'delay' (+ up to 'jitter') seconds are waited before each
+    # Bill, to benchmark the client against a slower server. Clients offering a format in 'wire_formats' during
+    # auth are switched to it (the binary1 format of ClientCodec), others get JSON. Usable as an async context
+    # manager:
+    #     async with StandInServer(port=0) as server:
+    #         ... connect to server.port ...
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, clients=NCLIENT, tls=False, certfile=CERT_FILE,
+                 keyfile=KEY_FILE, delay=0.0, jitter=0.0, idle_timeout=IDLE_TIMEOUT, seed=None,
+                 wire_formats=WIRE_FORMATS):
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.context = None
+        if tls:
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(certfile, keyfile)
+        self.delay = delay
+        self.jitter = jitter
+        self.idle_timeout = idle_timeout
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.accounts = {}
+        self.wire_formats = wire_formats
+        # Writers of the authenticated connections by client id, and the ids using the binary format.
+        self.connected = {}
+        self.binary = set()
+        self.grid_issue = None
+        self.server = None
+        self.stats = {"connections": 0, "auth_failures": 0, "readings": 0, "bills": 0, "broadcasts": 0,
+                      "errors": 0}
+
+    async def start(self):
+        # start() Method:
+        # Starts listening. With port 0 a free port is picked, see 'port'.
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, ssl=self.context)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        # close() Method:
+        # Stops listening and disconnects every client.
+        self.server.close()
+        for writer in list(self.connected.values()):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    def broadcast_grid_issue(self, error=GRID_ERROR):
+        # broadcast_grid_issue() Method:
+        # Sends a PowerGridIssue to every connected client. Clients connecting while the issue lasts are told on
+        # connect.
+        self.grid_issue = error
+        self.broadcast({"type": "PowerGridIssue", "error": error})
+
+    def broadcast_grid_resolved(self):
+        # broadcast_grid_resolved() Method:
+        # Sends PowerGridIssueResolved to every connected client.
+        self.grid_issue = None
+        self.broadcast({"type": "PowerGridIssueResolved"})
+
+    def toggle_grid_issue(self):
+        # toggle_grid_issue() Method:
+        # Broadcasts an issue, or its resolution if there is one already (like SIGUSR1 on the server).
+        if self.grid_issue is None:
+            self.broadcast_grid_issue()
+        else:
+            self.broadcast_grid_resolved()
+
+    def broadcast(self, message):
+        frames = grid_frames(message)
+        for id, writer in self.connected.items():
+            writer.write(frames[id in self.binary])
+        self.stats["broadcasts"] += 1
+
+    async def handle_client(self, reader, writer):
+        # handle_client() Method:
+        # Serves one connection: auth, then a Bill for every reading until the client disconnects, sends
+        # something invalid or is idle for 'idle_timeout' seconds.
+        self.stats["connections"] += 1
+        id = None
+        try:
+            id, binary = await self.authenticate(reader, writer)
+            if id is None:
+                return
+            if id in self.connected:
+                writer.write(pack_frame(b"Another smart meter is already connected"))
+                await writer.drain()
+                id = None
+                return
+
+            self.connected[id] = writer
+            if binary:
+                self.binary.add(id)
+            if self.grid_issue is not None:
+                writer.write(grid_frames({"type": "PowerGridIssue", "error": self.grid_issue})[binary])
+            await self.billing_loop(id, reader, writer, binary)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, KeyError, TypeError):
+            self.stats["errors"] += 1
+        finally:
+            if id is not None:
+                self.connected.pop(id, None)
+                self.binary.discard(id)
+            writer.close()
+
+    async def authenticate(self, reader, writer):
+        # authenticate() Method:
+        # Reads the {"id", "token"} message and replies, accepting the binary format if the client offers it.
+        # Returns (client id, whether the connection uses the binary format), id None if it was rejected or the
+        # client disconnected first.
+        frame = await asyncio.wait_for(read_frame(reader), AUTH_TIMEOUT)
+        if frame is None:
+            return None, False
+        auth = json.loads(frame)
+        id = auth.get("id") if isinstance(auth, dict) else None
+        if not isinstance(id, int) or not 0 <= id < self.clients or auth.get("token") != str(id):
+            self.stats["auth_failures"] += 1
+            writer.write(pack_frame(b"Authentication failed"))
+            await writer.drain()
+            return None, False
+        binary = BINARY.name in auth.get("wire", ()) and BINARY.name in self.wire_formats
+        writer.write(pack_frame(b"Authentication successful wire=binary1" if binary else b"Authentication successful"))
+        await writer.drain()
+        return id, binary
+
+    async def billing_loop(self, id, reader, writer, binary=False):
+        # billing_loop() Method:
+        # Answers every MeterReading with the client's updated Bill (JSON, or binary1 if 'binary').
+        account = self.accounts.get(id)
+        if account is None:
+            # With a seed each account draws from its own generator, so a meter gets the same starting reading
+            # whatever order the meters connect in (replays of a trace get the same Bills).
+            rng = self.rng if self.seed is None else random.Random(f"{self.seed}:{id}")
+            account = self.accounts[id] = MeterAccount(id, rng)
+        offset = account.reading
+
+        while True:
+            frame = await asyncio.wait_for(read_frame(reader), self.idle_timeout)
+            if frame is None:
+                return
+            if binary:
+                reading = BINARY.decode_reading(frame)
+            else:
+                message = json.loads(frame)
+                if not isinstance(message, dict) or message.get("type") != "MeterReading":
+                    raise ValueError(f"Unexpected message {message}")
+                reading = float(message["reading"])
+            self.stats["readings"] += 1
+
+            bill = account.add_reading(reading, offset)
+            if bill is None:
+                raise ValueError("Reading went backwards")
+            delay = self.delay + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay:
+                await asyncio.sleep(delay)
+            payload = BINARY.encode_bill(bill_from_dict(bill)) if binary else json.dumps(bill).encode('utf-8')
+            writer.write(pack_frame(payload))
+            await writer.drain()
+            self.stats["bills"] += 1
+
+
+def add_month(date):
+    # add_month() Function:
+    # Same day next month, clamped to the end of shorter months (chrono's checked_add_months).
+    year, month = divmod(date.month, 12)
+    year, month = date.year + year, month + 1
+    for day in range(date.day, 27, -1):
+        try:
+            return date.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+    return date.replace(year=year, month=month)
+
+
+def grid_frames(message):
+    # grid_frames() Function:
+    # (JSON frame, binary1 frame) of a PowerGridIssue / PowerGridIssueResolved message.
+    if message["type"] == "PowerGridIssue":
+        binary = BINARY.encode_grid_issue(message["error"])
+    else:
+        binary = BINARY.encode_grid_resolved()
+    return pack_frame(json.dumps(message).encode('utf-8')), pack_frame(binary)
+
+
+async def read_frame(reader):
+    # read_frame() Function:
+    # Reads one length prefixed frame, returns None if the client disconnected between frames.
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None
+    return await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+
+
+async def grid_events(server, interval):
+    # grid_events() Function:
+    # Toggles a power grid issue every 'interval' seconds.
+    while True:
+        await asyncio.sleep(interval)
+        server.toggle_grid_issue()
+
+
+def parse_args(argv=None):
+    # parse_args() Function:
+    # Command line options for the stand-in server.
+    parser = argparse.ArgumentParser(description="Stand-in smart meter server for testing and load testing clients.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--clients", type=int, default=NCLIENT, help="ids 0 .. clients - 1 can authenticate")
+    parser.add_argument("--tls", action="store_true", help="serve TLS with the checked in certificate")
+    parser.add_argument("--certfile", default=CERT_FILE)
+    parser.add_argument("--keyfile", default=KEY_FILE)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before sending each Bill")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds per Bill")
+    parser.add_argument("--grid-interval", type=float, default=None,
+                        help="broadcast a power grid issue / resolution every this many seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json-only", action="store_true", help="don't accept the binary wire format")
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    server = StandInServer(args.host, args.port, args.clients, args.tls, args.certfile, args.keyfile, args.delay,
+                           args.jitter, seed=args.seed, wire_formats=() if args.json_only else WIRE_FORMATS)
+    async with server:
+        # SIGUSR1 toggles a power grid issue, as on the real server.
+        if hasattr(signal, "SIGUSR1"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, server.toggle_grid_issue)
+        if args.grid_interval:
+            asyncio.ensure_future(grid_events(server, args.grid_interval))
+        print(f"Listening on {args.host}:{server.port}{' with TLS' if args.tls else ''}", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            print(f"Served {server.stats}", flush=True)
+
+
+def main(argv=None):
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
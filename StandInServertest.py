@@ -0,0 +1,194 @@
+import asyncio
+import datetime
+import json
+import random
+import ssl
+import time
+import unittest
+
+from ClientCodec import BinaryCodec
+from ClientFleet import FleetCounters, FleetMeter, run_fleet, send_frame
+from ClientCore import create_ssl_context
+from StandInServer import MeterAccount, StandInServer, add_month, read_frame
+
+
+class TestStandInServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await StandInServer(port=0, seed=1).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def connect(self, id):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        send_frame(writer, json.dumps({"id": id, "token": str(id)}).encode('utf-8'))
+        return reader, writer, await read_frame(reader)
+
+    async def test_auth(self):
+        """Test that known ids with a matching token are accepted and others rejected."""
+        for id, expected in ((0, b"Authentication successful"), (128, b"Authentication failed")):
+            reader, writer, response = await self.connect(id)
+            self.assertEqual(response, expected)
+            writer.close()
+
+    async def test_bill_for_every_reading(self):
+        """Test that each reading is answered with a Bill shaped like the server's."""
+        reader, writer, _ = await self.connect(3)
+        bills = []
+        for reading in (1.0, 2.5):
+            send_frame(writer, json.dumps({"type": "MeterReading", "reading": reading}).encode('utf-8'))
+            bills.append(json.loads(await read_frame(reader)))
+        writer.close()
+
+        start = self.server.accounts[3].bill["units_end"] - 2.5
+        self.assertEqual(bills[1]["type"], "Bill")
+        self.assertEqual(set(bills[1]), {"type", "actual_usage", "standing_charge", "total", "units_start",
+                                         "units_end", "price_per_unit", "daily_standing_charge", "billing_period"})
+        self.assertAlmostEqual(bills[1]["units_end"] - bills[0]["units_end"], 1.5)
+        self.assertAlmostEqual(bills[1]["units_end"], start + 2.5)
+        self.assertAlmostEqual(bills[1]["total"], bills[1]["units_end"] * 0.2 + 0.4)
+
+    async def test_disconnect_before_auth(self):
+        """Test that a client leaving before it authenticates is a clean disconnect, not an error."""
+        unhandled = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.close()
+        await writer.wait_closed()
+        while self.server.stats["connections"] == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        self.assertEqual(unhandled, [])
+        self.assertEqual(self.server.stats["errors"], 0)
+        self.assertEqual(self.server.stats["auth_failures"], 0)
+
+    async def test_malformed_messages(self):
+        """Test that JSON messages that are not objects, or readings that are not numbers, are rejected."""
+        unhandled = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        send_frame(writer, b"[]")
+        self.assertEqual(await read_frame(reader), b"Authentication failed")
+        writer.close()
+        self.assertEqual(self.server.stats["auth_failures"], 1)
+
+        for message in (b"[]", b'"MeterReading"', b'{"type": "MeterReading", "reading": null}'):
+            reader, writer, _ = await self.connect(4)
+            send_frame(writer, message)
+            # The connection is closed without a Bill.
+            self.assertIsNone(await read_frame(reader))
+            writer.close()
+        self.assertEqual(unhandled, [])
+        self.assertEqual(self.server.stats["errors"], 3)
+        self.assertEqual(self.server.stats["bills"], 0)
+
+    async def test_second_connection_rejected(self):
+        """Test that an id can only be connected once at a time."""
+        first = await self.connect(5)
+        reader, writer, _ = await self.connect(5)
+        self.assertEqual(await read_frame(reader), b"Another smart meter is already connected")
+        writer.close()
+        first[1].close()
+
+    async def test_grid_broadcasts_reach_fleet(self):
+        """Test that PowerGridIssue / PowerGridIssueResolved reach connected meters, and late joiners hear of
+        an ongoing issue on connect."""
+        counters = FleetCounters()
+        stop = asyncio.Event()
+        meters = [FleetMeter(id, counters, None, "127.0.0.1", self.server.port, min_interval=5, max_interval=5)
+                  for id in range(4)]
+        tasks = [asyncio.ensure_future(meter.run(stop)) for meter in meters[:3]]
+        while len(self.server.connected) < 3:
+            await asyncio.sleep(0.01)
+        self.server.broadcast_grid_issue("test outage")
+        tasks.append(asyncio.ensure_future(meters[3].run(stop)))
+        while counters.grid_alerts < 4:
+            await asyncio.sleep(0.01)
+        self.assertTrue(all(meter.status == "Power Grid Issue: test outage" for meter in meters))
+
+        self.server.broadcast_grid_resolved()
+        await asyncio.sleep(0.1)
+        stop.set()
+        await asyncio.gather(*tasks)
+        self.assertTrue(all(meter.status == "Connected" for meter in meters))
+
+    async def test_response_delay(self):
+        """Test that Bills are held back by the configured delay."""
+        self.server.delay = 0.05
+        reader, writer, _ = await self.connect(1)
+        start = time.perf_counter()
+        send_frame(writer, json.dumps({"type": "MeterReading", "reading": 1.0}).encode('utf-8'))
+        await read_frame(reader)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+        writer.close()
+
+    async def test_tls_fleet(self):
+        """Test a fleet run over TLS with the checked in certificate."""
+        async with StandInServer(port=0, tls=True) as server:
+            context = create_ssl_context()
+            # The checked in test certificate has expired.
+            context.verify_mode = ssl.CERT_NONE
+            counters = FleetCounters()
+            stop = asyncio.Event()
+            meter = FleetMeter(7, counters, context, "127.0.0.1", server.port, min_interval=0.01, max_interval=0.02)
+            task = asyncio.ensure_future(meter.run(stop))
+            while counters.bills_received < 5:
+                await asyncio.sleep(0.01)
+            stop.set()
+            await task
+        self.assertEqual(counters.handshakes, 1)
+        self.assertEqual(counters.errors, 0)
+
+    async def test_fleet_throughput_run(self):
+        """Test a short plain TCP fleet run against the stand-in server."""
+        counters = await run_fleet(range(20), ramp_rate=0, host="127.0.0.1", port=self.server.port, duration=0.5,
+                                   min_interval=0.01, max_interval=0.02, report_interval=0, tls=False)
+        self.assertGreater(counters.bills_received, 100)
+        # Bills sent just before the meters stopped may not have been read.
+        self.assertGreaterEqual(self.server.stats["bills"], counters.bills_received)
+        self.assertEqual(counters.errors, 0)
+
+    async def test_binary_wire_format(self):
+        """Test that meters offering binary1 get binary Bills and broadcasts, with the same billing as JSON."""
+        counters = FleetCounters()
+        stop = asyncio.Event()
+        meter = FleetMeter(9, counters, None, "127.0.0.1", self.server.port, min_interval=0.01, max_interval=0.02)
+        task = asyncio.ensure_future(meter.run(stop))
+        while counters.bills_received < 5:
+            await asyncio.sleep(0.01)
+        self.server.broadcast_grid_issue("binary outage")
+        while counters.grid_alerts < 1:
+            await asyncio.sleep(0.01)
+        stop.set()
+        await task
+        self.assertIsInstance(meter.codec, BinaryCodec)
+        self.assertEqual(meter.status, "Power Grid Issue: binary outage")
+        self.assertEqual(counters.errors, 0)
+        self.assertAlmostEqual(meter.total_bill, meter.units_used * 0.2 + meter.standing_charge)
+
+    async def test_json_fallback(self):
+        """Test that meters fall back to JSON when the server doesn't accept the binary format."""
+        async with StandInServer(port=0, wire_formats=()) as server:
+            counters = await run_fleet(range(3), ramp_rate=0, host="127.0.0.1", port=server.port, duration=0.3,
+                                       min_interval=0.01, max_interval=0.02, report_interval=0, tls=False)
+        self.assertGreater(counters.bills_received, 10)
+        self.assertEqual(counters.errors, 0)
+
+
+class TestMeterAccount(unittest.TestCase):
+    def test_standing_charge_per_day(self):
+        """Test that the standing charge grows by a day's charge per day of the billing period."""
+        account = MeterAccount(0, random.Random(0))
+        start = datetime.date.fromisoformat(account.bill["billing_period"]["start"])
+        bill = account.add_reading(1.0, account.reading, today=start + datetime.timedelta(days=2))
+        self.assertAlmostEqual(bill["standing_charge"], 1.2)
+        self.assertIsNone(account.add_reading(0.5, 0.0))
+
+    def test_add_month(self):
+        """Test that billing periods end on the same day next month, clamped to the month's end."""
+        self.assertEqual(add_month(datetime.date(2024, 1, 31)), datetime.date(2024, 2, 29))
+        self.assertEqual(add_month(datetime.date(2024, 12, 15)), datetime.date(2025, 1, 15))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from ClientStats import load_baselines, machine_key, save_baseline
+
+# Global Vars
+# Stored baselines: one report per machine (see ClientStats.machine_key()), compared against by default.
+STARTUP_BASELINE_FILE = "./startup-baselines.json"
+# Modules the headless tools are started from. None of them may load a GUI toolkit.
+HEADLESS_MODULES = ("ClientCore", "ClientSide", "ClientFleet", "FleetSupervisor", "ClientBenchmark", "SimClock",
+                    "StandInServer")
+GUI_MODULES = ("_tkinter", "tkinter", "customtkinter")
+STARTUP_RUNS = 5
+# Allowed slow-down against a baseline report: a relative tolerance plus a few milliseconds of process noise.
+STARTUP_TOLERANCE = 0.25
+STARTUP_SLACK_MS = 5.0
+# Script run in a fresh interpreter for each measurement: times the import and lists every module it loaded.
+PROBE = ("import json, sys, time\n"
+         "start = time.perf_counter()\n"
+         "import {module}\n"
+         "print(json.dumps({{'import_ms': (time.perf_counter() - start) * 1000, 'modules': sorted(sys.modules)}}))\n")
+
+
+def probe(module, code=None):
+    # probe() Function:
+    # Imports 'module' (or runs 'code') in a new interpreter started in this directory. Returns (wall clock ms from
+    # process start to exit, ms spent importing, names of the modules loaded).
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code or PROBE.format(module=module)], capture_output=True,
+                            text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    startup_ms = (time.perf_counter() - start) * 1000
+    data = json.loads(result.stdout.splitlines()[-1])
+    return startup_ms, data["import_ms"], data["modules"]
+
+
+def measure_startup(module, runs=STARTUP_RUNS):
+    # measure_startup() Function:
+    # Median process startup and import times of 'module' over 'runs' fresh interpreters, the fastest import (what
+    # regressions are checked on, it varies far less from run to run than the median), the number of modules it
+    # loads and any GUI toolkit modules among them.
+    samples = [probe(module) for _ in range(runs)]
+    modules = samples[-1][2]
+    return {
+        "startup_ms": round(statistics.median(sample[0] for sample in samples), 2),
+        "import_ms": round(statistics.median(sample[1] for sample in samples), 2),
+        "best_import_ms": round(min(sample[1] for sample in samples), 2),
+        "modules": len(modules),
+        "gui_modules": [name for name in GUI_MODULES if name in modules],
+    }
+
+
+def build_report(modules=HEADLESS_MODULES, runs=STARTUP_RUNS):
+    # build_report() Function:
+    # JSON report of the startup of each module.
+    return {
+        "machine": machine_key(),
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "modules": {module: measure_startup(module, runs) for module in modules},
+    }
+
+
+def check_report(report, baseline=None, tolerance=STARTUP_TOLERANCE, slack_ms=STARTUP_SLACK_MS):
+    # check_report() Function:
+    # Problems found in a report: headless modules that load a GUI toolkit, and (given a baseline report) modules
+    # whose fastest import got slower than 'tolerance' plus 'slack_ms' (the median import for reports without
+    # one). An empty list means no regression.
+    problems = [f"{module} loads {', '.join(result['gui_modules'])}"
+                for module, result in report["modules"].items() if result["gui_modules"]]
+    if baseline is not None:
+        for module, result in report["modules"].items():
+            old = baseline["modules"].get(module)
+            if old is None:
+                continue
+            key = "best_import_ms" if "best_import_ms" in old and "best_import_ms" in result else "import_ms"
+            if result[key] > old[key] * (1 + tolerance) + slack_ms:
+                problems.append(f"{module} import {old[key]} ms -> {result[key]} ms")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure interpreter startup and import time of the headless "
+                                                 "client modules, and check that none of them loads a GUI toolkit.")
+    parser.add_argument("--runs", type=int, default=STARTUP_RUNS, help="fresh interpreters per module")
+    parser.add_argument("--module", action="append", help="module to measure (default: all headless modules)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON report to compare this run against (default: this machine's "
+                                           "stored baseline)")
+    parser.add_argument("--baselines", default=STARTUP_BASELINE_FILE, help="stored baselines file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as this machine's baseline")
+    parser.add_argument("--tolerance", type=float, default=STARTUP_TOLERANCE,
+                        help="allowed relative import time increase over the baseline")
+    args = parser.parse_args(argv)
+
+    report = build_report(args.module or HEADLESS_MODULES, args.runs)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    else:
+        baseline = load_baselines(args.baselines).get(report["machine"])
+        if baseline is None:
+            print(f"No baseline for '{report['machine']}' in {args.baselines}, import times not checked",
+                  file=sys.stderr)
+    if args.save_baseline:
+        save_baseline(report, args.baselines)
+        print(f"Baseline for '{report['machine']}' saved to {args.baselines}", file=sys.stderr)
+    problems = check_report(report, baseline, args.tolerance)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import unittest
+
+from StartupBenchmark import GUI_MODULES, HEADLESS_MODULES, build_report, check_report, probe
+
+
+class TestStartup(unittest.TestCase):
+    def test_headless_modules_do_not_load_gui(self):
+        """Test that no headless entry point imports a GUI toolkit."""
+        report = build_report(HEADLESS_MODULES, runs=1)
+        self.assertEqual(check_report(report), [])
+        self.assertTrue(all(result["import_ms"] > 0 for result in report["modules"].values()))
+
+    def test_gui_loaded_when_window_requested(self):
+        """Test that ClientSide loads the GUI module the first time a window class is asked for."""
+        code = ("import json, sys\n"
+                "import ClientSide\n"
+                "ClientSide.SmartMeterGUI\n"
+                "print(json.dumps({'import_ms': 0, 'modules': sorted(sys.modules)}))\n")
+        _, _, modules = probe("ClientSide", code)
+        self.assertIn("ClientGUI", modules)
+        self.assertIn("customtkinter", modules)
+
+    def test_check_report(self):
+        """Test regression checks against a baseline report."""
+        baseline = {"modules": {"ClientCore": {"import_ms": 20.0, "gui_modules": []}}}
+        report = {"modules": {"ClientCore": {"import_ms": 24.0, "gui_modules": []}}}
+        self.assertEqual(check_report(report, baseline), [])
+        report["modules"]["ClientCore"]["import_ms"] = 40.0
+        self.assertEqual(check_report(report, baseline), ["ClientCore import 20.0 ms -> 40.0 ms"])
+        # The fastest import is compared when both reports have it.
+        baseline["modules"]["ClientCore"]["best_import_ms"] = 18.0
+        report["modules"]["ClientCore"]["best_import_ms"] = 19.0
+        self.assertEqual(check_report(report, baseline), [])
+        report["modules"]["ClientCore"]["best_import_ms"] = 30.0
+        self.assertEqual(check_report(report, baseline), ["ClientCore import 18.0 ms -> 30.0 ms"])
+        report["modules"]["ClientCore"]["gui_modules"] = list(GUI_MODULES[:2])
+        self.assertIn("ClientCore loads _tkinter, tkinter", check_report(report))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import collections
+import math
+import os
+import struct
+import threading
+import time
+from typing import NamedTuple
+
+from ClientCodec import CODEC, WIRE_FORMATS, WIRE_OFFER, Bill
+from ClientFleet import FleetCounters, FleetMeter, format_summary, run_fleet, wait_or_stop
+from ClientCore import SERVER_HOST, SERVER_PORT
+
+# Global Vars
+# Trace file: a header (magic, time.time() when recording started), then one record per event: kind, meter id,
+# seconds since the start (perf_counter()), payload length, payload. Payloads: the codec name for AUTH, the
+# cumulative reading (f64) for READING, the frame body for RECEIVED, nothing for CONNECT / DISCONNECT.
+TRACE_MAGIC = b"SMTRACE1"
+TRACE_HEADER = struct.Struct('>8sd')
+TRACE_RECORD = struct.Struct('>BIdH')
+READING_VALUE = struct.Struct('>d')
+CONNECT = 1
+AUTH = 2
+READING = 3
+RECEIVED = 4
+DISCONNECT = 5
+KIND_NAMES = {CONNECT: "connect", AUTH: "auth", READING: "reading", RECEIVED: "received", DISCONNECT: "disconnect"}
+# Records are streamed to disk through a buffer this large.
+TRACE_BUFFER = 64 * 1024
+# Directory GUI clients record their traces to (one file per meter), none if not set.
+TRACE_DIR = os.environ.get("SMART_METER_TRACE_DIR")
+# Bill fields not compared by default: the billing period depends on the day the trace is replayed.
+IGNORED_FIELDS = ("billing_start", "billing_end")
+# Seconds a replay waits for the Bills of its last readings, and differences listed in a diff, at most.
+DRAIN_TIMEOUT = 10.0
+DIFFERENCES_SHOWN = 20
+
+
+def trace_path(id, directory=TRACE_DIR):
+    # trace_path() Function:
+    # Trace file of meter 'id' recorded by a GUI client.
+    return os.path.join(directory, f"meter-{id}.trace")
+
+
+class TraceWriter:
+    # TraceWriter() Class:
+    # Records the session timeline of one or more meters to a trace file: connects, auth (with the codec agreed),
+    # every reading sent and every frame received, timestamped from when the trace was opened. Records are
+    # streamed through a write buffer (a crash loses at most the buffered tail, which readers skip). Thread safe,
+    # the GUI client records from its reading and listener threads.
+
+    def __init__(self, path, clock=time.perf_counter):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.records = 0
+        self.file = open(path, "wb", buffering=TRACE_BUFFER)
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, time.time()))
+        self.start = clock()
+
+    def record(self, kind, id, payload=b""):
+        # record() Method:
+        # Appends one event of 'kind' for meter 'id'.
+        at = self.clock() - self.start
+        with self.lock:
+            self.file.write(TRACE_RECORD.pack(kind, id, at, len(payload)))
+            if payload:
+                self.file.write(payload)
+            self.records += 1
+
+    def connect(self, id):
+        self.record(CONNECT, id)
+
+    def auth(self, id, codec):
+        self.record(AUTH, id, codec.name.encode())
+
+    def reading(self, id, reading):
+        self.record(READING, id, READING_VALUE.pack(reading))
+
+    def received(self, id, frame):
+        self.record(RECEIVED, id, frame)
+
+    def disconnect(self, id):
+        self.record(DISCONNECT, id)
+
+    def close(self):
+        # close() Method:
+        # Flushes the buffered records and closes the file.
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TraceRecord(NamedTuple):
+    kind: int
+    id: int
+    time: float
+    payload: bytes
+
+
+def read_trace(path):
+    # read_trace() Function:
+    # (time.time() the recording started, list of TraceRecords) of a trace file. A record cut short at the end
+    # of the file (the recorder didn't close it) is left out.
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < TRACE_HEADER.size:
+        raise ValueError(f"{path} is not a trace file")
+    magic, started = TRACE_HEADER.unpack_from(data)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a trace file")
+    records = []
+    offset = TRACE_HEADER.size
+    while offset + TRACE_RECORD.size <= len(data):
+        kind, id, at, length = TRACE_RECORD.unpack_from(data, offset)
+        offset += TRACE_RECORD.size
+        if offset + length > len(data):
+            break
+        records.append(TraceRecord(kind, id, at, data[offset:offset + length]))
+        offset += length
+    return started, records
+
+
+def load_traces(paths):
+    # load_traces() Function:
+    # The records of several trace files (e.g. one per GUI client), on the time line of the earliest one.
+    traces = [read_trace(path) for path in paths]
+    first = min((started for started, _ in traces), default=0.0)
+    records = [record._replace(time=record.time + started - first) for started, trace in traces for record in trace]
+    records.sort(key=lambda record: record.time)
+    return records
+
+
+class MeterTimeline:
+    # MeterTimeline() Class:
+    # What one meter did in a trace: when it first connected, the readings it sent (time, cumulative reading)
+    # and the Bills it received, in order.
+
+    def __init__(self, id):
+        self.id = id
+        self.connected = None
+        self.sessions = 0
+        self.readings = []
+        self.bills = []
+
+
+def build_timelines(records):
+    # build_timelines() Function:
+    # {meter id: MeterTimeline} of the records of a trace. Received frames are decoded with the codec the meter
+    # agreed when it authenticated.
+    timelines = {}
+    codecs = {}
+    for record in records:
+        timeline = timelines.get(record.id)
+        if timeline is None:
+            timeline = timelines[record.id] = MeterTimeline(record.id)
+        if record.kind == CONNECT:
+            if timeline.connected is None:
+                timeline.connected = record.time
+            timeline.sessions += 1
+        elif record.kind == AUTH:
+            name = record.payload.decode()
+            codecs[record.id] = WIRE_FORMATS[name]() if name in WIRE_FORMATS else CODEC
+        elif record.kind == READING:
+            timeline.readings.append((record.time, READING_VALUE.unpack(record.payload)[0]))
+        elif record.kind == RECEIVED:
+            try:
+                message = codecs.get(record.id, CODEC).decode(record.payload)
+            except ValueError:
+                continue
+            if isinstance(message, Bill):
+                timeline.bills.append(message)
+    return timelines
+
+
+def trace_summary(records):
+    # trace_summary() Function:
+    # Meters, duration and number of records of each kind in a trace.
+    kinds = collections.Counter(KIND_NAMES.get(record.kind, "unknown") for record in records)
+    return dict(meters=len({record.id for record in records}),
+                duration_s=round(records[-1].time if records else 0.0, 3), **kinds)
+
+
+class TraceMeter(FleetMeter):
+    # TraceMeter() Class:
+    # FleetMeter that replays a MeterTimeline: connects at its recorded time and sends the recorded readings at
+    # their recorded times, both divided by the replay's speed (as soon as possible with speed None). The Bills
+    # it receives are kept to diff against the recording.
+
+    def __init__(self, replay, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replay = replay
+        self.timeline = replay.timelines[self.id]
+        self.bills = []
+
+    async def run(self, stop):
+        delay = self.replay.due(self.timeline.connected or 0.0)
+        if delay > 0 and await wait_or_stop(stop, delay):
+            return
+        await super().run(stop)
+
+    async def send_readings(self, writer):
+        # send_readings() Method:
+        # Sends the recorded readings not sent yet (a reconnect carries on where the last session stopped). Every
+        # one is sent: a full in-flight window is waited on ('block'), never dropped or coalesced.
+        readings = self.timeline.readings
+        while self.readings_taken < len(readings):
+            at, reading = readings[self.readings_taken]
+            delay = self.replay.due(at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.wait_for_slot()
+            self.readings_taken += 1
+            self.cumulative_reading = reading
+            self.send_reading()
+            await writer.drain()
+        await asyncio.sleep(math.inf)
+
+    def handle_message(self, message):
+        if isinstance(message, Bill):
+            self.bills.append(message)
+        super().handle_message(message)
+
+
+class TraceReplay:
+    # TraceReplay() Class:
+    # Replays the timelines of a trace through the fleet engine (run_fleet) at 'speed' times the recorded pace
+    # (1 = as recorded, None = as fast as the server takes them), then diffs the Bills received against the
+    # recorded ones.
+
+    def __init__(self, timelines, speed=1.0):
+        self.timelines = timelines
+        self.speed = speed
+        self.meters = []
+        self.start = None
+
+    def due(self, at):
+        # due() Method:
+        # Seconds from now until recorded time 'at' comes round in the replay (0 at max speed).
+        if not self.speed:
+            return 0.0
+        return self.start + at / self.speed - time.monotonic()
+
+    def meter(self, *args, **kwargs):
+        # meter() Method:
+        # run_fleet() meter factory.
+        meter = TraceMeter(self, *args, **kwargs)
+        self.meters.append(meter)
+        return meter
+
+    async def run(self, host=SERVER_HOST, port=SERVER_PORT, tls=True, wire_formats=WIRE_OFFER,
+                  drain_timeout=DRAIN_TIMEOUT):
+        # run() Method:
+        # Runs the replay until every recorded reading has been sent and billed, or the recording's duration (at
+        # the replay speed) plus 'drain_timeout' seconds have passed. Returns the FleetCounters.
+        ids = sorted(self.timelines)
+        readings = sum(len(timeline.readings) for timeline in self.timelines.values())
+        duration = max((timeline.readings[-1][0] for timeline in self.timelines.values() if timeline.readings),
+                       default=0.0)
+        counters = FleetCounters()
+        stop = asyncio.Event()
+        self.start = time.monotonic()
+        fleet = asyncio.ensure_future(run_fleet(ids, 0, counters, host, port, report_interval=0, stop=stop, tls=tls,
+                                                wire_formats=wire_formats, meter_factory=self.meter,
+                                                backpressure="block"))
+        deadline = self.start + (duration / self.speed if self.speed else 0.0) + drain_timeout
+        try:
+            while counters.bills_received < readings and time.monotonic() < deadline and not fleet.done():
+                await asyncio.sleep(0.05)
+        finally:
+            stop.set()
+            await fleet
+        return counters
+
+    def diff(self, ignore=IGNORED_FIELDS, tolerance=1e-6):
+        # diff() Method:
+        # Compares the Bills each meter received in the replay with the recorded ones, in order. Returns a summary
+        # with the Bills matching, differing, missing (recorded, not replayed) and extra, and the first
+        # DIFFERENCES_SHOWN differences as (meter id, bill number, field, recorded, replayed).
+        fields = [field for field in Bill._fields if field not in ignore]
+        summary = {"compared": 0, "matched": 0, "differing": 0, "missing": 0, "extra": 0, "differences": []}
+        for meter in self.meters:
+            recorded = meter.timeline.bills
+            summary["missing"] += max(0, len(recorded) - len(meter.bills))
+            summary["extra"] += max(0, len(meter.bills) - len(recorded))
+            for number, (old, new) in enumerate(zip(recorded, meter.bills)):
+                summary["compared"] += 1
+                changed = [(field, getattr(old, field), getattr(new, field)) for field in fields
+                           if not same_value(getattr(old, field), getattr(new, field), tolerance)]
+                if not changed:
+                    summary["matched"] += 1
+                    continue
+                summary["differing"] += 1
+                for field, old_value, new_value in changed:
+                    if len(summary["differences"]) < DIFFERENCES_SHOWN:
+                        summary["differences"].append((meter.id, number, field, old_value, new_value))
+        return summary
+
+
+def same_value(recorded, replayed, tolerance):
+    # same_value() Function:
+    # Whether a Bill field is unchanged (numbers within 'tolerance').
+    if isinstance(recorded, float) and isinstance(replayed, float):
+        return math.isclose(recorded, replayed, rel_tol=tolerance, abs_tol=tolerance)
+    return recorded == replayed
+
+
+def parse_speed(text):
+    # parse_speed() Function:
+    # --speed value: a multiple of the recorded pace ('1', '10', '10x') or 'max'.
+    if text.lower() == "max":
+        return None
+    return float(text.lower().rstrip("x"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or replay smart meter traffic traces.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="summarise trace files")
+    show.add_argument("traces", nargs="+")
+    replay = commands.add_parser("replay", help="replay trace files through the fleet and diff the Bills")
+    replay.add_argument("traces", nargs="+")
+    replay.add_argument("--speed", type=parse_speed, default=1.0, help="1 (as recorded), N (N times faster) or max")
+    replay.add_argument("--host", default=SERVER_HOST)
+    replay.add_argument("--port", type=int, default=SERVER_PORT)
+    replay.add_argument("--no-tls", action="store_true", help="connect without TLS (e.g. straight to port 8080)")
+    replay.add_argument("--json-only", action="store_true",
+                        help="don't offer the binary wire format when authenticating")
+    replay.add_argument("--compare-dates", action="store_true", help="also diff the Bills' billing periods")
+    args = parser.parse_args(argv)
+
+    records = load_traces(args.traces)
+    print(f"[trace] {format_summary(trace_summary(records))}")
+    if args.command == "show":
+        return
+    replayer = TraceReplay(build_timelines(records), args.speed)
+    start = time.perf_counter()
+    counters = asyncio.run(replayer.run(args.host, args.port, not args.no_tls,
+                                        () if args.json_only else WIRE_OFFER))
+    print(f"[replay] {time.perf_counter() - start:.2f} s {counters.summary()}")
+    diff = replayer.diff(() if args.compare_dates else IGNORED_FIELDS)
+    differences = diff.pop("differences")
+    print(f"[diff] {format_summary(diff)}")
+    for id, number, field, recorded, replayed in differences:
+        print(f"[diff] meter {id} bill {number} {field}: {recorded!r} -> {replayed!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ClientCodec import CODEC, SAMPLE_BILL, BinaryCodec
+from ClientFleet import run_fleet
+from StandInServer import StandInServer
+from TrafficTrace import (
+    AUTH,
+    CONNECT,
+    READING,
+    RECEIVED,
+    TraceReplay,
+    TraceWriter,
+    build_timelines,
+    load_traces,
+    read_trace,
+)
+
+
+class TestTraceFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.trace")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that records come back in order with their payloads, minus a record cut short by a crash."""
+        binary = BinaryCodec()
+        bill = binary.encode_bill(CODEC.decode(SAMPLE_BILL))
+        with TraceWriter(self.path) as trace:
+            trace.connect(7)
+            trace.auth(7, binary)
+            trace.reading(7, 12.5)
+            trace.received(7, memoryview(bill))
+        with open(self.path, "ab") as file:
+            file.write(b"\x03\x00\x00")
+
+        _, records = read_trace(self.path)
+        self.assertEqual([record.kind for record in records], [CONNECT, AUTH, READING, RECEIVED])
+        self.assertEqual({record.id for record in records}, {7})
+        self.assertEqual(records[-1].payload, bill)
+        self.assertEqual(sorted(records, key=lambda record: record.time), records)
+
+        timeline = build_timelines(records)[7]
+        self.assertEqual([reading for _, reading in timeline.readings], [12.5])
+        self.assertEqual(timeline.bills, [CODEC.decode(SAMPLE_BILL)])
+        self.assertEqual(timeline.sessions, 1)
+
+    def test_traces_are_merged_on_one_time_line(self):
+        """Test that traces recorded by separate processes are lined up by their start times."""
+        second = os.path.join(self.directory.name, "second.trace")
+        for path, started, id in ((self.path, 1000.0, 1), (second, 1002.5, 2)):
+            with patch("TrafficTrace.time.time", return_value=started), TraceWriter(path) as trace:
+                trace.connect(id)
+        records = load_traces([second, self.path])
+        self.assertEqual([record.id for record in records], [1, 2])
+        self.assertAlmostEqual(records[1].time - records[0].time, 2.5, delta=0.1)
+
+    def test_not_a_trace(self):
+        """Test that other files are rejected."""
+        with open(self.path, "wb") as file:
+            file.write(b"not a trace file at all")
+        with self.assertRaises(ValueError):
+            read_trace(self.path)
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    async def record(self, path, seed):
+        async with StandInServer(port=0, clients=5, seed=seed) as server:
+            with TraceWriter(path) as trace:
+                await run_fleet(range(5), 0, host=server.host, port=server.port, duration=0.6, min_interval=0.02,
+                                max_interval=0.05, report_interval=0, tls=False, trace=trace)
+
+    async def replay(self, path, seed):
+        replay = TraceReplay(build_timelines(load_traces([path])), speed=None)
+        async with StandInServer(port=0, clients=5, seed=seed) as server:
+            counters = await replay.run(server.host, server.port, tls=False, drain_timeout=5)
+        return replay, counters
+
+    async def test_replay_matches_recording(self):
+        """Test that replaying a recorded fleet against the same server gets the same Bills, and a changed server
+        shows up in the diff."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fleet.trace")
+            await self.record(path, seed=1)
+            timelines = build_timelines(load_traces([path]))
+            readings = sum(len(timeline.readings) for timeline in timelines.values())
+            self.assertGreater(readings, 20)
+
+            replay, counters = await self.replay(path, seed=1)
+            self.assertEqual(counters.readings_sent, readings)
+            diff = replay.diff()
+            self.assertGreaterEqual(diff["compared"], readings - 5)
+            self.assertEqual((diff["differing"], diff["missing"]), (0, 0))
+
+            replay, _ = await self.replay(path, seed=2)
+            diff = replay.diff()
+            self.assertEqual(diff["differing"], diff["compared"])
+            self.assertIn("units_end", {field for _, _, field, _, _ in diff["differences"]})
+
+
+if __name__ == "__main__":
+    unittest.main()